@@ -0,0 +1,59 @@
+# Vergleicht die Selenium-Extraktion pro Element mit dem einzelnen execute_script-Aufruf.
+# Die Fixture-Seite wird per file:// geladen, es wird also kein Netzwerk benötigt.
+# Aufruf aus dem Projektverzeichnis: python -m benchmarks.bench_extraction
+import sys
+import time
+from pathlib import Path
+
+from selenium.webdriver.common.by import By
+
+from carvis.browser import extract_listings, new_driver
+from carvis.parsing import listing_from_fields
+
+FIXTURE = Path(__file__).parent / "fixtures" / "result_page_1.html"
+
+
+def extract_per_element(driver):
+    # Bisheriges Vorgehen aus pages/kleinanzeigen3.py: mehrere Roundtrips pro Anzeige
+    listings = []
+    for ad in driver.find_elements(By.CSS_SELECTOR, "article.aditem"):
+        def text(css_class):
+            elements = ad.find_elements(By.CLASS_NAME, css_class)
+            return elements[0].get_attribute("textContent") if elements else None
+        listings.append(listing_from_fields(
+            ad.get_attribute("data-adid"),
+            text("aditem-main--top--right"),
+            text("text-module-begin"),
+            text("aditem-main--top--left"),
+            text("aditem-main--middle--price-shipping--price"),
+            ad.get_attribute("data-href"),
+        ))
+    return listings
+
+
+def timed(function, driver, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = function(driver)
+    return (time.perf_counter() - start) / rounds, result
+
+
+def main(rounds=5):
+    driver = new_driver()
+    try:
+        driver.get(FIXTURE.resolve().as_uri())
+        per_element, expected = timed(extract_per_element, driver, rounds)
+        script, actual = timed(extract_listings, driver, rounds)
+    finally:
+        driver.quit()
+
+    print(f"  per Element: {per_element * 1000:8.1f} ms/Seite ({len(expected)} Anzeigen)")
+    print(f"execute_script: {script * 1000:8.1f} ms/Seite ({per_element / script:.0f}x)")
+    if actual != expected:
+        print("execute_script liefert andere Felder als die Extraktion pro Element")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+# Vergleicht die Parser-Backends aus carvis.parsing auf den gespeicherten Ergebnisseiten.
+# Aufruf aus dem Projektverzeichnis: python -m benchmarks.bench_parsing
+import sys
+import time
+from pathlib import Path
+
+from carvis.parsing import BACKENDS, parse_result_page
+
+FIXTURES = Path(__file__).parent / "fixtures"
+REFERENCE = "soup"
+
+
+def time_backend(pages, backend, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for html in pages:
+            parse_result_page(html, backend)
+    return (time.perf_counter() - start) / (rounds * len(pages))
+
+
+def main(rounds=20):
+    pages = [path.read_text(encoding="utf-8") for path in sorted(FIXTURES.glob("result_page_*.html"))]
+    expected = [parse_result_page(html, REFERENCE) for html in pages]
+
+    failed = False
+    for backend in BACKENDS:
+        # Feld für Feld gegen den Referenz-Parser prüfen
+        for html, reference in zip(pages, expected):
+            if parse_result_page(html, backend) != reference:
+                print(f"{backend}: Ergebnis weicht vom Referenz-Parser ab")
+                failed = True
+
+    baseline = time_backend(pages, REFERENCE, rounds)
+    for backend in BACKENDS:
+        seconds = time_backend(pages, backend, rounds)
+        print(f"{backend:>10}: {seconds * 1000:7.2f} ms/Seite  ({baseline / seconds:4.1f}x)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
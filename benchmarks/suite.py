@@ -0,0 +1,253 @@
+# Misst die einzelnen Stufen der Pipeline offline auf Fixture-Seiten und synthetischen Trackern,
+# speichert die Zeiten als JSON und vergleicht sie mit einer Baseline.
+# Aufruf aus dem Projektverzeichnis:
+#   python -m benchmarks.suite --save-baseline                  Baseline anlegen
+#   python -m benchmarks.suite --sizes 1000 10000 1000000       vergleichen, Exit-Code 1 bei Regressionen
+#   python -m benchmarks.suite --threshold export=1.5 --stages dedup export
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+from carvis.cassette import Cassette
+from carvis.dedup import dedup_listings, find_reposts
+from carvis.export import export_rows
+from carvis.geo import PLZ_DATA, build_map
+from carvis.parsing import COLUMNS, parse_result_page
+from carvis.store import load_tracker, upsert_listings
+from carvis.urls import generate_url
+
+FIXTURES = Path(__file__).parent / "fixtures"
+RESULTS = Path(__file__).parent / "results" / "latest.json"
+BASELINE = Path(__file__).parent / "baseline.json"
+SIZES = [1_000, 10_000, 100_000]
+# Faktor gegenüber der Baseline, ab dem eine Stufe als Regression gilt
+MAX_SLOWDOWN = 1.25
+# Stufen unter dieser Dauer schwanken zu stark für einen Vergleich
+MIN_SECONDS = 0.005
+
+MODELS = {
+    "Audi": ["A3", "A4", "A6", "Q5", "TT"],
+    "BMW": ["320d", "118i", "X3", "530d", "Z4"],
+    "Mercedes": ["C 220", "E 200", "A 180", "GLC 250", "SLK 200"],
+    "Porsche": ["911", "Boxster", "Cayenne", "Macan", "Cayman"],
+    "Fiat": ["500", "Panda", "Punto", "Tipo", "Ducato"],
+    "Land-Rover": ["Defender", "Discovery", "Freelander", "Evoque", "Sport"],
+}
+
+
+def synthetic_rows(count, seed=1, now=None):
+    # Zeilen wie Listing.to_row(); je 5 % doppelte Inserat IDs und verschiedene IDs mit gleichem (Preis, Stadt)
+    rng = random.Random(seed)
+    now = now or datetime(2024, 6, 1, 12, 0)
+    places = pd.read_csv(PLZ_DATA, dtype={"plz": str})[["plz", "ort"]].sample(2000, replace=True, random_state=seed).to_numpy().tolist()
+    brands = list(MODELS)
+    rows = []
+    for index in range(count):
+        if rows and rng.random() < 0.05:
+            rows.append(dict(rng.choice(rows)))
+            continue
+        brand = rng.choice(brands)
+        year = rng.randint(1995, 2023)
+        plz, city = rng.choice(places)
+        day = now - timedelta(days=rng.randint(0, 60))
+        date = f"Heute, {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}" if day.date() == now.date() else day.strftime("%d.%m.%Y")
+        ad_id = str(2_500_000_000 + index)
+        row = {
+            "Inserat ID": ad_id,
+            "Datum": date,
+            "Titel": f"{brand} {rng.choice(MODELS[brand])} {year} {rng.randint(5, 300)} tkm {rng.choice(['TÜV neu', 'Scheckheft', 'Unfallfrei', ''])}".strip(),
+            "Postleitzahl": plz,
+            "Stadt": city,
+            "Preis": None if rng.random() < 0.03 else rng.randint(5, 800) * 100,
+            "VB": rng.random() < 0.4,
+            "Link": f"https://www.kleinanzeigen.de/s-anzeige/{brand.lower()}/{ad_id}-216-1234",
+        }
+        if rows and rng.random() < 0.05:
+            row["Preis"], row["Stadt"] = rows[-1]["Preis"], rows[-1]["Stadt"]
+        rows.append(row)
+    return rows
+
+
+def result_pages(cassette=None):
+    pages = [path.read_text(encoding="utf-8") for path in sorted(FIXTURES.glob("result_page_*.html"))]
+    if cassette:
+        # Aufgezeichnete Ergebnisseiten (siehe carvis.cassette) zusätzlich parsen
+        archive = Cassette(cassette)
+        for url in archive.urls():
+            status, _, body = archive.lookup(url)
+            html = body.decode("utf-8", errors="replace")
+            if status == 200 and "aditem" in html:
+                pages.append(html)
+    return pages
+
+
+def timed(function, repeat):
+    # Schnellster von `repeat` Durchläufen; function() bereitet selbst vor und liefert die zu messende Funktion
+    best = None
+    for _ in range(repeat):
+        run = function()
+        start = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def stage_benchmarks(pages, workdir):
+    # Name -> (Größenabhängig, Vorbereitung(rows) -> Funktion ohne Argumente)
+    search = dict(query="golf 7", state="Bayern", provider="privat", price_min=1000, price_max=20000, year_min=2012, year_max=2018, km_min=0, km_max=150000, power_min=100, power_max=0, car_type="kombi")
+
+    def urls(rows):
+        return lambda: [generate_url(**search) for _ in range(10_000)]
+
+    def parse(rows):
+        return lambda: [parse_result_page(html) for _ in range(20) for html in pages]
+
+    def dedup(rows):
+        return lambda: dedup_listings(rows)
+
+    def merge(rows):
+        # Frische Datenbank, erster Lauf legt an, zweiter Lauf mit 10 % geänderten Preisen gleicht ab
+        path = os.path.join(workdir, f"tracker_{time.perf_counter_ns()}.sqlite")
+        changed = [{**row, "Preis": (row["Preis"] or 0) + 100} if index % 10 == 0 else row for index, row in enumerate(rows)]
+        return lambda: (upsert_listings(rows, path, seen_at="2024-06-01T12:00:00"), upsert_listings(changed, path, seen_at="2024-06-02T12:00:00"))
+
+    def reposts(rows):
+        path = os.path.join(workdir, f"reposts_{time.perf_counter_ns()}.sqlite")
+        upsert_listings(rows, path)
+        tracker = load_tracker(path)
+        return lambda: find_reposts(tracker, ids=tracker["Inserat ID"].tail(150).tolist())
+
+    def export(rows):
+        path = os.path.join(workdir, "export.xlsx")
+        return lambda: export_rows(rows, path, COLUMNS)
+
+    def map_(rows):
+        df = pd.DataFrame(rows)
+        return lambda: build_map(df).get_root().render()
+
+    return {
+        "generate_url": (False, urls),
+        "parse": (False, parse),
+        "dedup": (True, dedup),
+        "tracker": (True, merge),
+        "reposts": (True, reposts),
+        "export": (True, export),
+        "map": (True, map_),
+    }
+
+
+def run(sizes, stages=None, repeat=3, cassette=None, log=print):
+    pages = result_pages(cassette)
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        benchmarks = stage_benchmarks(pages, workdir)
+        for name in stages or benchmarks:
+            scaled, prepare = benchmarks[name]
+            for size in sizes if scaled else [None]:
+                rows = synthetic_rows(size) if scaled else None
+                key = f"{name}@{size}" if scaled else name
+                seconds = timed(lambda: prepare(rows), repeat)
+                results[key] = {"seconds": round(seconds, 6), "rows": size}
+                log(f"{key:>22}: {seconds * 1000:10.1f} ms")
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path, results, sizes, repeat):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    document = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "sizes": sizes,
+        "repeat": repeat,
+        "results": results,
+    }
+    path.write_text(json.dumps(document, indent=2), encoding="utf-8")
+
+
+def compare(results, baseline, max_slowdown=MAX_SLOWDOWN, thresholds=None, min_seconds=MIN_SECONDS):
+    # Liefert eine Zeile je gemeinsamer Stufe; thresholds überschreibt max_slowdown je Stufe (ohne "@Größe")
+    thresholds = thresholds or {}
+    rows = []
+    for key, current in results.items():
+        if key not in baseline:
+            continue
+        before, after = baseline[key]["seconds"], current["seconds"]
+        factor = after / before if before else float("inf")
+        limit = thresholds.get(key.split("@")[0], max_slowdown)
+        regression = factor > limit and max(before, after) >= min_seconds
+        rows.append({"Stufe": key, "Baseline (ms)": before * 1000, "Aktuell (ms)": after * 1000, "Faktor": factor, "Grenze": limit, "Regression": regression})
+    return pd.DataFrame(rows, columns=["Stufe", "Baseline (ms)", "Aktuell (ms)", "Faktor", "Grenze", "Regression"])
+
+
+def _threshold(text):
+    stage, _, factor = text.partition("=")
+    try:
+        return stage, float(factor)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"erwartet STUFE=FAKTOR, z.B. export=1.5: {text}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.suite", description="Pipeline-Stufen offline messen und mit einer Baseline vergleichen.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="Zeilenzahlen der synthetischen Tracker")
+    parser.add_argument("--stages", nargs="+", help="nur diese Stufen messen")
+    parser.add_argument("--repeat", type=int, default=3, help="Durchläufe je Stufe, gewertet wird der schnellste")
+    parser.add_argument("--cassette", help="aufgezeichnete Ergebnisseiten zusätzlich parsen (siehe carvis.cassette)")
+    parser.add_argument("--output", default=RESULTS, help="JSON-Datei für die Ergebnisse")
+    parser.add_argument("--baseline", default=BASELINE, help="JSON-Datei mit den Vergleichswerten")
+    parser.add_argument("--save-baseline", action="store_true", help="Ergebnisse als neue Baseline speichern")
+    parser.add_argument("--max-slowdown", type=float, default=MAX_SLOWDOWN, help="erlaubter Faktor gegenüber der Baseline")
+    parser.add_argument("--threshold", type=_threshold, action="append", default=[], metavar="STUFE=FAKTOR", help="eigener Faktor für eine Stufe")
+    parser.add_argument("--min-seconds", type=float, default=MIN_SECONDS, help="kürzere Stufen werden nicht bewertet")
+    args = parser.parse_args(argv)
+
+    stages = stage_benchmarks([], None)
+    unknown = set(args.stages or []) - set(stages)
+    if unknown:
+        parser.error(f"unbekannte Stufen: {', '.join(sorted(unknown))} (verfügbar: {', '.join(stages)})")
+
+    results = run(args.sizes, args.stages, args.repeat, args.cassette)
+    write_results(args.output, results, args.sizes, args.repeat)
+    print(f"\nErgebnisse gespeichert unter {args.output}")
+    if args.save_baseline:
+        write_results(args.baseline, results, args.sizes, args.repeat)
+        print(f"Baseline gespeichert unter {args.baseline}")
+        return 0
+    if not Path(args.baseline).exists():
+        print(f"Keine Baseline unter {args.baseline}, Vergleich übersprungen (--save-baseline legt eine an)")
+        return 0
+
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+    report = compare(results, baseline["results"], args.max_slowdown, dict(args.threshold), args.min_seconds)
+    print(f"\nVergleich mit der Baseline vom {baseline['created']} ({baseline.get('commit') or 'unbekannter Stand'}):")
+    print(report.to_string(index=False, float_format=lambda value: f"{value:.2f}"))
+    regressions = report[report["Regression"]]
+    if not regressions.empty:
+        print(f"\n{len(regressions)} Stufe(n) langsamer als erlaubt: {', '.join(regressions['Stufe'])}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
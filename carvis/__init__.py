@@ -0,0 +1 @@
+# Gemeinsamer Scraping-Kern für die Streamlit-Seiten in pages/
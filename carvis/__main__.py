@@ -0,0 +1,90 @@
+# Kommandozeile: python -m carvis suchen.yaml [--backend selenium] [--workers 8] [--output datei.xlsx]
+import argparse
+import os
+import sys
+import time
+
+from carvis import cassette, metrics
+from carvis.alerts import check_listings
+from carvis.backend import BACKENDS
+from carvis.batch import brand_specs, load_specs, output_path, run_batch, write_summary
+from carvis.crawler import REQUESTS_PER_SECOND
+from carvis.details import DETAIL_COLUMNS, enrich_listings
+from carvis.export import open_export
+from carvis.parsing import COLUMNS
+from carvis.store import set_watermark, upsert_listings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m carvis", description="Gespeicherte Kleinanzeigen-Suchen im Stapel ausführen.")
+    parser.add_argument("specs", nargs="?", help="YAML- oder JSON-Datei mit Suchen")
+    parser.add_argument("--brands", action="store_true", help="alle Marken aus der Auswahl der Seiten durchsuchen")
+    parser.add_argument("--backend", choices=BACKENDS, default="requests", help="Standard-Backend für Suchen ohne eigenes (auto: HTTP, Browser nur für gesperrte Seiten)")
+    parser.add_argument("--workers", type=int, help="Prozesse (requests) bzw. Browser (selenium)")
+    parser.add_argument("--rate", type=float, default=REQUESTS_PER_SECOND, help="Anfragen pro Sekunde und Host für den ganzen Stapel")
+    parser.add_argument("--output", help="Zieldatei (.xlsx, .csv oder .parquet), Standard: Output der Fahrzeugsuchen/Stapel_<Zeit>.xlsx")
+    parser.add_argument("--shard", action="store_true", help="zu große Suchen nach Preis, Baujahr und Kilometerstand aufteilen (nur Suchen ohne url)")
+    parser.add_argument("--details", action="store_true", help="Detailseiten nachladen (Kilometerstand, Erstzulassung, Leistung, ...)")
+    parser.add_argument("--tracker", action="store_true", help="Ergebnisse zusätzlich in den Tracker schreiben")
+    parser.add_argument("--alerts", action="store_true", help="Treffer der Suchaufträge (Seite \"Alarme\") melden")
+    parser.add_argument("--record", metavar="ARCHIV", help="alle geladenen Seiten in dieser Kassette (SQLite) aufzeichnen")
+    parser.add_argument("--replay", metavar="ARCHIV", help="Seiten nur aus dieser Kassette abspielen, ohne Netzwerk")
+    args = parser.parse_args(argv)
+    if args.record and args.replay:
+        parser.error("--record und --replay schließen sich aus")
+
+    specs = load_specs(args.specs) if args.specs else []
+    if args.brands:
+        specs += brand_specs()
+    if not specs:
+        parser.error("keine Suchen angegeben (Datei oder --brands)")
+    if args.shard:
+        specs = [spec if spec.get("url") else {"shard": True, **spec} for spec in specs]
+
+    if args.record or args.replay:
+        # Auch über die Umgebung, damit neu gestartete Worker-Prozesse dieselbe Kassette nutzen
+        mode = "record" if args.record else "replay"
+        os.environ["CARVIS_CASSETTE"] = args.record or args.replay
+        os.environ["CARVIS_CASSETTE_MODE"] = mode
+        cassette.activate(args.record or args.replay, mode)
+
+    path = output_path(args.output)
+    totals = {"listings": 0, "new": 0, "updated": 0, "alerts": 0}
+
+    def on_result(name, url, rows, seconds, error, watermark):
+        print(f"{name}: {'FEHLER ' + error if error else f'{len(rows)} Inserate'} ({seconds:.1f} s)", flush=True)
+        if args.details and rows:
+            rows, _ = enrich_listings(rows, rate=args.rate)
+        writer.write_rows({**row, "Suche": name} for row in rows)
+        totals["listings"] += len(rows)
+        if args.tracker and (rows or watermark):
+            with metrics.timer("tracker"):
+                new, updated = upsert_listings(rows, watermark=watermark)
+            totals["new"] += new
+            totals["updated"] += updated
+        elif watermark:
+            # Ohne Tracker gilt die Suche als geliefert, sobald die Zeilen im Export stehen
+            set_watermark(*watermark)
+        if args.alerts and rows:
+            totals["alerts"] += len(check_listings(rows))
+
+    started = time.perf_counter()
+    # Ergebnisse werden je fertiger Suche geschrieben, nicht erst am Ende gesammelt
+    columns = COLUMNS + (DETAIL_COLUMNS if args.details else []) + ["Suche"]
+    with metrics.run("batch"), open_export(path, columns) as writer:
+        summary = run_batch(specs, args.backend, args.workers, args.rate, on_result)
+        write_summary(writer, summary)
+    elapsed = time.perf_counter() - started
+
+    print()
+    print(summary.to_string(index=False))
+    print(f"\n{len(specs)} Suchen, {totals['listings']} Inserate in {elapsed:.1f} s -> {path}")
+    if args.tracker:
+        print(f"Tracker: {totals['new']} neue, {totals['updated']} bekannte Inserate")
+    if args.alerts:
+        print(f"Suchaufträge: {totals['alerts']} neue Treffer gemeldet")
+    return 1 if summary["Fehler"].notna().any() else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,410 @@
+# Suchaufträge mit Preisalarm: Regeln wie "BMW M3, 2015-2018, unter 35.000 €, PLZ 8" liegen in der
+# Tracker-Datenbank und werden für jeden Abgleich in Indizes übersetzt, damit ein Inserat nicht gegen
+# jede Regel geprüft werden muss: Intervallbäume für Preis und Baujahr, ein Trie über PLZ-Präfixe und
+# ein invertierter Index über die Titelwörter. Treffer gehen an einen austauschbaren Notifier
+# (JSON-Zeilen in eine Datei oder ein Webhook), jeder Treffer je Regel, Inserat und Preis nur einmal.
+import http.server
+import json
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+import pandas as pd
+import requests
+
+from carvis.metrics import count, timer
+from carvis.store import OUTPUT_DIR, TRACKER_DB, connect, normalize_id, normalize_plz, transaction
+
+ALERTS_LOG = os.environ.get("CARVIS_ALERTS_LOG", os.path.join(OUTPUT_DIR, "logs", "alerts.jsonl"))
+ALERT_WEBHOOK = os.environ.get("CARVIS_ALERT_WEBHOOK")
+WEBHOOK_TIMEOUT = (3, 10)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS watch_rules (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    terms TEXT NOT NULL DEFAULT '',
+    price_min INTEGER,
+    price_max INTEGER,
+    year_min INTEGER,
+    year_max INTEGER,
+    plz_prefixes TEXT NOT NULL DEFAULT '',
+    enabled INTEGER NOT NULL DEFAULT 1,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY,
+    rule_id INTEGER NOT NULL,
+    ad_id TEXT NOT NULL,
+    price INTEGER,
+    title TEXT,
+    link TEXT,
+    matched_at TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_alerts_match ON alerts (rule_id, ad_id, IFNULL(price, -1));
+"""
+
+# Alerts an den Notifier: diese Felder des Inserats plus Regel und Zeitpunkt
+ALERT_FIELDS = ["Inserat ID", "Titel", "Preis", "VB", "Postleitzahl", "Stadt", "Erstzulassung", "Link"]
+
+_TOKEN = re.compile(r"\w+")
+_YEAR = re.compile(r"\b(19[5-9]\d|20\d\d)\b")
+
+
+def tokens(text):
+    return set(_TOKEN.findall(str(text or "").casefold()))
+
+
+def _within(value, low, high):
+    return (low is None and high is None) or (value is not None and (low is None or value >= low) and (high is None or value <= high))
+
+
+@dataclass
+class Rule:
+    id: int
+    name: str
+    terms: frozenset
+    price_min: Optional[int] = None
+    price_max: Optional[int] = None
+    year_min: Optional[int] = None
+    year_max: Optional[int] = None
+    plz_prefixes: tuple = ()
+
+    def matches(self, words, plz, price, year):
+        return (
+            self.terms <= words
+            and (not self.plz_prefixes or bool(plz) and plz.startswith(self.plz_prefixes))
+            and _within(price, self.price_min, self.price_max)
+            and _within(year, self.year_min, self.year_max)
+        )
+
+
+# Indizes: jede Regel steht nur in einem davon, unter ihrer trennschärfsten Bedingung (Titelwort, sonst
+# PLZ-Präfix, sonst Preis, sonst Baujahr). Die Indizes liefern Kandidaten, die dann vollständig geprüft werden.
+
+class IntervalIndex:
+    # Zentrierter Intervallbaum: welche [min, max] enthalten einen Wert, in O(log n + Treffer); None = offen
+    def __init__(self, intervals):
+        bounded = [(float("-inf") if low is None else low, float("inf") if high is None else high, key) for low, high, key in intervals]
+        # Leere Intervalle (min > max) passen auf nichts
+        self._root = self._build([interval for interval in bounded if interval[0] <= interval[1]])
+
+    def _build(self, intervals):
+        if not intervals:
+            return None
+        points = sorted(point for low, high, _ in intervals for point in (low, high) if abs(point) != float("inf")) or [0]
+        center = points[len(points) // 2]
+        here = [interval for interval in intervals if interval[0] <= center <= interval[1]]
+        return (
+            center,
+            sorted(here, key=lambda interval: interval[0]),
+            sorted(here, key=lambda interval: interval[1], reverse=True),
+            self._build([interval for interval in intervals if interval[1] < center]),
+            self._build([interval for interval in intervals if interval[0] > center]),
+        )
+
+    def query(self, value):
+        found = set()
+        node = self._root if value is not None else None
+        while node:
+            center, by_low, by_high, left, right = node
+            if value < center:
+                for low, _, key in by_low:
+                    if low > value:
+                        break
+                    found.add(key)
+                node = left
+            elif value > center:
+                for _, high, key in by_high:
+                    if high < value:
+                        break
+                    found.add(key)
+                node = right
+            else:
+                found.update(key for _, _, key in by_low)
+                break
+        return found
+
+
+class PrefixTrie:
+    # PLZ-Präfixe Ziffer für Ziffer; eine PLZ sammelt die Regeln aller Knoten auf ihrem Pfad
+    def __init__(self, entries):
+        self._root = {}
+        for prefixes, key in entries:
+            for prefix in prefixes:
+                node = self._root
+                for digit in prefix:
+                    node = node.setdefault(digit, {})
+                node.setdefault("", set()).add(key)
+
+    def query(self, plz):
+        found = set(self._root.get("", ()))
+        node = self._root
+        for digit in plz or "":
+            node = node.get(digit)
+            if node is None:
+                break
+            found.update(node.get("", ()))
+        return found
+
+
+class TokenIndex:
+    # Invertierter Index, jede Regel nur unter ihrem seltensten Wort; die übrigen Wörter prüft Rule.matches
+    def __init__(self, entries):
+        frequency = Counter(term for terms, _ in entries for term in terms)
+        self._postings = {}
+        for terms, key in entries:
+            self._postings.setdefault(min(terms, key=lambda term: (frequency[term], term)), []).append(key)
+
+    def query(self, words):
+        return {key for word in words for key in self._postings.get(word, ())}
+
+
+class RuleIndex:
+    def __init__(self, rules):
+        self.rules = {rule.id: rule for rule in rules}
+        by_words, by_plz, by_price, by_year, self._always = [], [], [], [], set()
+        for rule in rules:
+            if rule.terms:
+                by_words.append((rule.terms, rule.id))
+            elif rule.plz_prefixes:
+                by_plz.append((rule.plz_prefixes, rule.id))
+            elif rule.price_min is not None or rule.price_max is not None:
+                by_price.append((rule.price_min, rule.price_max, rule.id))
+            elif rule.year_min is not None or rule.year_max is not None:
+                by_year.append((rule.year_min, rule.year_max, rule.id))
+            else:
+                self._always.add(rule.id)
+        self._words = TokenIndex(by_words)
+        self._plz = PrefixTrie(by_plz)
+        self._price = IntervalIndex(by_price)
+        self._year = IntervalIndex(by_year)
+
+    def match(self, row):
+        # IDs der Regeln, auf die eine Zeile (Listing.to_row(), optional mit Erstzulassung) passt
+        words = tokens(row.get("Titel"))
+        plz = normalize_plz(row.get("Postleitzahl"))
+        price = _number(row.get("Preis"))
+        year = listing_year(row)
+        candidates = self._words.query(words) | self._plz.query(plz) | self._price.query(price) | self._year.query(year) | self._always
+        return {key for key in candidates if self.rules[key].matches(words, plz, price, year)}
+
+
+def _number(value):
+    return None if value is None or pd.isna(value) else value
+
+
+def listing_year(row):
+    # Erstzulassung aus den Details ("10/2015"), sonst eine Jahreszahl im Titel
+    for text in (row.get("Erstzulassung"), row.get("Titel")):
+        match = _YEAR.search(str(text)) if text is not None and not pd.isna(text) else None
+        if match:
+            return int(match.group(1))
+    return None
+
+
+# Regeln verwalten
+
+@contextmanager
+def _connect(path):
+    with connect(path) as conn:
+        conn.executescript(SCHEMA)
+        yield conn
+
+
+def add_rule(name, terms="", price_min=None, price_max=None, year_min=None, year_max=None, plz_prefixes="", path=TRACKER_DB):
+    # plz_prefixes: ein oder mehrere Präfixe, durch Komma oder Leerzeichen getrennt ("8", "80, 81")
+    prefixes = " ".join(re.split(r"[\s,;]+", plz_prefixes.strip())) if plz_prefixes else ""
+    if prefixes and not prefixes.replace(" ", "").isdigit():
+        raise ValueError(f"PLZ-Präfixe dürfen nur Ziffern enthalten: {plz_prefixes!r}")
+    for low, high, label in ((price_min, price_max, "Preis"), (year_min, year_max, "Baujahr")):
+        if low is not None and high is not None and low > high:
+            raise ValueError(f"{label}: Minimum {low} liegt über dem Maximum {high}")
+    with _connect(path) as conn, transaction(conn):
+        return conn.execute(
+            "INSERT INTO watch_rules (name, terms, price_min, price_max, year_min, year_max, plz_prefixes, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (name, " ".join(sorted(tokens(terms))), price_min, price_max, year_min, year_max, prefixes, datetime.now().isoformat(timespec="seconds")),
+        ).lastrowid
+
+
+def set_rule_enabled(rule_id, enabled, path=TRACKER_DB):
+    with _connect(path) as conn, transaction(conn):
+        conn.execute("UPDATE watch_rules SET enabled = ? WHERE id = ?", (int(enabled), rule_id))
+
+
+def delete_rule(rule_id, path=TRACKER_DB):
+    with _connect(path) as conn, transaction(conn):
+        conn.execute("DELETE FROM watch_rules WHERE id = ?", (rule_id,))
+        conn.execute("DELETE FROM alerts WHERE rule_id = ?", (rule_id,))
+
+
+def load_rules(path=TRACKER_DB):
+    with _connect(path) as conn:
+        rows = conn.execute(
+            "SELECT id, name, terms, price_min, price_max, year_min, year_max, plz_prefixes FROM watch_rules WHERE enabled = 1"
+        ).fetchall()
+    return [Rule(id, name, frozenset(terms.split()), *bounds, tuple(prefixes.split())) for id, name, terms, *bounds, prefixes in rows]
+
+
+def rules_table(path=TRACKER_DB):
+    with _connect(path) as conn:
+        return pd.read_sql_query(
+            """
+            SELECT r.id, r.name, r.terms, r.price_min, r.price_max, r.year_min, r.year_max, r.plz_prefixes, r.enabled,
+                   COUNT(a.id) AS alerts, MAX(a.matched_at) AS last_alert
+            FROM watch_rules r LEFT JOIN alerts a ON a.rule_id = r.id
+            GROUP BY r.id ORDER BY r.id
+            """,
+            conn,
+        )
+
+
+def recent_alerts(limit=100, path=TRACKER_DB):
+    with _connect(path) as conn:
+        return pd.read_sql_query(
+            """
+            SELECT a.matched_at, r.name AS rule, a.ad_id, a.price, a.title, a.link
+            FROM alerts a LEFT JOIN watch_rules r ON r.id = a.rule_id
+            ORDER BY a.id DESC LIMIT ?
+            """,
+            conn,
+            params=(limit,),
+        )
+
+
+# Notifier: aufrufbar mit einer Liste von Alerts (Dicts aus ALERT_FIELDS plus "Regel", "Regel ID", "Zeit")
+
+class FileNotifier:
+    def __init__(self, path=ALERTS_LOG):
+        self.path = path
+
+    def __call__(self, alerts):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as file:
+            for alert in alerts:
+                file.write(json.dumps(alert, ensure_ascii=False, default=str) + "\n")
+
+
+class WebhookNotifier:
+    def __init__(self, url, timeout=WEBHOOK_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+
+    def __call__(self, alerts):
+        response = requests.post(self.url, data=json.dumps({"alerts": alerts}, ensure_ascii=False, default=str).encode("utf-8"), headers={"Content-Type": "application/json"}, timeout=self.timeout)
+        response.raise_for_status()
+
+
+def default_notifier():
+    return WebhookNotifier(ALERT_WEBHOOK) if ALERT_WEBHOOK else FileNotifier()
+
+
+@timer("alerts")
+def check_listings(rows, path=TRACKER_DB, notifier=None, index=None):
+    # Gleicht frisch geladene Zeilen mit allen aktiven Regeln ab und meldet nur neue Treffer.
+    # Die Treffer werden zuerst gespeichert und danach außerhalb der Transaktion gemeldet, damit ein
+    # langsamer Webhook die Tracker-Datenbank nicht sperrt. Schlägt der Notifier fehl, werden sie wieder
+    # gelöscht und beim nächsten Lauf erneut gemeldet.
+    index = index or RuleIndex(load_rules(path))
+    if not index.rules or not rows:
+        return []
+    now = datetime.now().isoformat(timespec="seconds")
+    matches = []
+    for row in rows:
+        ad_id = normalize_id(row.get("Inserat ID"))
+        if ad_id:
+            matches += [(rule_id, ad_id, row) for rule_id in sorted(index.match(row))]
+    if not matches:
+        return []
+
+    alerts = []
+    alert_ids = []
+    with _connect(path) as conn, transaction(conn):
+        for rule_id, ad_id, row in matches:
+            price = _number(row.get("Preis"))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO alerts (rule_id, ad_id, price, title, link, matched_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (rule_id, ad_id, None if price is None else int(price), row.get("Titel"), row.get("Link"), now),
+            )
+            if cursor.rowcount:
+                alert_ids.append(cursor.lastrowid)
+                rule = index.rules[rule_id]
+                alerts.append({"Regel": rule.name, "Regel ID": rule_id, "Zeit": now, **{field: row.get(field) for field in ALERT_FIELDS if field in row}})
+    if not alerts:
+        return []
+
+    try:
+        (notifier or default_notifier())(alerts)
+    except BaseException:
+        with _connect(path) as conn, transaction(conn):
+            conn.executemany("DELETE FROM alerts WHERE id = ?", [(alert_id,) for alert_id in alert_ids])
+        raise
+    count("alerts_total", len(alerts))
+    return alerts
+
+
+# Webhook-Attrappe für lokale Tests: nimmt POSTs an und merkt sich die Alerts
+
+class _WebhookHandler(http.server.BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        try:
+            alerts = json.loads(body)["alerts"]
+        except (ValueError, KeyError, TypeError):
+            self.send_response(400)
+            self.end_headers()
+            return
+        self.server.stub.received.extend(alerts)
+        if self.server.stub.echo:
+            for alert in alerts:
+                print(f"{alert.get('Regel')}: {alert.get('Titel')} ({alert.get('Preis')} €) {alert.get('Link')}", flush=True)
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WebhookStub:
+    def __init__(self, host="127.0.0.1", port=0, echo=False):
+        self.received = []
+        self.echo = echo
+        self._server = http.server.ThreadingHTTPServer((host, port), _WebhookHandler)
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/alerts"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="carvis-webhook-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main(argv=None):
+    # python -m carvis.alerts [port]: Webhook-Attrappe starten, z.B. für CARVIS_ALERT_WEBHOOK=http://127.0.0.1:8765/alerts
+    argv = sys.argv[1:] if argv is None else argv
+    stub = WebhookStub(port=int(argv[0]) if argv else 8765, echo=True)
+    print(f"Webhook bereit unter {stub.url} (Strg+C beendet)")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
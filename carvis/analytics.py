@@ -0,0 +1,153 @@
+# Marktanalyse über den ganzen Tracker, vollständig vektorisiert (pandas/NumPy statt Python-Schleifen).
+# Baujahr und Kilometerstand stehen nicht als eigene Felder in den Inseraten und werden aus dem Titel gelesen.
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # ohne pyarrow über pandas' str.extract (Python-re, etwa zehnmal langsamer)
+    pa = None
+
+PERCENTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+# Modelle mit weniger Inseraten bekommen keine eigene Regression, sondern den Median als Erwartung
+MIN_MODEL_SAMPLES = 20
+RIDGE = 1e-3
+
+# Muster ohne Lookbehind, damit sie auch mit RE2 (pyarrow) laufen
+_MODEL = r"^\W*(?P<brand>[^\W_][\w-]*)\s+(?P<model>[\w-]+)"
+_YEAR = r"(?:^|\D)(?P<year>(?:19[6-9]|20[0-4])\d)(?:\D|$)"
+_KM = r"(?:^|[^\d.,])(?P<km>\d{1,3}(?:\.\d{3})+|\d+(?:,\d+)?)\s*(?P<unit>tkm|tsd\.?\s*km|t\s*km|km)\b"
+
+
+def _extract(texts, pattern):
+    # Benannte Gruppen als DataFrame (Text-Spalten, fehlend ohne Treffer)
+    if pa is None:
+        return texts.str.extract(pattern)
+    matches = pc.extract_regex(pa.array(texts), pattern)
+    # Mit Arrow-Strings (pandas 3) liefert pa.array ein ChunkedArray
+    if isinstance(matches, pa.ChunkedArray):
+        matches = matches.combine_chunks()
+    # Ohne Treffer ist das ganze Struct null, die Felder darin aber leere Strings; daher nach Gültigkeit maskieren
+    valid = matches.is_valid()
+    return pd.DataFrame(
+        {
+            field.name: pd.Series(pc.if_else(valid, matches.field(i), None), index=texts.index, dtype=pd.ArrowDtype(pa.string()))
+            for i, field in enumerate(matches.type)
+        }
+    )
+
+
+def price_stats(prices):
+    # Durchschnitt, Minimum und Maximum nur über Inserate mit Preis
+    prices = pd.to_numeric(pd.Series(prices, dtype=object), errors="coerce").dropna()
+    if prices.empty:
+        return None
+    return {"count": len(prices), "mean": prices.mean(), "min": prices.min(), "max": prices.max()}
+
+
+def extract_features(df, now=None):
+    # Modell (erste zwei Wörter des Titels), Baujahr, Alter und Kilometerstand aus dem Titel
+    now = now or datetime.now()
+    titles = df["Titel"].fillna("").astype(str)
+    model = _extract(titles, _MODEL)
+    year = pd.to_numeric(_extract(titles, _YEAR)["year"], errors="coerce").astype("float64")
+    year = year.where(year <= now.year)
+    km = _extract(titles.str.lower(), _KM)
+    km_value = pd.to_numeric(km["km"].str.replace(".", "").str.replace(",", "."), errors="coerce").astype("float64")
+    km_value = km_value.where(~km["unit"].str.startswith("t", na=False), km_value * 1000)
+    # Gruppiert wird ohne Groß-/Kleinschreibung, angezeigt die zuerst gesehene Schreibweise
+    spelling = (model["brand"] + " " + model["model"]).fillna("Unbekannt")
+    key = spelling.str.lower()
+    names = pd.Series(spelling.to_numpy(), index=key.to_numpy())
+    names = names[~names.index.duplicated()]
+    return df.assign(
+        Modell=key.map(names),
+        Baujahr=year,
+        Alter=now.year - year,
+        Kilometer=km_value.where(km_value < 2_000_000),
+        Preis=pd.to_numeric(df["Preis"], errors="coerce"),
+    )
+
+
+def price_percentiles(df, by="Modell"):
+    priced = df.dropna(subset=["Preis"])
+    table = priced.groupby(by)["Preis"].quantile(PERCENTILES).unstack()
+    table.columns = [f"P{int(p * 100)}" for p in PERCENTILES]
+    table.insert(0, "Anzahl", priced.groupby(by).size())
+    return table.sort_values("Anzahl", ascending=False)
+
+
+def fit_price_model(df, by="Modell", min_samples=MIN_MODEL_SAMPLES):
+    # Je Modell log(Preis) ~ a + b*Alter + c*Kilometer/100k, alle Gruppen gleichzeitig über die
+    # Normalgleichungen (G x 3 x 3) gelöst. Fehlendes Alter bzw. km wird durch den Modellmedian ersetzt.
+    # Liefert die erwartete Preisspalte (NaN für Inserate ohne Preis).
+    priced = df["Preis"].gt(0)
+    groups, labels = pd.factorize(df[by])
+    age = df["Alter"].fillna(df.groupby(by)["Alter"].transform("median"))
+    km = (df["Kilometer"].fillna(df.groupby(by)["Kilometer"].transform("median"))) / 100_000
+    X = np.column_stack((np.ones(len(df)), age.fillna(0).to_numpy(float), km.fillna(0).to_numpy(float)))
+    y = np.log(df["Preis"].where(priced).to_numpy(float))
+
+    fit = priced.to_numpy()
+    n_groups = len(labels)
+    XtX = np.zeros((n_groups, 3, 3))
+    Xty = np.zeros((n_groups, 3))
+    np.add.at(XtX, groups[fit], X[fit, :, None] * X[fit, None, :])
+    np.add.at(Xty, groups[fit], X[fit] * y[fit, None])
+    counts = np.bincount(groups[fit], minlength=n_groups)
+    XtX += RIDGE * np.eye(3) * np.maximum(counts, 1)[:, None, None]
+    coef = np.linalg.solve(XtX, Xty[:, :, None])[:, :, 0]
+
+    predicted = np.exp(np.einsum("ij,ij->i", X, coef[groups]))
+    # Kleine Modelle: Median statt Regression
+    median = df.groupby(by)["Preis"].transform("median").to_numpy(float)
+    small = counts[groups] < min_samples
+    predicted = np.where(small, median, predicted)
+    return pd.Series(predicted, index=df.index).where(priced)
+
+
+def deal_scores(df, by="Modell"):
+    # Deal-Score: wie viel günstiger (positiv) oder teurer (negativ) als erwartet, in Prozent
+    df = extract_features(df) if "Modell" not in df else df
+    expected = fit_price_model(df, by)
+    return df.assign(
+        **{"Erwarteter Preis": expected.round(0), "Deal-Score": ((expected - df["Preis"]) / expected * 100).round(1)}
+    )
+
+
+def days_on_market(df, now=None):
+    # Standzeit aus Erst-/Zuletzt-gesehen; "aktiv", wenn das Inserat in den letzten 2 Tagen noch gesehen wurde
+    now = pd.Timestamp(now or datetime.now())
+    first = pd.to_datetime(df["Erstmals gesehen"], errors="coerce")
+    last = pd.to_datetime(df["Zuletzt gesehen"], errors="coerce")
+    return df.assign(Standzeit=(last - first).dt.days, Aktiv=(now - last) <= pd.Timedelta(days=2))
+
+
+def price_drops(history):
+    # history: ad_id, seen_at, price (alle Sichtungen mit geändertem Preis). Je Inserat erster und letzter
+    # Preis, Anzahl Senkungen und Gesamtänderung; nur Inserate mit mindestens einer Senkung.
+    history = history.dropna(subset=["price"]).sort_values(["ad_id", "seen_at"], kind="stable")
+    change = history["price"].diff().where(history["ad_id"].eq(history["ad_id"].shift()))
+    grouped = history.assign(Senkung=change.lt(0)).groupby("ad_id")
+    result = pd.DataFrame({
+        "Erster Preis": grouped["price"].first(),
+        "Aktueller Preis": grouped["price"].last(),
+        "Senkungen": grouped["Senkung"].sum(),
+        "Letzte Änderung": grouped["seen_at"].last(),
+    })
+    result = result[result["Senkungen"] > 0]
+    result["Änderung %"] = ((result["Aktueller Preis"] - result["Erster Preis"]) / result["Erster Preis"] * 100).round(1)
+    return result.rename_axis("Inserat ID").reset_index().sort_values("Änderung %")
+
+
+def market_report(tracker, history, now=None):
+    # Alles für die Analyse-Seite in einem Durchlauf
+    df = days_on_market(deal_scores(extract_features(tracker, now)), now)
+    return {
+        "listings": df,
+        "percentiles": price_percentiles(df),
+        "drops": price_drops(history),
+    }
@@ -0,0 +1,126 @@
+# Einheitlicher Abruf von Ergebnisseiten: zuerst per HTTP und Parser (einige zehn Millisekunden), nur wenn die
+# Seite gesperrt, eine Challenge oder ohne Ergebnisliste zurückkommt, mit einem Browser aus dem Pool.
+# Sperren und Challenges werden je URL-Muster (Host + erstes Pfadsegment, z.B. "www.kleinanzeigen.de/s-autos")
+# gemerkt, bis COOLDOWN_SECONDS abgelaufen sind; danach wird wieder zuerst HTTP versucht. Eine Suche ohne
+# Treffer ist keine Sperre und liefert per HTTP einfach keine Inserate.
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+from carvis.client import fetch
+from carvis.crawler import MAX_PAGES, MAX_WORKERS, crawl_pages
+from carvis.metrics import count
+from carvis.parsing import last_page_number, parse_result_page, result_count
+
+BACKENDS = ["auto", "requests", "selenium"]
+COOLDOWN_SECONDS = float(os.environ.get("CARVIS_BROWSER_COOLDOWN", "1800"))
+BLOCK_STATUS = {403, 429, 503}
+# Hinweise auf Bot-Schutz im HTML (klein geschrieben)
+CHALLENGE_MARKERS = ("captcha", "challenge-platform", "cf-chl", "px-captcha", "zugriff verweigert", "ungewöhnlich viele anfragen")
+# Container der Ergebnisliste; fehlt er und es gibt keine Anzeigen, wurde die Seite nicht ausgeliefert
+RESULTS_MARKER = "srchrslt-adtable"
+# Hinweise auf die Seite "keine Ergebnisse" (klein geschrieben)
+NO_RESULTS_MARKERS = ("outcomenotfound", "keine ergebnisse gefunden", "es wurden leider keine ergebnisse")
+
+_browser_until = {}
+_lock = threading.Lock()
+_pool = None
+
+
+def url_pattern(url):
+    scheme, netloc, path, _, _ = urlsplit(url)
+    return f"{netloc.lower()}/{path.lstrip('/').split('/', 1)[0]}"
+
+
+def block_reason(html, listings):
+    # None, wenn die Seite per HTTP brauchbar war, sonst der Grund für den Browser
+    if listings:
+        return None
+    lowered = html.lower()
+    if any(marker in lowered for marker in CHALLENGE_MARKERS):
+        return "challenge"
+    if result_count(html) == 0 or any(marker in lowered for marker in NO_RESULTS_MARKERS):
+        return None
+    if RESULTS_MARKER not in html:
+        return "leer"
+    return None
+
+
+def uses_browser(url):
+    with _lock:
+        return _browser_until.get(url_pattern(url), 0) > time.monotonic()
+
+
+def remember_browser(url, cooldown=COOLDOWN_SECONDS):
+    with _lock:
+        _browser_until[url_pattern(url)] = time.monotonic() + cooldown
+
+
+def browser_patterns():
+    # URL-Muster, die gerade direkt per Browser geladen werden -> verbleibende Sekunden
+    now = time.monotonic()
+    with _lock:
+        return {pattern: until - now for pattern, until in _browser_until.items() if until > now}
+
+
+def _default_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            from carvis.browser import DriverPool
+            _pool = DriverPool(size=1)
+    return _pool
+
+
+def fetch_listings(url, pool=None, cooldown=COOLDOWN_SECONDS):
+    # Liefert (Inserate, letzte Seite, "requests"|"selenium") oder None bei Fehlern; passt damit als
+    # fetch_page zu crawler.crawl_pages. Ohne pool wird bei Bedarf ein eigener Browser gestartet.
+    if not uses_browser(url):
+        try:
+            html = fetch(url, retries=1).text
+        except requests.exceptions.HTTPError as e:
+            if e.response is None or e.response.status_code not in BLOCK_STATUS:
+                return None
+            reason = f"HTTP {e.response.status_code}"
+        except requests.exceptions.RequestException:
+            return None
+        else:
+            listings = parse_result_page(html)
+            reason = block_reason(html, listings)
+            if reason is None:
+                count("backend_pages_total", backend="requests")
+                return listings, last_page_number(html), "requests"
+        count("backend_fallbacks_total", reason=reason)
+        # Eine einzelne Seite ohne Ergebnisliste schaltet nicht das ganze URL-Muster auf den Browser um
+        if reason != "leer":
+            remember_browser(url, cooldown)
+
+    from carvis.browser import browser_page
+    from selenium.common.exceptions import WebDriverException
+    try:
+        listings, last_page = browser_page(pool or _default_pool(), url)
+    except (WebDriverException, TimeoutError):
+        return None
+    count("backend_pages_total", backend="selenium")
+    return listings, last_page, "selenium"
+
+
+def scrape_adaptive(url, pool=None, workers=MAX_WORKERS, max_pages=MAX_PAGES, limiter=None):
+    # Wie crawler.scrape_listings, aber jede Seite über fetch_listings. Liefert (Inserate, {Backend: Seiten}).
+    used = {}
+    first = []
+
+    def fetch_page(target):
+        result = fetch_listings(target, pool)
+        if result is None and not first:
+            raise RuntimeError(f"Seite 1 konnte weder per HTTP noch per Browser geladen werden: {target}")
+        first.append(target)
+        if result:
+            used[result[2]] = used.get(result[2], 0) + 1
+        return result
+
+    pages = crawl_pages(url, fetch_page, workers, max_pages, limiter)
+    return [listing for page in pages for listing in page], used
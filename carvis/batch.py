@@ -0,0 +1,143 @@
+# Stapelläufe ohne Streamlit: viele gespeicherte Suchen aus einer Datei auf einmal ausführen.
+# requests-Backend: ein Prozess je Suche (Parsen ist CPU-lastig), Selenium: Threads über einen DriverPool.
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import yaml
+except ImportError:  # PyYAML ist optional, ohne PyYAML nur JSON-Dateien
+    yaml = None
+
+from carvis import metrics
+from carvis.backend import fetch_listings, scrape_adaptive
+from carvis.crawler import REQUESTS_PER_SECOND, RateLimiter, _fetch_page, crawl_delta, scrape_listings
+from carvis.shards import scrape_sharded, search_params
+from carvis.store import OUTPUT_DIR
+from carvis.urls import BRANDS, SEARCH_FIELDS, generate_url
+
+PROCESSES = os.cpu_count() or 4
+SUMMARY_COLUMNS = ["Suche", "Link", "Inserate", "Sekunden", "Fehler"]
+
+
+def load_specs(path):
+    # YAML oder JSON: entweder eine Liste von Suchen oder {"defaults": {...}, "searches": [...]}.
+    # Eine Suche enthält Felder von generate_url oder "url", optional "name", "backend", "incremental"
+    # und "shard" (zu große Suchen nach Preis, Baujahr und Kilometerstand aufteilen, nur ohne "url").
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            if yaml is None:
+                raise RuntimeError("Für YAML-Dateien wird PyYAML benötigt (pip install PyYAML)")
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    if isinstance(data, list):
+        data = {"searches": data}
+    defaults = data.get("defaults") or {}
+    return [{**defaults, **spec} for spec in data.get("searches") or []]
+
+
+def brand_specs(brands=BRANDS, **defaults):
+    # Die Markenauswahl der Seiten als Stapel, z.B. für nächtliche Durchläufe
+    return [{**defaults, "query": brand} for brand in brands]
+
+
+def spec_url(spec):
+    if spec.get("url"):
+        return spec["url"]
+    return generate_url(**{field: spec[field] for field in SEARCH_FIELDS if field in spec})
+
+
+def spec_name(spec):
+    return spec.get("name") or spec.get("query") or spec_url(spec)
+
+
+def _run_spec(spec, rate=REQUESTS_PER_SECOND, pool=None):
+    # Läuft im Worker-Prozess bzw. -Thread; Fehler werden gemeldet statt den Stapel abzubrechen
+    started = time.perf_counter()
+    url = spec_url(spec)
+    watermark = None
+    try:
+        if spec.get("backend") == "selenium":
+            from carvis.browser import scrape_with_browser
+            listings = scrape_with_browser(pool, url)
+        elif spec.get("shard"):
+            if spec.get("url"):
+                raise ValueError("\"shard\" braucht die Suchfelder statt einer fertigen url")
+            fetch_page = fetch_listings if spec.get("backend") == "auto" else _fetch_page
+            listings, _ = scrape_sharded(search_params(spec), fetch_page=fetch_page, limiter=RateLimiter(rate))
+        elif spec.get("incremental"):
+            if spec.get("backend") == "auto":
+                listings, _, _, watermark = crawl_delta(url, fetch_listings, limiter=RateLimiter(rate))
+            else:
+                listings, _, _, watermark = crawl_delta(url, limiter=RateLimiter(rate))
+        elif spec.get("backend") == "auto":
+            # Jeder Worker-Prozess startet nur bei Bedarf einen eigenen Browser
+            listings, _ = scrape_adaptive(url, limiter=RateLimiter(rate))
+        else:
+            listings = scrape_listings(url, limiter=RateLimiter(rate))
+        rows, error = [listing.to_row() for listing in listings], None
+    except Exception as e:
+        rows, error, watermark = [], f"{type(e).__name__}: {e}", None
+    return spec_name(spec), url, rows, time.perf_counter() - started, error, watermark
+
+
+def _run_spec_process(spec, rate):
+    # Wie _run_spec, zusätzlich mit den Messwerten des Worker-Prozesses für den Hauptprozess
+    before = metrics.snapshot()
+    return *_run_spec(spec, rate), metrics.diff(before, metrics.snapshot())
+
+
+def _collect(futures, results, on_result):
+    for future in as_completed(futures):
+        name, url, rows, seconds, error, watermark, *measured = future.result()
+        if measured:
+            metrics.merge(measured[0])
+        # Zeilen gehen direkt an on_result (z.B. einen Export-Writer), gesammelt wird nur die Zusammenfassung.
+        # watermark (inkrementelle Suchen) setzt on_result, nachdem die Zeilen gespeichert sind.
+        results.append((name, url, len(rows), round(seconds, 2), error))
+        if on_result:
+            on_result(name, url, rows, seconds, error, watermark)
+
+
+def run_batch(specs, backend="requests", workers=None, rate=REQUESTS_PER_SECOND, on_result=None):
+    # Liefert die Zusammenfassung je Suche in Reihenfolge der Fertigstellung
+    specs = [{"backend": backend, **spec} for spec in specs]
+    http_specs = [spec for spec in specs if spec["backend"] != "selenium"]
+    browser_specs = [spec for spec in specs if spec["backend"] == "selenium"]
+    results = []
+
+    if http_specs:
+        processes = min(workers or PROCESSES, len(http_specs))
+        # Die Anfragerate pro Host gilt für den ganzen Stapel, nicht pro Prozess
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            _collect([executor.submit(_run_spec_process, spec, rate / processes) for spec in http_specs], results, on_result)
+
+    if browser_specs:
+        from carvis.browser import DriverPool
+        pool = DriverPool(size=min(workers or 2, len(browser_specs)))
+        try:
+            with ThreadPoolExecutor(max_workers=pool.size) as executor:
+                _collect([executor.submit(_run_spec, spec, pool=pool) for spec in browser_specs], results, on_result)
+        finally:
+            pool.close()
+
+    return pd.DataFrame(results, columns=SUMMARY_COLUMNS)
+
+
+def output_path(path=None):
+    return path or os.path.join(OUTPUT_DIR, f"Stapel_{datetime.now():%Y%m%d_%H%M%S}.xlsx")
+
+
+def write_summary(writer, summary):
+    # Excel: zweites Blatt in derselben Datei, sonst eine CSV-Datei daneben
+    if hasattr(writer, "add_sheet"):
+        writer.add_sheet("Zusammenfassung", summary)
+        return writer.path
+    target = os.path.splitext(writer.path)[0] + "_zusammenfassung.csv"
+    summary.to_csv(target, index=False)
+    return target
@@ -0,0 +1,180 @@
+import atexit
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from carvis import cassette
+from carvis.metrics import count, timer
+from carvis.parsing import last_page_number, listing_from_fields
+
+# Über Umgebungsvariablen konfigurierbar
+POOL_SIZE = int(os.environ.get("CARVIS_BROWSER_POOL_SIZE", "2"))
+# Nach so vielen Seitenaufrufen wird ein Browser beendet und neu gestartet
+MAX_PAGES_PER_DRIVER = int(os.environ.get("CARVIS_BROWSER_MAX_PAGES", "50"))
+CHROME_BINARY = os.environ.get("CARVIS_CHROME_BINARY")
+
+# Werden per DevTools blockiert, der Scraper braucht nur das DOM
+BLOCKED_URLS = ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.svg"]
+
+
+def chrome_options():
+    options = Options()
+    options.add_argument("--headless")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--blink-settings=imagesEnabled=false")
+    options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    # driver.get() kehrt nach DOMContentLoaded zurück, WebDriverWait übernimmt den Rest
+    options.page_load_strategy = "eager"
+    if CHROME_BINARY:
+        options.binary_location = CHROME_BINARY
+    return options
+
+
+@timer("browser_start")
+def new_driver():
+    driver = webdriver.Chrome(service=Service(), options=chrome_options())
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
+    return driver
+
+
+def is_alive(driver):
+    try:
+        driver.execute_script("return 1")
+        return True
+    except WebDriverException:
+        return False
+
+
+def quit_driver(driver):
+    try:
+        driver.quit()
+    except WebDriverException:
+        pass
+
+
+# Liest alle Anzeigen einer Ergebnisseite in einem einzigen execute_script-Aufruf aus,
+# statt mehrere WebDriver-Roundtrips pro Anzeige. Die Fallback-Selektoren decken das
+# ältere Markup ab, das pages/kleinanzeigen2.py verwendet hat.
+EXTRACT_ADS_JS = """
+return Array.from(document.querySelectorAll('article.aditem')).map(function (ad) {
+    function text(selector) {
+        var element = ad.querySelector(selector);
+        return element ? element.textContent : null;
+    }
+    var anchor = ad.querySelector('a[href]');
+    return {
+        ad_id: ad.getAttribute('data-adid'),
+        date: text('div.aditem-main--top--right'),
+        title: text('h2.text-module-begin') || text('.ellipsis'),
+        location: text('div.aditem-main--top--left'),
+        price_text: text('p.aditem-main--middle--price-shipping--price') || text('.aditem-main--price'),
+        href: ad.getAttribute('data-href') || (anchor ? anchor.getAttribute('href') : null)
+    };
+});
+"""
+
+
+@timer("extract")
+def extract_listings(driver):
+    listings = [
+        listing_from_fields(ad["ad_id"], ad["date"], ad["title"], ad["location"], ad["price_text"], ad["href"])
+        for ad in driver.execute_script(EXTRACT_ADS_JS)
+    ]
+    count("ads_parsed_total", len(listings))
+    return listings
+
+
+def browser_page(pool, url, timeout=10):
+    # Eine Ergebnisseite mit einem Browser aus dem Pool laden und auslesen; liefert (Inserate, letzte Seite)
+    with pool.driver() as driver:
+        with timer("page_load"):
+            driver.get(cassette.replay_url(url))
+            WebDriverWait(driver, timeout).until(EC.presence_of_element_located((By.CLASS_NAME, "aditem")))
+        html = driver.page_source
+        # Aufgezeichnet wird das DOM nach dem Laden, das Abspielen braucht dann kein JavaScript der Seite
+        cassette.record(url, 200, {}, html)
+        return extract_listings(driver), last_page_number(html)
+
+
+def scrape_with_browser(pool, url, timeout=10):
+    return browser_page(pool, url, timeout)[0]
+
+
+class DriverPool:
+    # Hält bis zu `size` warme Chrome-Instanzen, die sich alle Sessions teilen.
+    # Jede Ausleihe über driver() zählt als ein Seitenaufruf.
+    def __init__(self, size=POOL_SIZE, max_pages=MAX_PAGES_PER_DRIVER, factory=new_driver):
+        self.size = size
+        self.max_pages = max_pages
+        self.factory = factory
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+        self._pages = {}
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    @contextmanager
+    def driver(self, timeout=None):
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError("Kein freier Browser im Pool")
+        try:
+            driver = self._checkout()
+            healthy = True
+            try:
+                yield driver
+            except WebDriverException:
+                healthy = False
+                raise
+            finally:
+                self._checkin(driver, healthy)
+        finally:
+            self._slots.release()
+
+    def _checkout(self):
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                driver = self.factory()
+                with self._lock:
+                    self._pages[id(driver)] = 0
+                return driver
+            if is_alive(driver):
+                return driver
+            self._discard(driver)
+
+    def _checkin(self, driver, healthy):
+        with self._lock:
+            self._pages[id(driver)] = pages = self._pages.get(id(driver), 0) + 1
+        if healthy and pages < self.max_pages:
+            self._idle.put(driver)
+        else:
+            self._discard(driver)
+
+    def _discard(self, driver):
+        with self._lock:
+            self._pages.pop(id(driver), None)
+        quit_driver(driver)
+
+    def stats(self):
+        with self._lock:
+            return {"size": self.size, "idle": self._idle.qsize(), "drivers": len(self._pages)}
+
+    def close(self):
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
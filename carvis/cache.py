@@ -0,0 +1,166 @@
+# Ergebnis-Cache für Suchen, Schlüssel ist die normalisierte Such-URL. Zwei Ebenen: LRU im Speicher
+# (über st.cache_resource von allen Sessions geteilt) und optional JSON-Dateien auf der Platte.
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from carvis.store import OUTPUT_DIR
+
+CACHE_DIR = os.path.join(OUTPUT_DIR, "cache")
+TTL_SECONDS = 15 * 60
+MAX_MEMORY_BYTES = 64 * 1024 * 1024
+MAX_DISK_BYTES = 256 * 1024 * 1024
+
+
+def normalize_url(url):
+    # Gleiche Suche -> gleicher Schlüssel: Host klein, ohne Fragment, Seite 1, sortierte Parameter
+    scheme, netloc, path, query, _ = urlsplit(url.strip())
+    path = path.replace("/seite:1/", "/").rstrip("/") or "/"
+    query = urlencode(sorted(parse_qsl(query, keep_blank_values=True)))
+    return urlunsplit((scheme.lower() or "https", netloc.lower(), path, query, ""))
+
+
+def cache_key(url, backend="requests"):
+    # Selenium liest nur die erste Seite, die Ergebnisse unterscheiden sich also je Backend
+    return f"{backend}:{normalize_url(url)}"
+
+
+class ResultCache:
+    def __init__(self, ttl=TTL_SECONDS, max_bytes=MAX_MEMORY_BYTES, directory=None, max_disk_bytes=MAX_DISK_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()  # key -> (gespeichert um, Zeilen, Größe in Bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self.hits = self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, key):
+        # (Zeilen, gespeichert um) oder None, wenn nicht vorhanden oder älter als die TTL
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.time() - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1], entry[0]
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry:
+                self._remember(key, *entry)
+                self.hits += 1
+                return entry[1], entry[0]
+            self.misses += 1
+        return None
+
+    def put(self, key, rows):
+        stored_at = time.time()
+        payload = json.dumps({"key": key, "stored_at": stored_at, "rows": rows}, ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            self._remember(key, stored_at, rows, len(payload))
+        if self.directory:
+            self._write_disk(key, payload)
+
+    def get_or_scrape(self, key, scrape, force=False):
+        # Liefert (Zeilen, gespeichert um, aus dem Cache?). Gleichzeitige Anfragen für dieselbe Suche
+        # warten aufeinander, sodass nur eine davon tatsächlich scrapt.
+        if not force:
+            hit = self.get(key)
+            if hit:
+                return hit[0], hit[1], True
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if not force:
+                hit = self.get(key)
+                if hit:
+                    return hit[0], hit[1], True
+            rows = scrape()
+            if rows:
+                self.put(key, rows)
+            return rows, time.time(), False
+
+    def invalidate(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry:
+                self._bytes -= entry[2]
+        if self.directory and os.path.exists(self._path(key)):
+            os.remove(self._path(key))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.directory:
+            for name in os.listdir(self.directory):
+                if name.endswith(".json"):
+                    os.remove(os.path.join(self.directory, name))
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+    # Intern
+
+    def _remember(self, key, stored_at, rows, size):
+        # LRU nach Größe: die am längsten nicht genutzten Einträge fliegen zuerst raus
+        old = self._entries.pop(key, None)
+        if old:
+            self._bytes -= old[2]
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (stored_at, rows, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self._bytes -= evicted
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+    def _read_disk(self, key):
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                payload = f.read()
+            data = json.loads(payload)
+        except (OSError, ValueError):
+            return None
+        if data.get("key") != key or time.time() - data["stored_at"] >= self.ttl:
+            return None
+        os.utime(path)  # Zugriffszeit für die LRU-Verdrängung auf der Platte
+        return data["stored_at"], data["rows"], len(payload)
+
+    def _write_disk(self, key, payload):
+        path = self._path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(payload)
+        os.replace(tmp, path)
+        self._evict_disk()
+
+    def _evict_disk(self):
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for mtime, size, path in sorted(files):
+            if total <= self.max_disk_bytes and time.time() - mtime < self.ttl:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
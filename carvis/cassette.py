@@ -0,0 +1,189 @@
+# Aufzeichnen und Abspielen von Seitenabrufen ("Kassette") für Offline-Läufe und reproduzierbare Messungen.
+#   CARVIS_CASSETTE=archiv.sqlite CARVIS_CASSETTE_MODE=record  -> jede geladene Seite wird gespeichert
+#   CARVIS_CASSETTE=archiv.sqlite CARVIS_CASSETTE_MODE=replay  -> Seiten kommen von einem lokalen HTTP-Server
+# Beim Abspielen werden alle URLs auf den lokalen Server umgeschrieben, für requests und Selenium gleichermaßen.
+# Nicht aufgezeichnete Seiten liefern 404.
+import json
+import os
+import sqlite3
+import sys
+import threading
+import zlib
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote, urlsplit, urlunsplit
+
+from carvis.cache import normalize_url
+
+CASSETTE = os.environ.get("CARVIS_CASSETTE")
+MODE = os.environ.get("CARVIS_CASSETTE_MODE", "replay")
+
+# Werden nicht gespeichert: der Body liegt entpackt vor und wird beim Abspielen neu verpackt
+_SKIP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive", "set-cookie", "date"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    recorded_at TEXT NOT NULL
+);
+"""
+
+
+def _key(url):
+    # Prozentkodierung vereinheitlichen: "%2C" und "," bzw. "ü" und "%C3%BC" treffen denselben Eintrag
+    scheme, netloc, path, query, fragment = urlsplit(normalize_url(url))
+    return urlunsplit((scheme, netloc, quote(unquote(path), safe="/:+,;=@"), query, fragment))
+
+
+class Cassette:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        # Eine Verbindung pro Thread und Prozess; WAL, damit Prozess-Pools gleichzeitig aufzeichnen können
+        if getattr(self._local, "pid", None) != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._local.conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn.execute("PRAGMA journal_mode=WAL")
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def record(self, url, status, headers, body):
+        headers = {name: value for name, value in headers.items() if name.lower() not in _SKIP_HEADERS}
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+            headers.setdefault("Content-Type", "text/html; charset=utf-8")
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO pages (url, status, headers, body, recorded_at) VALUES (?, ?, ?, ?, ?)",
+                (_key(url), status, json.dumps(headers), zlib.compress(body, 6), datetime.now().isoformat(timespec="seconds")),
+            )
+
+    def lookup(self, url):
+        # (Status, Header, Body) oder None
+        row = self._connect().execute("SELECT status, headers, body FROM pages WHERE url = ?", (_key(url),)).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]), zlib.decompress(row[2])
+
+    def urls(self):
+        return [row[0] for row in self._connect().execute("SELECT url FROM pages ORDER BY url")]
+
+
+class ReplayServer:
+    # Lokaler HTTP-Server: /<schema>/<host>/<pfad>?<query> liefert die aufgezeichnete Seite zu <schema>://<host>/<pfad>?<query>
+    def __init__(self, cassette, host="127.0.0.1", port=0):
+        self.cassette = cassette
+        handler = type("Handler", (_ReplayHandler,), {"cassette": cassette})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self.base_url = f"http://{host}:{self._server.server_port}"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="carvis-replay", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def url_for(self, url):
+        if url.startswith(self.base_url):
+            return url
+        scheme, netloc, path, query, _ = urlsplit(url)
+        return f"{self.base_url}/{scheme}/{netloc}{path or '/'}" + (f"?{query}" if query else "")
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    cassette = None
+
+    def do_GET(self):
+        scheme, _, rest = self.path.lstrip("/").partition("/")
+        netloc, _, path = rest.partition("/")
+        path, _, query = path.partition("?")
+        original = f"{scheme}://{netloc}/{path}" + (f"?{query}" if query else "")
+        page = self.cassette.lookup(original)
+        if page is None:
+            status, headers, body = 404, {"Content-Type": "text/plain; charset=utf-8"}, f"Nicht aufgezeichnet: {original}".encode("utf-8")
+        else:
+            status, headers, body = page
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_active = None
+_active_lock = threading.RLock()
+
+
+def activate(path, mode="replay"):
+    # Programmgesteuert statt über Umgebungsvariablen, z.B. in Benchmarks; path=None schaltet ab
+    global _active
+    if mode not in ("record", "replay"):
+        raise ValueError(f"Unbekannter Kassetten-Modus: {mode}")
+    with _active_lock:
+        # Der Server eines Elternprozesses (fork) läuft dort weiter und wird hier nur ersetzt
+        if _active and _active[2] and _active[3] == os.getpid():
+            _active[2].stop()
+        _active = None
+        if path:
+            cassette = Cassette(path)
+            server = ReplayServer(cassette).start() if mode == "replay" else None
+            _active = (mode, cassette, server, os.getpid())
+    return _active
+
+
+def _current():
+    if CASSETTE and (_active is None or _active[3] != os.getpid()):
+        with _active_lock:
+            if _active is None or _active[3] != os.getpid():
+                activate(CASSETTE, MODE)
+    return _active
+
+
+def replay_url(url):
+    # Im Abspielmodus die URL auf den lokalen Server umschreiben, sonst unverändert
+    active = _current()
+    return active[2].url_for(url) if active and active[0] == "replay" else url
+
+
+def record(url, status, headers, body):
+    active = _current()
+    if active and active[0] == "record":
+        active[1].record(url, status, headers, body)
+
+
+def main(argv=None):
+    # python -m carvis.cassette archiv.sqlite: Archiv auflisten und per HTTP bereitstellen
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print("Aufruf: python -m carvis.cassette archiv.sqlite [port]")
+        return 2
+    cassette = Cassette(argv[0])
+    server = ReplayServer(cassette, port=int(argv[1]) if len(argv) > 1 else 0)
+    for url in cassette.urls():
+        print(server.url_for(url))
+    print(f"Bereit auf {server.base_url} (Strg+C beendet)")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
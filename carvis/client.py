@@ -0,0 +1,96 @@
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from carvis import cassette
+from carvis.metrics import count
+
+# Wird einmal geladen und pro Anfrage rotiert (ersetzt fake_useragent)
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36 Edg/123.0.0.0",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:125.0) Gecko/20100101 Firefox/125.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Safari/605.1.15",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14.4; rv:125.0) Gecko/20100101 Firefox/125.0",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:125.0) Gecko/20100101 Firefox/125.0",
+]
+
+DEFAULT_HEADERS = {
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'de-DE,de;q=0.9,en-US;q=0.8,en;q=0.7',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+    'Referer': 'https://www.google.com/',
+    'DNT': '1',  # Do Not Track
+}
+
+# (Verbindungsaufbau, Lesen) in Sekunden
+TIMEOUT = (5, 15)
+MAX_RETRIES = 3
+RETRY_STATUS = {429, 500, 502, 503, 504}
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+POOL_SIZE = 10
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    # Eine gemeinsame Session hält die Verbindungen (Keep-Alive, TLS) über alle Abrufe hinweg offen
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update(DEFAULT_HEADERS)
+            _session = session
+    return _session
+
+
+def random_user_agent():
+    return random.choice(USER_AGENTS)
+
+
+def backoff_delay(attempt, retry_after=None):
+    # Exponentielles Backoff mit Jitter; ein Retry-After-Header des Servers hat Vorrang
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), BACKOFF_MAX)
+    return random.uniform(0.5, 1.0) * min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+
+
+def fetch(url, timeout=TIMEOUT, retries=MAX_RETRIES, **kwargs):
+    # GET über die gemeinsame Session; wiederholt bei Verbindungsfehlern, Timeouts und 429/5xx.
+    # Nach dem letzten Versuch wird die jeweilige requests-Exception weitergereicht.
+    # Im Abspielmodus der Kassette kommt die Seite vom lokalen Server statt aus dem Netz
+    session = get_session()
+    target = cassette.replay_url(url)
+    headers = {'User-Agent': random_user_agent(), **kwargs.pop("headers", {})}
+    for attempt in range(retries + 1):
+        retry_after = None
+        try:
+            response = session.get(target, headers=headers, timeout=timeout, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as error:
+            count("http_requests_total", status=type(error).__name__)
+            if attempt == retries:
+                count("http_errors_total")
+                raise
+        else:
+            count("http_requests_total", status=response.status_code)
+            count("http_bytes_total", len(response.content))
+            if response.status_code not in RETRY_STATUS or attempt == retries:
+                cassette.record(url, response.status_code, response.headers, response.content)
+                if response.status_code >= 400:
+                    count("http_errors_total")
+                response.raise_for_status()
+                return response
+            retry_after = response.headers.get("Retry-After")
+        count("http_retries_total")
+        time.sleep(backoff_delay(attempt, retry_after))
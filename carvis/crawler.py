@@ -0,0 +1,147 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+
+from carvis.client import fetch
+from carvis.metrics import timer
+from carvis.parsing import last_page_number, parse_result_page
+from carvis.store import TRACKER_DB, get_watermark, known_prices
+from carvis.urls import newest_first
+
+# Kleinanzeigen liefert nie mehr als 50 Ergebnisseiten pro Suche
+MAX_PAGES = 50
+# Inserate je Ergebnisseite
+PAGE_SIZE = 25
+MAX_WORKERS = 4
+# Anfragen pro Sekunde und Host
+REQUESTS_PER_SECOND = 2.0
+
+_PAGE_SEGMENT = re.compile(r"/seite:\d+(?=/)")
+
+
+def page_url(url, page):
+    # "/seite:N" steht direkt vor dem letzten Pfadsegment (z.B. ".../seite:2/k0c216")
+    scheme, netloc, path, query, fragment = urlsplit(url)
+    path = _PAGE_SEGMENT.sub("", path.rstrip("/"))
+    if page > 1:
+        head, _, tail = path.rpartition("/")
+        path = f"{head}/seite:{page}/{tail}"
+    return urlunsplit((scheme, netloc, path, query, fragment))
+
+
+class RateLimiter:
+    # Verteilt Anfragen je Host auf feste Zeitschlitze, thread-sicher
+    def __init__(self, rate=REQUESTS_PER_SECOND):
+        self.interval = 1.0 / rate
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def wait(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+@timer("crawl")
+def crawl_pages(url, fetch_page, workers=MAX_WORKERS, max_pages=MAX_PAGES, limiter=None, initializer=None, stop=None):
+    # fetch_page(page_url) liefert (listings, letzte_bekannte_seite) oder None bei Fehlern.
+    # Seite 1 wird zuerst geladen, danach die restlichen Seiten in Wellen parallel.
+    # Das Ergebnis ist eine Liste der Anzeigen je Seite, in Seitenreihenfolge.
+    # stop(listings) -> True beendet den Crawl nach dieser Seite; die Wellen sind dann nur
+    # so groß wie die Zahl der Worker, damit möglichst wenige Seiten umsonst geladen werden.
+    limiter = limiter or RateLimiter()
+
+    def fetch(page):
+        target = page_url(url, page)
+        limiter.wait(target)
+        return fetch_page(target)
+
+    first = fetch(1)
+    if not first or not first[0]:
+        return []
+    pages = [first[0]]
+    last_page = min(first[1] or 1, max_pages)
+    if stop and stop(first[0]):
+        return pages
+
+    with ThreadPoolExecutor(max_workers=workers, initializer=initializer) as pool:
+        next_page = 2
+        while next_page <= last_page:
+            # Die Paginierung zeigt nur ein Fenster an Seitenzahlen, daher in Wellen nachladen
+            wave = range(next_page, (min(last_page, next_page + workers - 1) if stop else last_page) + 1)
+            results = list(pool.map(fetch, wave))
+            for result in results:
+                if not result or not result[0]:
+                    return pages
+                pages.append(result[0])
+                if stop and stop(result[0]):
+                    return pages
+            next_page = wave[-1] + 1
+            last_page = min(max(last_page, results[-1][1] or 0), max_pages)
+    return pages
+
+
+def _parse_page(html):
+    return parse_result_page(html), last_page_number(html)
+
+
+def _fetch_page(target):
+    # Ohne Streamlit: Seiten mit Fehlern beenden den Crawl
+    try:
+        return _parse_page(fetch(target).text)
+    except requests.exceptions.RequestException:
+        return None
+
+
+def scrape_listings(url, workers=MAX_WORKERS, max_pages=MAX_PAGES, limiter=None):
+    # Alle Ergebnisseiten per HTTP laden und parsen. Schlägt schon Seite 1 fehl, wird der Fehler
+    # weitergereicht, damit Scheduler und Stapelläufe ihn melden statt 0 Inserate zu zählen.
+    first = []
+
+    def fetch_page(target):
+        if first:
+            return _fetch_page(target)
+        first.append(target)
+        return _parse_page(fetch(target).text)
+
+    return [listing for page in crawl_pages(url, fetch_page, workers, max_pages, limiter) for listing in page]
+
+
+def crawl_delta(url, fetch_page=_fetch_page, path=TRACKER_DB, workers=MAX_WORKERS, max_pages=MAX_PAGES, limiter=None, initializer=None):
+    # Inkrementeller Crawl: Ergebnisse neueste zuerst, Abbruch nach der ersten Seite, auf der jedes
+    # Inserat unverändert im Tracker steht oder nicht neuer als die Wasserstandsmarke der Suche ist.
+    # Liefert (neue + geänderte Inserate, alle geladenen Inserate, Anzahl geladener Seiten, Wasserstandsmarke).
+    # Die Marke (URL, höchste Inserat ID) setzt erst der Aufrufer, sobald die Inserate gespeichert sind
+    # (upsert_listings(..., watermark=...) oder store.set_watermark); sonst gingen sie beim nächsten Lauf verloren.
+    url = newest_first(url)
+    watermark = get_watermark(url, path)
+    known = {}
+
+    def changed(listing):
+        # Inserate ohne Tracker-Eintrag bis zur Wasserstandsmarke wurden schon in einem früheren Lauf geliefert
+        if listing.ad_id in known:
+            return known[listing.ad_id] != listing.price
+        return not (listing.ad_id and watermark and _numeric_id(listing.ad_id) <= watermark)
+
+    def stop(listings):
+        known.update(known_prices([listing.ad_id for listing in listings if listing.ad_id], path))
+        return not any(changed(listing) for listing in listings)
+
+    pages = crawl_pages(url, fetch_page, workers, max_pages, limiter, initializer, stop=stop)
+    seen = [listing for page in pages for listing in page]
+    delta = [listing for listing in seen if changed(listing)]
+    max_ad_id = max((_numeric_id(listing.ad_id) for listing in seen), default=0)
+    return delta, seen, len(pages), (url, max_ad_id) if max_ad_id else None
+
+
+def _numeric_id(ad_id):
+    return int(ad_id) if ad_id and ad_id.isdigit() else 0
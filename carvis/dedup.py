@@ -0,0 +1,168 @@
+# Dublettenerkennung: exakt über die Inserat ID, unscharf (Reposts unter neuer ID) per MinHash/LSH
+import re
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from carvis.metrics import count, timer
+
+_DATE = re.compile(r"(\d{1,2})\.(\d{1,2})\.(\d{4})")
+_TIME = re.compile(r"(\d{1,2}):(\d{2})")
+_TOKEN = re.compile(r"[a-zäöüß0-9]+")
+_UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+
+NUM_PERM = 64
+BANDS = 16
+THRESHOLD = 0.8
+# Preisabweichung, bis zu der zwei Inserate noch als dasselbe Fahrzeug gelten
+PRICE_TOLERANCE = 0.1
+# Größere LSH-Buckets werden nur paarweise benachbart verglichen statt jeder mit jedem
+MAX_BUCKET_PAIRS = 50
+_PRIME = np.uint64(4294967311)
+
+
+def parse_ad_date(text, now=None):
+    # "Heute, 12:54", "Gestern", "20.03.2025" -> datetime; None, wenn nicht erkennbar
+    if not isinstance(text, str):
+        return None
+    now = now or datetime.now()
+    lowered = text.strip().lower()
+    if lowered.startswith("heute"):
+        day = now
+    elif lowered.startswith("gestern"):
+        day = now - timedelta(days=1)
+    else:
+        match = _DATE.search(lowered)
+        if not match:
+            return None
+        day_, month, year = map(int, match.groups())
+        try:
+            day = datetime(year, month, day_)
+        except ValueError:
+            return None
+    hour, minute = map(int, _TIME.search(lowered).groups()) if _TIME.search(lowered) else (0, 0)
+    return day.replace(hour=hour, minute=minute, second=0, microsecond=0)
+
+
+def normalize_date(text, now=None):
+    # Relative Angaben in ein festes Datum umschreiben, damit ältere Ausgaben vergleichbar bleiben
+    parsed = parse_ad_date(text, now)
+    return parsed.strftime("%d.%m.%Y") if parsed else text
+
+
+@timer("dedup")
+def dedup_listings(rows):
+    # Exakt per Inserat ID; taucht eine ID mehrfach auf, gilt die zuletzt geladene Zeile. Inserate mit
+    # verschiedenen IDs bleiben immer erhalten, mögliche Reposts meldet find_reposts, ohne etwas zu verwerfen.
+    by_id = {}
+    for row in rows:
+        by_id[row.get("Inserat ID") or id(row)] = row
+    count("ads_deduplicated_total", len(rows) - len(by_id))
+    return list(by_id.values())
+
+
+def _token_ids(df):
+    # Wörter und Wortpaare des normalisierten Titels plus ein PLZ-Token als 64-Bit-Schlüssel (Tokenart in den
+    # oberen Bits). Der Preis steckt bewusst nicht in der Signatur, ihn prüft find_reposts danach mit
+    # PRICE_TOLERANCE. Liefert (Dokumentindex, Schlüssel), nach Dokument sortiert.
+    words = df["Titel"].fillna("").astype(str).str.lower().str.findall(_TOKEN).explode().dropna()
+    doc = words.index.to_numpy()
+    codes, uniques = pd.factorize(words.to_numpy(dtype=object))
+    # Umlaute nur auf den eindeutigen Wörtern falten ("tüv" und "tuev" werden dasselbe Token)
+    folded = pd.factorize(np.array([word.translate(_UMLAUTS) for word in uniques], dtype=object))[0]
+    word_ids = folded[codes].astype(np.uint64)
+    same_doc = doc[:-1] == doc[1:]
+    bigram_ids = (word_ids[:-1][same_doc] << np.uint64(28)) | word_ids[1:][same_doc]
+    plz_ids = pd.factorize(df["Postleitzahl"].astype(str))[0].astype(np.uint64)
+
+    docs = np.concatenate((doc, doc[:-1][same_doc], np.arange(len(df))))
+    tokens = np.concatenate((
+        word_ids | np.uint64(1 << 60),
+        bigram_ids | np.uint64(2 << 60),
+        plz_ids | np.uint64(3 << 60),
+    ))
+    order = np.argsort(docs, kind="stable")
+    return docs[order], tokens[order]
+
+
+def minhash_signatures(docs, tokens, n_docs, num_perm=NUM_PERM, seed=1, chunk_tokens=200_000):
+    # Multiply-Shift-Hashing je Permutation, Minimum je Dokument per np.minimum.reduceat.
+    # docs muss aufsteigend sortiert sein und jedes Dokument mindestens ein Token haben.
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2**63, size=(num_perm, 1), dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    b = rng.integers(0, 2**63, size=(num_perm, 1), dtype=np.uint64)
+    starts = np.searchsorted(docs, np.arange(n_docs))
+    ends = np.append(starts[1:], len(docs))
+    signatures = np.empty((n_docs, num_perm), dtype=np.uint32)
+    doc = 0
+    while doc < n_docs:
+        # Dokumente so bündeln, dass die Hash-Matrix (num_perm x Tokens) klein bleibt
+        end = max(doc + 1, int(np.searchsorted(ends, starts[doc] + chunk_tokens, side="right")))
+        lo, hi = starts[doc], ends[end - 1]
+        permuted = (a * tokens[lo:hi] + b) >> np.uint64(32)
+        signatures[doc:end] = np.minimum.reduceat(permuted, starts[doc:end] - lo, axis=1).T
+        doc = end
+    return signatures
+
+
+def _candidate_pairs(signatures, bands, group):
+    # LSH: Inserate, die in mindestens einem Band übereinstimmen und dieselbe Gruppe (PLZ)
+    # haben, werden Kandidaten. Innerhalb eines Buckets wird jedes Inserat mit seinen
+    # nächsten MAX_BUCKET_PAIRS Nachbarn gepaart, damit große Buckets nicht quadratisch wachsen.
+    rows = signatures.shape[1] // bands
+    mix = np.array([(0x9E3779B97F4A7C15 * (k + 1) & 0xFFFFFFFFFFFFFFFF) | 1 for k in range(rows + 1)], dtype=np.uint64)
+    pairs = []
+    for band in range(bands):
+        keys = (signatures[:, band * rows:(band + 1) * rows].astype(np.uint64) * mix[:rows]).sum(axis=1)
+        keys += group * mix[rows]
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        for offset in range(1, MAX_BUCKET_PAIRS + 1):
+            same = sorted_keys[:-offset] == sorted_keys[offset:]
+            if not same.any():
+                break
+            pairs.append(np.column_stack((order[:-offset][same], order[offset:][same])))
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int64)
+    pairs = np.sort(np.concatenate(pairs), axis=1)
+    return np.unique(pairs, axis=0)
+
+
+@timer("reposts")
+def find_reposts(df, ids=None, threshold=THRESHOLD, num_perm=NUM_PERM, bands=BANDS):
+    # Sucht dasselbe Fahrzeug unter verschiedenen Inserat IDs: ähnlicher Titel per LSH, gleiche PLZ und
+    # Preise innerhalb von PRICE_TOLERANCE. Es wird nur gemeldet, nichts verworfen.
+    # Liefert je Repost das ähnlichste ältere Inserat; mit `ids` nur Paare, an denen diese IDs beteiligt sind.
+    columns = ["Inserat ID", "Repost von", "Ähnlichkeit"]
+    df = df.dropna(subset=["Inserat ID"]).drop_duplicates("Inserat ID").reset_index(drop=True)
+    if len(df) < 2:
+        return pd.DataFrame(columns=columns)
+
+    ad_ids = df["Inserat ID"].astype(str).to_numpy()
+    prices = pd.to_numeric(df["Preis"], errors="coerce").to_numpy(dtype=float)
+    plz = df["Postleitzahl"].astype(str).to_numpy()
+    docs, tokens = _token_ids(df)
+    signatures = minhash_signatures(docs, tokens, len(df), num_perm)
+
+    plz_group, _ = pd.factorize(plz)
+    pairs = _candidate_pairs(signatures, bands, plz_group.astype(np.uint64))
+    left, right = pairs[:, 0], pairs[:, 1]
+    similarity = (signatures[left] == signatures[right]).mean(axis=1)
+    price_ok = np.abs(prices[left] - prices[right]) <= PRICE_TOLERANCE * np.fmax(prices[left], prices[right])
+    keep = (similarity >= threshold) & (plz[left] == plz[right])
+    keep &= price_ok | (np.isnan(prices[left]) & np.isnan(prices[right]))
+    left, right, similarity = left[keep], right[keep], similarity[keep]
+
+    # Die höhere Inserat ID ist das jüngere Inserat
+    numeric = pd.to_numeric(pd.Series(ad_ids), errors="coerce").fillna(0).to_numpy()
+    newer_is_left = numeric[left] > numeric[right]
+    newer = np.where(newer_is_left, left, right)
+    older = np.where(newer_is_left, right, left)
+
+    result = pd.DataFrame({"Inserat ID": ad_ids[newer], "Repost von": ad_ids[older], "Ähnlichkeit": similarity})
+    if ids is not None:
+        ids = {str(ad_id) for ad_id in ids}
+        result = result[result["Inserat ID"].isin(ids) | result["Repost von"].isin(ids)]
+    result = result.sort_values("Ähnlichkeit", ascending=False).drop_duplicates("Inserat ID")
+    return result.sort_values("Inserat ID").reset_index(drop=True)[columns]
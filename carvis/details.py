@@ -0,0 +1,148 @@
+# Detailseiten der Inserate nachladen: Kilometerstand, Erstzulassung, Leistung, Kraftstoff, Getriebe.
+# Ergebnisse liegen in der Tracker-Datenbank, Schlüssel ist die Inserat ID plus ein Hash der Listenfelder;
+# solange sich Titel, Preis und Link nicht ändern, wird die Detailseite nicht erneut geladen.
+import hashlib
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+except ImportError:  # ohne lxml wird BeautifulSoup genutzt
+    lxml = None
+
+from carvis.client import fetch
+from carvis.crawler import MAX_WORKERS, REQUESTS_PER_SECOND, RateLimiter
+from carvis.metrics import timer
+from carvis.store import TRACKER_DB, connect, normalize_id, transaction
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS details (
+    ad_id TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    fetched_at TEXT NOT NULL,
+    attributes TEXT NOT NULL,
+    PRIMARY KEY (ad_id, content_hash)
+);
+"""
+
+# Spalten, die an die Inserate angehängt werden, und ihre Bezeichnung in der Attributliste der Detailseite
+DETAIL_COLUMNS = ["Kilometerstand", "Erstzulassung", "Leistung (PS)", "Kraftstoff", "Getriebe"]
+_LABELS = {
+    "Kilometerstand": "Kilometerstand",
+    "Erstzulassung": "Erstzulassung",
+    "Leistung": "Leistung (PS)",
+    "Kraftstoffart": "Kraftstoff",
+    "Getriebe": "Getriebe",
+}
+_DETAIL_XPATH = "//li[contains(concat(' ', normalize-space(@class), ' '), ' addetailslist--detail ')]"
+_VALUE_CLASS = "addetailslist--detail--value"
+_NUMBER = re.compile(r"\d[\d.]*")
+
+
+def content_hash(row):
+    # Ändert sich, sobald sich das Inserat in der Ergebnisliste sichtbar ändert. Das Datum gehört nicht dazu:
+    # es wandert bei demselben Inserat von "Heute, …" über "Gestern, …" zu einem festen Datum.
+    text = "\x1f".join(str(row.get(column)) for column in ("Titel", "Preis", "Link"))
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def parse_detail_page(html):
+    # Attributliste "Kilometerstand: 150.000 km" usw. als {Bezeichnung: Wert}
+    attributes = {}
+    if lxml:
+        for item in lxml.html.fromstring(html).xpath(_DETAIL_XPATH):
+            value = item.find_class(_VALUE_CLASS)
+            if value:
+                label = (item.text or "").strip() or item.text_content().replace(value[0].text_content(), "").strip()
+                attributes[label] = " ".join(value[0].text_content().split())
+    else:
+        soup = BeautifulSoup(html, "html.parser")
+        for item in soup.find_all("li", class_="addetailslist--detail"):
+            value = item.find("span", class_=_VALUE_CLASS)
+            if value:
+                label = item.get_text().replace(value.get_text(), "").strip()
+                attributes[label] = " ".join(value.get_text().split())
+    return attributes
+
+
+def _number(text):
+    match = _NUMBER.search(text or "")
+    return int(match.group().replace(".", "")) if match else None
+
+
+def detail_fields(attributes):
+    # Rohattribute -> DETAIL_COLUMNS; Zahlen als int, der Rest als Text
+    fields = {column: attributes.get(label) for label, column in _LABELS.items()}
+    fields["Kilometerstand"] = _number(fields["Kilometerstand"])
+    fields["Leistung (PS)"] = _number(fields["Leistung (PS)"])
+    return fields
+
+
+def _load_cached(keys, path):
+    ids = sorted({ad_id for ad_id, _ in keys})
+    cached = {}
+    with connect(path) as conn:
+        conn.executescript(SCHEMA)
+        for chunk in range(0, len(ids), 500):
+            part = ids[chunk:chunk + 500]
+            placeholders = ",".join("?" * len(part))
+            for ad_id, digest, attributes in conn.execute(f"SELECT ad_id, content_hash, attributes FROM details WHERE ad_id IN ({placeholders})", part):
+                if (ad_id, digest) in keys:
+                    cached[(ad_id, digest)] = json.loads(attributes)
+    return cached
+
+
+def _store(results, path):
+    fetched_at = datetime.now().isoformat(timespec="seconds")
+    with connect(path) as conn, transaction(conn):
+        conn.executemany(
+            "INSERT OR REPLACE INTO details (ad_id, content_hash, fetched_at, attributes) VALUES (?, ?, ?, ?)",
+            [(ad_id, digest, fetched_at, json.dumps(attributes, ensure_ascii=False)) for (ad_id, digest), attributes in results.items()],
+        )
+
+
+def _fetch_html(url):
+    response = fetch(url)
+    # Ohne charset im Content-Type würde requests ISO-8859-1 annehmen; die Seiten sind UTF-8
+    if "charset" not in response.headers.get("Content-Type", "").lower():
+        response.encoding = "utf-8"
+    return response.text
+
+
+@timer("details")
+def enrich_listings(rows, path=TRACKER_DB, workers=MAX_WORKERS, rate=REQUESTS_PER_SECOND, fetch_html=None):
+    # Hängt DETAIL_COLUMNS an die Zeilen (Dicts mit den Excel-Spalten) an. Nicht gecachte Detailseiten
+    # werden parallel und gedrosselt geladen. Liefert (Zeilen, {"cache": n, "geladen": n, "fehler": n}).
+    fetch_html = fetch_html or _fetch_html
+    keys = [(normalize_id(row.get("Inserat ID")), content_hash(row)) for row in rows]
+    cached = _load_cached({key for key in keys if key[0]}, path)
+    missing = {key: row["Link"] for key, row in zip(keys, rows) if key[0] and key not in cached and str(row.get("Link", "")).startswith("http")}
+    limiter = RateLimiter(rate)
+
+    def load(item):
+        key, url = item
+        limiter.wait(url)
+        try:
+            return key, parse_detail_page(fetch_html(url))
+        except requests.exceptions.RequestException:
+            return key, None
+
+    fetched = {}
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for key, attributes in pool.map(load, missing.items()):
+            if attributes is None:
+                failed += 1
+            else:
+                fetched[key] = attributes
+    if fetched:
+        _store(fetched, path)
+
+    attributes = {**cached, **fetched}
+    enriched = [{**row, **detail_fields(attributes.get(key, {}))} for key, row in zip(keys, rows)]
+    return enriched, {"cache": len(cached), "geladen": len(fetched), "fehler": failed}
@@ -0,0 +1,175 @@
+# Streaming-Export nach CSV, Parquet oder Excel (xlsxwriter im constant_memory-Modus).
+# Zeilen werden geschrieben, sobald sie vorliegen; IDs und PLZ bleiben Text.
+import csv
+import os
+
+try:
+    import xlsxwriter
+except ImportError:  # xlsxwriter ist optional, ohne xlsxwriter nur CSV/Parquet
+    xlsxwriter = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow ist optional, ohne pyarrow kein Parquet
+    pa = None
+
+from carvis.metrics import timer
+from carvis.parsing import COLUMNS
+from carvis.store import TRACKER_DB, iter_tracker, normalize_id, normalize_plz
+
+# Spalte -> Typ; unbekannte Spalten werden als Text geschrieben
+SCHEMA = {
+    "Inserat ID": "id",
+    "Postleitzahl": "plz",
+    "Preis": "int",
+    "VB": "bool",
+    "Kilometerstand": "int",
+    "Leistung (PS)": "int",
+}
+TRACKER_COLUMNS = COLUMNS + ["Erstmals gesehen", "Zuletzt gesehen"]
+PARQUET_BATCH = 10_000
+
+
+def _missing(value):
+    return value is None or value != value  # NaN
+
+
+def _coerce(value, kind):
+    if _missing(value):
+        return None
+    if kind == "id":
+        return normalize_id(value)
+    if kind == "plz":
+        return normalize_plz(value)
+    if kind == "int":
+        return int(value)
+    if kind == "bool":
+        return value.strip().lower() == "true" if isinstance(value, str) else bool(value)
+    return str(value)
+
+
+class _Writer:
+    def __init__(self, path, columns=COLUMNS):
+        self.path = path
+        self.columns = list(columns)
+        self.kinds = [SCHEMA.get(column, "text") for column in self.columns]
+        self.rows = 0
+
+    def _values(self, row):
+        return [_coerce(row.get(column), kind) for column, kind in zip(self.columns, self.kinds)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CsvWriter(_Writer):
+    def __init__(self, path, columns=COLUMNS):
+        super().__init__(path, columns)
+        # utf-8-sig, damit Excel Umlaute richtig anzeigt
+        self._file = open(path, "w", newline="", encoding="utf-8-sig")
+        self._csv = csv.writer(self._file)
+        self._csv.writerow(self.columns)
+
+    def write_rows(self, rows):
+        for row in rows:
+            self._csv.writerow(["" if value is None else value for value in self._values(row)])
+            self.rows += 1
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter(_Writer):
+    _TYPES = {"int": "int64", "bool": "bool_"}
+
+    def __init__(self, path, columns=COLUMNS):
+        if pa is None:
+            raise RuntimeError("Für Parquet wird pyarrow benötigt (pip install pyarrow)")
+        super().__init__(path, columns)
+        self.schema = pa.schema([(column, getattr(pa, self._TYPES.get(kind, "string"))()) for column, kind in zip(self.columns, self.kinds)])
+        self._writer = pq.ParquetWriter(path, self.schema)
+        self._buffer = []
+
+    def write_rows(self, rows):
+        for row in rows:
+            self._buffer.append(self._values(row))
+            self.rows += 1
+            if len(self._buffer) >= PARQUET_BATCH:
+                self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            columns = list(zip(*self._buffer))
+            self._writer.write_batch(pa.RecordBatch.from_arrays([pa.array(c, f.type) for c, f in zip(columns, self.schema)], schema=self.schema))
+            self._buffer = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+class XlsxWriter(_Writer):
+    # constant_memory: jede Zeile wird beim Beginn der nächsten auf die Platte geschrieben
+    def __init__(self, path, columns=COLUMNS, sheet="Inserate"):
+        if xlsxwriter is None:
+            raise RuntimeError("Für den Excel-Export wird xlsxwriter benötigt (pip install xlsxwriter)")
+        super().__init__(path, columns)
+        self._book = xlsxwriter.Workbook(path, {"constant_memory": True, "strings_to_urls": False})
+        self._bold = self._book.add_format({"bold": True})
+        self._sheet = self._add_sheet(sheet, self.columns)
+
+    def _add_sheet(self, name, columns):
+        sheet = self._book.add_worksheet(name)
+        sheet.write_row(0, 0, columns, self._bold)
+        sheet.freeze_panes(1, 0)
+        return sheet
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.rows += 1
+            for col, (value, kind) in enumerate(zip(self._values(row), self.kinds)):
+                if value is None:
+                    continue
+                if kind == "int":
+                    self._sheet.write_number(self.rows, col, value)
+                elif kind == "bool":
+                    self._sheet.write_boolean(self.rows, col, value)
+                else:
+                    self._sheet.write_string(self.rows, col, value)
+
+    def add_sheet(self, name, df):
+        # Weiteres Blatt aus einem kleinen DataFrame, z.B. eine Zusammenfassung
+        sheet = self._add_sheet(name, list(df.columns))
+        for i, values in enumerate(df.astype(object).where(df.notna(), None).itertuples(index=False), start=1):
+            sheet.write_row(i, 0, values)
+
+    def close(self):
+        self._book.close()
+
+
+FORMATS = {".xlsx": XlsxWriter, ".csv": CsvWriter, ".parquet": ParquetWriter}
+
+
+def open_export(path, columns=COLUMNS):
+    # Writer anhand der Dateiendung; als Kontextmanager verwenden
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Unbekanntes Exportformat {extension!r}, möglich: {', '.join(FORMATS)}")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return FORMATS[extension](path, columns)
+
+
+@timer("export")
+def export_rows(rows, path, columns=COLUMNS):
+    with open_export(path, columns) as writer:
+        writer.write_rows(rows)
+    return writer.rows
+
+
+def export_tracker(target, path=TRACKER_DB):
+    # Tracker direkt aus dem SQLite-Cursor exportieren, ohne ihn als DataFrame zu laden
+    return export_rows(iter_tracker(path), target, TRACKER_COLUMNS)
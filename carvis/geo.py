@@ -0,0 +1,69 @@
+# Offline-Geokodierung von Postleitzahlen und Kartendarstellung der Inserate.
+# carvis/data/plz_de.csv: Schwerpunkte der deutschen PLZ-Gebiete aus den OpenGeoDB-Daten
+# (übernommen aus pyGeoDb, BSD-Lizenz).
+import html
+from functools import lru_cache
+from pathlib import Path
+
+import folium
+import pandas as pd
+from folium.plugins import FastMarkerCluster
+
+PLZ_DATA = Path(__file__).parent / "data" / "plz_de.csv"
+MAP_CENTER = [51.1657, 10.4515]  # Center of Germany
+
+# Baut die Marker im Browser aus einem kompakten Array, statt ein folium.Marker-Objekt pro Zeile
+_MARKER_CALLBACK = """
+function (row) {
+    var marker = L.marker(new L.LatLng(row[0], row[1]));
+    marker.bindPopup(row[2]);
+    marker.bindTooltip(row[3]);
+    return marker;
+}
+"""
+
+
+@lru_cache(maxsize=1)
+def plz_table():
+    return pd.read_csv(PLZ_DATA, dtype={"plz": str}, index_col="plz")[["lat", "lon"]]
+
+
+@lru_cache(maxsize=None)
+def plz_prefix_table(digits):
+    # Mittelpunkt aller PLZ mit gleichem Präfix, für PLZ, die in der Tabelle fehlen
+    table = plz_table()
+    return table.groupby(table.index.str[:digits]).mean()
+
+
+def normalize_plz_series(plz):
+    # "1067.0" / 1067 / "01067 Dresden" -> "01067"; alles andere -> NaN
+    text = plz.astype(str).str.replace(r"\.0$", "", regex=True).str.extract(r"^(\d{4,5})\b", expand=False)
+    return text.str.zfill(5)
+
+
+def add_coordinates(df, column="Postleitzahl"):
+    # Vektorisierter Join der Koordinaten; fehlende PLZ fallen auf das 3- bzw. 2-stellige Präfix zurück
+    plz = normalize_plz_series(df[column])
+    coords = plz_table().reindex(plz).reset_index(drop=True)
+    for digits in (3, 2):
+        missing = coords["lat"].isna().to_numpy()
+        if not missing.any():
+            break
+        fallback = plz_prefix_table(digits).reindex(plz[missing].str[:digits]).to_numpy()
+        coords.loc[missing, ["lat", "lon"]] = fallback
+    return df.assign(lat=coords["lat"].to_numpy(), lon=coords["lon"].to_numpy())
+
+
+def build_map(df, zoom_start=6):
+    # Geclusterte Karte; bleibt auch mit 10k+ Inseraten bedienbar
+    located = add_coordinates(df).dropna(subset=["lat", "lon"])
+    titles = located["Titel"].fillna("").astype(str).map(html.escape)
+    prices = located["Preis"].map(lambda price: f"{price:.0f} €" if pd.notna(price) else "Kein Preis")
+    links = located["Link"].fillna("").astype(str).map(lambda link: html.escape(link, quote=True))
+    popups = titles + "<br>Preis: " + prices + "<br><a href='" + links + "' target='_blank'>Inserat ansehen</a>"
+    data = list(zip(located["lat"].tolist(), located["lon"].tolist(), popups.tolist(), titles.tolist()))
+
+    m = folium.Map(location=MAP_CENTER, zoom_start=zoom_start, prefer_canvas=True)
+    if data:
+        FastMarkerCluster(data, callback=_MARKER_CALLBACK).add_to(m)
+    return m
@@ -0,0 +1,232 @@
+# Leichtgewichtige Messpunkte für die Scraper: Zeiten je Stufe und Zähler (Anfragen, Bytes, Retries, Inserate).
+# Alles liegt prozessweit in einer Registry; jede beendete Stufe wird als JSON-Zeile geloggt und die Werte
+# landen gedrosselt in einer Textdatei im Prometheus-Format für den Textfile-Collector des Node Exporters.
+#   with timer("export"): ...            oder   @timer("dedup")
+#   count("http_requests_total", status=200)
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from contextlib import ContextDecorator, contextmanager
+from datetime import datetime
+
+from carvis.store import OUTPUT_DIR
+
+METRICS_LOG = os.environ.get("CARVIS_METRICS_LOG", os.path.join(OUTPUT_DIR, "logs", "metrics.jsonl"))
+METRICS_TEXTFILE = os.environ.get("CARVIS_METRICS_TEXTFILE", os.path.join(OUTPUT_DIR, "carvis.prom"))
+# Die Textdatei wird höchstens so oft neu geschrieben
+TEXTFILE_INTERVAL = 5.0
+
+HELP = {
+    "http_requests_total": "HTTP-Antworten nach Statuscode",
+    "http_bytes_total": "Empfangene Bytes (entpackt)",
+    "http_retries_total": "Wiederholte HTTP-Anfragen",
+    "http_errors_total": "Endgültig fehlgeschlagene HTTP-Anfragen",
+    "ads_parsed_total": "Geparste Inserate",
+    "ads_deduplicated_total": "Als Duplikat verworfene Inserate",
+    "backend_pages_total": "Ergebnisseiten je Backend (requests oder selenium)",
+    "backend_fallbacks_total": "Wechsel von HTTP zum Browser nach Grund",
+    "shard_probes_total": "Geladene erste Seiten beim Aufteilen großer Suchen",
+    "shards_total": "Teilsuchen nach dem Aufteilen",
+    "alerts_total": "Gemeldete Treffer der Suchaufträge",
+}
+
+_lock = threading.Lock()
+_counters = {}
+_stages = {}
+_last_write = 0.0
+_logger = None
+
+
+def _key(name, labels):
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+def count(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+class timer(ContextDecorator):
+    # Misst eine Stufe; als Kontextmanager oder Decorator verwendbar, auch verschachtelt und aus Threads
+    def __init__(self, stage, **labels):
+        self.stage = stage
+        self.labels = labels
+        self._local = threading.local()
+
+    def __enter__(self):
+        self._local.__dict__.setdefault("starts", []).append(time.perf_counter())
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._local.starts.pop()
+        record(self.stage, seconds, error=exc_type is not None, **self.labels)
+        return False
+
+
+def record(stage, seconds, error=False, **labels):
+    key = _key(stage, labels)
+    with _lock:
+        total, calls, maximum, _ = _stages.get(key, (0.0, 0, 0.0, 0.0))
+        _stages[key] = (total + seconds, calls + 1, max(maximum, seconds), seconds)
+    _log({"event": "stage", "stage": stage, "seconds": round(seconds, 6), "error": error, **labels})
+    write_textfile()
+
+
+def snapshot():
+    # {"stages": {(stage, labels): (summe, anzahl, max, letzte)}, "counters": {(name, labels): wert}}
+    with _lock:
+        return {"stages": dict(_stages), "counters": dict(_counters)}
+
+
+def diff(before, after):
+    # Was zwischen zwei Snapshots passiert ist, z.B. während eines Laufs auf einer Seite
+    stages = {}
+    for key, (total, calls, maximum, last) in after["stages"].items():
+        previous = before["stages"].get(key, (0.0, 0, 0.0, 0.0))
+        if calls > previous[1]:
+            stages[key] = (total - previous[0], calls - previous[1], maximum, last)
+    counters = {key: value - before["counters"].get(key, 0) for key, value in after["counters"].items() if value != before["counters"].get(key, 0)}
+    return {"stages": stages, "counters": counters}
+
+
+def merge(delta):
+    # Ergebnis von diff() aus einem Worker-Prozess in die Registry dieses Prozesses übernehmen
+    with _lock:
+        for key, (total, calls, maximum, last) in delta["stages"].items():
+            previous = _stages.get(key, (0.0, 0, 0.0, 0.0))
+            _stages[key] = (previous[0] + total, previous[1] + calls, max(previous[2], maximum), last)
+        for key, value in delta["counters"].items():
+            _counters[key] = _counters.get(key, 0) + value
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def prometheus_text(data=None):
+    data = data or snapshot()
+    lines = []
+    names = sorted({name for name, _ in data["counters"]})
+    for name in names:
+        lines.append(f"# HELP carvis_{name} {HELP.get(name, name)}")
+        lines.append(f"# TYPE carvis_{name} counter")
+        for (counter, labels), value in sorted(data["counters"].items()):
+            if counter == name:
+                lines.append(f"carvis_{name}{_label_text(labels)} {value}")
+    if data["stages"]:
+        lines.append("# HELP carvis_stage_seconds Dauer der Stufen in Sekunden")
+        lines.append("# TYPE carvis_stage_seconds summary")
+        for (stage, labels), (total, calls, _, _) in sorted(data["stages"].items()):
+            lines.append(f"carvis_stage_seconds_sum{_label_text(labels, [('stage', stage)])} {total:.6f}")
+            lines.append(f"carvis_stage_seconds_count{_label_text(labels, [('stage', stage)])} {calls}")
+        lines.append("# HELP carvis_stage_last_seconds Dauer des letzten Durchlaufs je Stufe")
+        lines.append("# TYPE carvis_stage_last_seconds gauge")
+        for (stage, labels), (_, _, _, last) in sorted(data["stages"].items()):
+            lines.append(f"carvis_stage_last_seconds{_label_text(labels, [('stage', stage)])} {last:.6f}")
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path=None, force=False):
+    # Atomar über eine temporäre Datei, damit der Node Exporter nie eine halbe Datei liest.
+    # Worker-Prozesse schreiben nicht, ihre Werte kommen per merge() in den Hauptprozess.
+    global _last_write
+    if multiprocessing.parent_process() is not None:
+        return
+    path = path or METRICS_TEXTFILE
+    now = time.monotonic()
+    with _lock:
+        if not force and now - _last_write < TEXTFILE_INTERVAL:
+            return
+        _last_write = now
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            file.write(prometheus_text())
+        os.replace(temporary, path)
+    except OSError:
+        pass
+
+
+def _log(entry):
+    global _logger
+    if _logger is None:
+        logger = logging.getLogger("carvis.metrics")
+        logger.propagate = False
+        if not logger.handlers:
+            try:
+                os.makedirs(os.path.dirname(METRICS_LOG), exist_ok=True)
+                handler = logging.FileHandler(METRICS_LOG, encoding="utf-8")
+            except OSError:
+                handler = logging.NullHandler()
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+        _logger = logger
+    _logger.info(json.dumps({"ts": datetime.now().isoformat(timespec="milliseconds"), "pid": os.getpid(), **entry}, ensure_ascii=False))
+
+
+@contextmanager
+def run(name, **labels):
+    # Klammert einen ganzen Lauf: Gesamtzeit als Stufe, Zusammenfassung als eine JSON-Zeile.
+    # Das yield-Dict enthält danach unter "metrics" die Zeiten und Zähler dieses Laufs.
+    result = {}
+    before = snapshot()
+    try:
+        with timer(name, **labels):
+            yield result
+    finally:
+        result["metrics"] = summary = diff(before, snapshot())
+        _log({
+            "event": "run",
+            "run": name,
+            **labels,
+            "stages": {_display(key): round(value[0], 6) for key, value in summary["stages"].items()},
+            "counters": {_display(key): value for key, value in summary["counters"].items()},
+        })
+        write_textfile(force=True)
+
+
+def _display(key):
+    name, labels = key
+    return name + (f"[{','.join(f'{label}={value}' for label, value in labels)}]" if labels else "")
+
+
+def sidebar_panel(last_run=None):
+    # Einklappbares Panel in der Seitenleiste: letzter Lauf dieser Sitzung und Summen seit Serverstart
+    import pandas as pd
+    import streamlit as st
+
+    def stage_table(stages):
+        return pd.DataFrame(
+            [{"Stufe": _display(key), "Aufrufe": calls, "Gesamt (s)": total, "Max (s)": maximum} for key, (total, calls, maximum, _) in stages.items()]
+        ).sort_values("Gesamt (s)", ascending=False)
+
+    def counter_table(counters):
+        return pd.DataFrame([{"Zähler": _display(key), "Wert": value} for key, value in sorted(counters.items())])
+
+    with st.sidebar.expander("Messwerte"):
+        if last_run and (last_run["stages"] or last_run["counters"]):
+            st.write("Letzter Lauf")
+            if last_run["stages"]:
+                st.dataframe(stage_table(last_run["stages"]), hide_index=True)
+            if last_run["counters"]:
+                st.dataframe(counter_table(last_run["counters"]), hide_index=True)
+        data = snapshot()
+        st.write("Seit Serverstart")
+        if data["stages"]:
+            st.dataframe(stage_table(data["stages"]), hide_index=True)
+        if data["counters"]:
+            st.dataframe(counter_table(data["counters"]), hide_index=True)
+        st.caption(f"JSON-Log: {METRICS_LOG}  \nPrometheus: {METRICS_TEXTFILE}")
@@ -0,0 +1,173 @@
+import re
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from carvis.metrics import count, timer
+
+try:
+    import lxml.html
+except ImportError:  # lxml ist optional, ohne lxml wird der SoupStrainer-Parser genutzt
+    lxml = None
+
+BASE_URL = "https://www.kleinanzeigen.de"
+
+# Spaltenreihenfolge der Excel-Ausgaben und des Trackers
+COLUMNS = ["Inserat ID", "Datum", "Titel", "Postleitzahl", "Stadt", "Preis", "VB", "Link"]
+
+# CSS-Klassen der Felder innerhalb eines article.aditem
+DATE_CLASS = "aditem-main--top--right"
+TITLE_CLASS = "text-module-begin"
+LOCATION_CLASS = "aditem-main--top--left"
+PRICE_CLASS = "aditem-main--middle--price-shipping--price"
+
+_PAGINATION = re.compile(r'class="pagination-(?:page|current)"[^>]*>\s*(\d+)\s*<')
+# Trefferzahl aus der Zusammenfassung über der Liste ("1 - 25 von 12.345 Ergebnissen für ...")
+_RESULT_COUNT = re.compile(r"von(?:\s|&nbsp;)+([\d.]+)(?:\s|&nbsp;)+Ergebnis")
+
+
+@dataclass
+class Listing:
+    ad_id: Optional[str]
+    date: str
+    title: str
+    postal_code: str
+    city: str
+    price: Optional[int]
+    vb: bool
+    link: str
+
+    def to_row(self):
+        return dict(zip(COLUMNS, asdict(self).values()))
+
+
+def clean_price(price_text):
+    return int(re.sub(r'[^0-9]', '', price_text)) if re.search(r'\d', price_text) else None
+
+
+def split_location(location):
+    # "78665 Frittlingen" -> ("78665", "Frittlingen")
+    first, _, rest = location.partition(" ")
+    if first.isdigit():
+        return first, rest or "Keine Stadt"
+    return "Keine Postleitzahl", location
+
+
+def listing_from_fields(ad_id, date, title, location, price_text, href):
+    # Gemeinsame Nachbearbeitung der Rohtexte, unabhängig vom Parser oder Selenium
+    date = " ".join(date.split()) if date else "Kein Datum"
+    title = " ".join(title.split()) if title else "Kein Titel"
+    location = " ".join(location.split()) if location else "Keine Adresse"
+    price_text = " ".join(price_text.split()) if price_text else "Kein Preis"
+    postal_code, city = split_location(location)
+    if href and href.startswith("/"):
+        href = BASE_URL + href
+    return Listing(
+        ad_id=ad_id or None,
+        date=date,
+        title=title,
+        postal_code=postal_code,
+        city=city,
+        price=clean_price(price_text),
+        vb="VB" in price_text,
+        link=href or "Kein Link",
+    )
+
+
+def last_page_number(html):
+    # Höchste in der Paginierung sichtbare Seitenzahl, ohne das Dokument zu parsen
+    return max((int(n) for n in _PAGINATION.findall(html)), default=1)
+
+
+def result_count(html):
+    # Gesamtzahl der Treffer einer Suche oder None, wenn die Seite sie nicht nennt
+    match = _RESULT_COUNT.search(html)
+    return int(match.group(1).replace(".", "")) if match else None
+
+
+def _soup_text(tag):
+    return tag.get_text() if tag else None
+
+
+def _parse_soup(html):
+    # Referenz: ganzes Dokument mit html.parser, ein find() pro Feld
+    soup = BeautifulSoup(html, "html.parser")
+    return [
+        listing_from_fields(
+            ad.get("data-adid"),
+            _soup_text(ad.find("div", class_=DATE_CLASS)),
+            _soup_text(ad.find("h2", class_=TITLE_CLASS)),
+            _soup_text(ad.find("div", class_=LOCATION_CLASS)),
+            _soup_text(ad.find("p", class_=PRICE_CLASS)),
+            ad.get("data-href"),
+        )
+        for ad in soup.find_all("article", class_="aditem")
+    ]
+
+
+_FIELD_BY_TAG_CLASS = {
+    ("div", DATE_CLASS): "date",
+    ("h2", TITLE_CLASS): "title",
+    ("div", LOCATION_CLASS): "location",
+    ("p", PRICE_CLASS): "price",
+}
+
+
+def _parse_strainer(html):
+    # Baut nur die article.aditem-Teilbäume auf und sammelt alle Felder in einem Durchlauf
+    strainer = SoupStrainer("article", class_="aditem")
+    soup = BeautifulSoup(html, "lxml" if lxml else "html.parser", parse_only=strainer)
+    listings = []
+    for ad in soup.find_all("article", recursive=False):
+        fields = {}
+        for tag in ad.find_all(("div", "h2", "p")):
+            for css_class in tag.get("class", ()):
+                field = _FIELD_BY_TAG_CLASS.get((tag.name, css_class))
+                if field and field not in fields:
+                    fields[field] = tag.get_text()
+        listings.append(listing_from_fields(
+            ad.get("data-adid"), fields.get("date"), fields.get("title"),
+            fields.get("location"), fields.get("price"), ad.get("data-href"),
+        ))
+    return listings
+
+
+_ADITEM_XPATH = "//article[contains(concat(' ', normalize-space(@class), ' '), ' aditem ')]"
+
+
+def _parse_lxml(html):
+    # libxml2-Parser mit XPath auf die Artikel, danach ein Durchlauf über deren Elemente
+    if isinstance(html, bytes):
+        html = html.decode("utf-8", errors="replace")
+    root = lxml.html.fromstring(html)
+    listings = []
+    for ad in root.xpath(_ADITEM_XPATH):
+        fields = {}
+        for tag in ad.iter("div", "h2", "p"):
+            for css_class in (tag.get("class") or "").split():
+                field = _FIELD_BY_TAG_CLASS.get((tag.tag, css_class))
+                if field and field not in fields:
+                    fields[field] = tag.text_content()
+        listings.append(listing_from_fields(
+            ad.get("data-adid"), fields.get("date"), fields.get("title"),
+            fields.get("location"), fields.get("price"), ad.get("data-href"),
+        ))
+    return listings
+
+
+BACKENDS = {
+    "soup": _parse_soup,
+    "strainer": _parse_strainer,
+}
+if lxml:
+    BACKENDS["lxml"] = _parse_lxml
+
+DEFAULT_BACKEND = "lxml" if lxml else "strainer"
+
+
+def parse_result_page(html, backend=DEFAULT_BACKEND):
+    with timer("parse", backend=backend):
+        listings = BACKENDS[backend](html)
+    count("ads_parsed_total", len(listings))
+    return listings
@@ -0,0 +1,25 @@
+# Ressourcen, die über Streamlit-Reruns und Sessions hinweg geteilt werden
+from functools import partial
+
+import streamlit as st
+
+from carvis.browser import DriverPool
+from carvis.cache import CACHE_DIR, ResultCache
+from carvis.scheduler import Scheduler, run_search
+
+
+@st.cache_resource
+def driver_pool():
+    return DriverPool()
+
+
+@st.cache_resource
+def scheduler():
+    # Läuft im Serverprozess weiter, auch wenn kein Tab mehr offen ist
+    return Scheduler(runner=partial(run_search, pool=driver_pool())).start()
+
+
+@st.cache_resource
+def result_cache():
+    # Gemeinsam für alle Sessions: dieselbe beliebte Suche wird nur einmal gescrapt
+    return ResultCache(directory=CACHE_DIR)
@@ -0,0 +1,348 @@
+# Hintergrund-Scheduler für gespeicherte Suchen. Läuft in eigenen Threads im Streamlit-Serverprozess
+# (oder per CLI), unabhängig davon, ob ein Browser-Tab offen ist. Jobs und Laufhistorie liegen in
+# derselben SQLite-Datenbank wie der Tracker.
+import json
+import logging
+import queue
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from carvis.alerts import check_listings
+from carvis.metrics import timer
+from carvis.store import TRACKER_DB, connect, transaction, upsert_listings
+from carvis.urls import SEARCH_FIELDS, generate_url
+
+WORKERS = 2
+POLL_SECONDS = 30
+
+_log = logging.getLogger("carvis.scheduler")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    params TEXT NOT NULL,
+    url TEXT NOT NULL,
+    backend TEXT NOT NULL DEFAULT 'requests',
+    schedule TEXT,
+    next_run TEXT,
+    max_concurrent INTEGER NOT NULL DEFAULT 1,
+    enabled INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    job_id INTEGER NOT NULL,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    status TEXT NOT NULL,
+    listings INTEGER,
+    new_listings INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_job ON runs (job_id, started_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_next_run ON jobs (next_run);
+"""
+
+# Voreinstellungen für die Oberfläche; Zeitpläne sind Cron-Ausdrücke (Minute Stunde Tag Monat Wochentag)
+PRESETS = {
+    "alle 15 Minuten": "*/15 * * * *",
+    "stündlich": "0 * * * *",
+    "alle 6 Stunden": "0 */6 * * *",
+    "täglich um 6 Uhr": "0 6 * * *",
+}
+
+# (Name, kleinster, größter Wert) je Feld; beim Wochentag ist 7 wie bei cron ebenfalls Sonntag
+_CRON_FIELDS = (("Minute", 0, 59), ("Stunde", 0, 23), ("Tag", 1, 31), ("Monat", 1, 12), ("Wochentag", 0, 7))
+
+
+def _cron_field(field, name, low, high):
+    values = set()
+    for part in field.split(","):
+        expr, slash, step = part.partition("/")
+        try:
+            if expr == "*":
+                start, end = low, high
+            elif "-" in expr:
+                start, end = map(int, expr.split("-"))
+            else:
+                start = end = int(expr)
+            step = int(step) if slash else 1
+        except ValueError:
+            raise ValueError(f"{name}: {part!r} ist kein gültiger Cron-Wert") from None
+        if not low <= start <= end <= high:
+            raise ValueError(f"{name}: {part!r} liegt außerhalb von {low}-{high}")
+        if step < 1:
+            raise ValueError(f"{name}: Schrittweite in {part!r} muss mindestens 1 sein")
+        if slash and expr != "*" and "-" not in expr:
+            end = high
+        values.update(range(start, end + 1, step))
+    return values
+
+
+def cron_next(expression, after):
+    # Nächster Zeitpunkt nach `after`, der auf den Cron-Ausdruck passt (Wochentag 0 = Sonntag).
+    # Sind Tag und Wochentag beide eingeschränkt, reicht wie bei cron einer von beiden ("0 8 1 * 1" =
+    # am 1. des Monats und jeden Montag); beginnt einer der beiden mit "*", müssen beide passen.
+    fields = expression.split()
+    if len(fields) != 5:
+        raise ValueError(f"Ungültiger Cron-Ausdruck: {expression!r}")
+    minutes, hours, days, months, weekdays = (
+        _cron_field(field, *spec) for field, spec in zip(fields, _CRON_FIELDS)
+    )
+    weekdays = {day % 7 for day in weekdays}
+    either_day = not fields[2].startswith("*") and not fields[4].startswith("*")
+
+    def day_matches(candidate):
+        in_days, in_weekdays = candidate.day in days, (candidate.isoweekday() % 7) in weekdays
+        return in_days or in_weekdays if either_day else in_days and in_weekdays
+
+    candidate = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    limit = candidate + timedelta(days=4 * 366)  # deckt auch den 29. Februar ab
+    while candidate < limit:
+        if candidate.month not in months or not day_matches(candidate):
+            candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+        elif candidate.hour not in hours:
+            candidate = candidate.replace(minute=0) + timedelta(hours=1)
+        elif candidate.minute not in minutes:
+            candidate += timedelta(minutes=1)
+        else:
+            return candidate
+    raise ValueError(f"Cron-Ausdruck {expression!r} trifft nie zu")
+
+
+@timer("search")
+def run_search(job, pool=None):
+    # Standard-Runner: Suche ausführen, in den Tracker schreiben und Treffer der Suchaufträge melden.
+    # Liefert (Inserate, neue Inserate).
+    watermark = None
+    if job["backend"] == "selenium":
+        from carvis.browser import scrape_with_browser
+        listings = scrape_with_browser(pool or _browser_pool(), job["url"])
+    elif json.loads(job["params"]).get("incremental"):
+        # Nur bis zur ersten bereits bekannten Seite laden; alle geladenen Inserate aktualisieren last_seen
+        from carvis.backend import fetch_listings
+        from carvis.crawler import crawl_delta
+        if job["backend"] == "auto":
+            _, listings, _, watermark = crawl_delta(job["url"], lambda target: fetch_listings(target, pool))
+        else:
+            _, listings, _, watermark = crawl_delta(job["url"])
+    elif job["backend"] == "auto":
+        # HTTP zuerst, Browser nur für gesperrte oder leere Seiten
+        from carvis.backend import scrape_adaptive
+        listings, _ = scrape_adaptive(job["url"], pool)
+    else:
+        from carvis.crawler import scrape_listings
+        listings = scrape_listings(job["url"])
+    rows = [listing.to_row() for listing in listings]
+    with timer("tracker"):
+        new, _ = upsert_listings(rows, watermark=watermark) if rows else (0, 0)
+    check_listings(rows)
+    return len(rows), new
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _browser_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from carvis.browser import DriverPool
+            _pool = DriverPool()
+    return _pool
+
+
+def _now():
+    return datetime.now().replace(microsecond=0)
+
+
+class Scheduler:
+    def __init__(self, path=TRACKER_DB, workers=WORKERS, poll_seconds=POLL_SECONDS, runner=run_search):
+        self.path = path
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.runner = runner
+        self._queue = queue.Queue()
+        self._active = Counter()  # job_id -> eingereihte + laufende Ausführungen
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        with connect(self.path) as conn:
+            conn.executescript(SCHEMA)
+
+    # Lebenszyklus
+
+    def start(self):
+        if self._threads:
+            return self
+        self._reset_interrupted()
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._tick_loop, name="carvis-scheduler", daemon=True)]
+        self._threads += [
+            threading.Thread(target=self._work_loop, name=f"carvis-worker-{i}", daemon=True) for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for _ in range(self.workers):
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def is_running(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    # Jobs verwalten
+
+    def add_job(self, name, params, schedule=None, start_at=None, backend="requests", max_concurrent=1):
+        # params: Felder von generate_url oder {"url": ...} für einen vorgefertigten Link.
+        # Ohne schedule ist der Job einmalig (zum Zeitpunkt start_at bzw. sofort).
+        url = params["url"] if "url" in params else generate_url(**{k: params[k] for k in SEARCH_FIELDS if k in params})
+        next_run = (start_at or (cron_next(schedule, _now()) if schedule else _now())).replace(microsecond=0)
+        with connect(self.path) as conn, transaction(conn):
+            cursor = conn.execute(
+                "INSERT INTO jobs (name, params, url, backend, schedule, next_run, max_concurrent) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (name, json.dumps(params), url, backend, schedule, next_run.isoformat(), max_concurrent),
+            )
+            return cursor.lastrowid
+
+    def set_enabled(self, job_id, enabled):
+        with connect(self.path) as conn, transaction(conn):
+            conn.execute("UPDATE jobs SET enabled = ? WHERE id = ?", (int(enabled), job_id))
+
+    def delete_job(self, job_id):
+        with connect(self.path) as conn, transaction(conn):
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def run_now(self, job_id):
+        job = self._job(job_id)
+        return bool(job) and self._enqueue(job)
+
+    def jobs(self):
+        with connect(self.path) as conn:
+            return pd.read_sql_query(
+                """
+                SELECT j.id, j.name, j.url, j.backend, j.schedule, j.next_run, j.enabled, j.max_concurrent,
+                       r.status AS last_status, r.finished_at AS last_finished, r.listings AS last_listings
+                FROM jobs j
+                LEFT JOIN runs r ON r.id = (SELECT MAX(id) FROM runs WHERE job_id = j.id)
+                ORDER BY j.next_run
+                """,
+                conn,
+            )
+
+    def runs(self, limit=100):
+        with connect(self.path) as conn:
+            return pd.read_sql_query(
+                """
+                SELECT r.id, j.name, r.started_at, r.finished_at, r.status, r.listings, r.new_listings, r.error
+                FROM runs r LEFT JOIN jobs j ON j.id = r.job_id
+                ORDER BY r.id DESC LIMIT ?
+                """,
+                conn,
+                params=(limit,),
+            )
+
+    def status(self):
+        with self._lock:
+            active = sum(self._active.values())
+        return {"running": self.is_running(), "queued": self._queue.qsize(), "active": active, "workers": self.workers}
+
+    # Intern
+
+    def _job(self, job_id):
+        with connect(self.path) as conn:
+            conn.row_factory = _dict_row
+            return conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def _enqueue(self, job):
+        # Begrenzung pro Job: nicht mehr als max_concurrent Ausführungen gleichzeitig eingereiht/laufend
+        with self._lock:
+            if self._active[job["id"]] >= job["max_concurrent"]:
+                return False
+            self._active[job["id"]] += 1
+        self._queue.put(job)
+        return True
+
+    def _tick_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception:
+                _log.exception("Scheduler-Takt fehlgeschlagen")
+            self._stop.wait(self.poll_seconds)
+
+    def tick(self, now=None):
+        # Fällige Jobs einreihen und ihren nächsten Termin setzen. Laufen schon max_concurrent
+        # Ausführungen eines Jobs, wird der Termin als "übersprungen" in der Laufhistorie vermerkt.
+        now = now or _now()
+        with connect(self.path) as conn:
+            conn.row_factory = _dict_row
+            with transaction(conn):
+                due = conn.execute(
+                    "SELECT * FROM jobs WHERE enabled = 1 AND next_run IS NOT NULL AND next_run <= ?", (now.isoformat(),)
+                ).fetchall()
+                for job in due:
+                    next_run = cron_next(job["schedule"], now).isoformat() if job["schedule"] else None
+                    conn.execute("UPDATE jobs SET next_run = ? WHERE id = ?", (next_run, job["id"]))
+        for job in due:
+            if not self._enqueue(job):
+                self._skip(job, now)
+        return len(due)
+
+    def _skip(self, job, now):
+        with connect(self.path) as conn, transaction(conn):
+            conn.execute(
+                "INSERT INTO runs (job_id, started_at, finished_at, status, error) VALUES (?, ?, ?, 'übersprungen', ?)",
+                (job["id"], now.isoformat(), now.isoformat(), f"Noch {job['max_concurrent']} Ausführung(en) aktiv"),
+            )
+
+    def _work_loop(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            try:
+                self._execute(job)
+            except Exception:
+                # Fehler der Buchführung (z.B. "database is locked") dürfen den Worker nicht beenden
+                _log.exception("Lauf von Job %s konnte nicht verbucht werden", job["id"])
+            finally:
+                with self._lock:
+                    self._active[job["id"]] -= 1
+
+    def _reset_interrupted(self):
+        # Läufe, die beim letzten Beenden noch liefen, kommen nie mehr zum Abschluss
+        with connect(self.path) as conn, transaction(conn):
+            conn.execute(
+                "UPDATE runs SET finished_at = ?, status = 'abgebrochen', error = 'Scheduler wurde beendet' WHERE status = 'läuft'",
+                (_now().isoformat(),),
+            )
+
+    def _execute(self, job):
+        with connect(self.path) as conn, transaction(conn):
+            run_id = conn.execute(
+                "INSERT INTO runs (job_id, started_at, status) VALUES (?, ?, 'läuft')", (job["id"], _now().isoformat())
+            ).lastrowid
+        status, count, new, error = "ok", None, None, None
+        try:
+            count, new = self.runner(job)
+        except Exception as e:
+            status, error = "fehler", f"{type(e).__name__}: {e}"
+        with connect(self.path) as conn, transaction(conn):
+            conn.execute(
+                "UPDATE runs SET finished_at = ?, status = ?, listings = ?, new_listings = ?, error = ? WHERE id = ?",
+                (_now().isoformat(), status, count, new, error, run_id),
+            )
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
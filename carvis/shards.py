@@ -0,0 +1,168 @@
+# Zu große Suchen aufteilen: Kleinanzeigen blättert höchstens MAX_PAGES Seiten weit, alles darüber fehlt still.
+# plan_shards() lädt Seite 1 einer Suche und teilt sie, solange sie mehr Treffer als cap hat, rekursiv in
+# Preis-, dann Baujahr-, dann Kilometerbereiche (preis:min:max, autos.ez_i, autos.km_i aus generate_url).
+# scrape_sharded() lädt die Teilsuchen parallel und führt die Inserate nach Inserat ID zusammen.
+# Seite 1 jeder Teilsuche wird nur einmal geladen: zum Zählen und als erste Ergebnisseite.
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date
+from statistics import median
+from typing import Optional
+
+from carvis.client import fetch
+from carvis.crawler import MAX_PAGES, MAX_WORKERS, PAGE_SIZE, RateLimiter, _fetch_page, crawl_pages
+from carvis.metrics import count, timer
+from carvis.parsing import last_page_number, parse_result_page, result_count
+from carvis.urls import SEARCH_FIELDS, generate_url
+
+# Mehr Treffer lassen sich über die Paginierung nicht erreichen
+MAX_RESULTS = MAX_PAGES * PAGE_SIZE
+# Obergrenze für Teilsuchen je Suche, falls die Trefferzahl nicht sinkt
+MAX_SHARDS = 256
+
+
+@dataclass(frozen=True)
+class Dimension:
+    # Bereich [floor, ceiling] wird halbiert, darunter und darüber je ein offener Rest
+    low: str
+    high: str
+    floor: int
+    ceiling: int
+    step: int
+    unset: Optional[int]
+
+    def bounds(self, params):
+        return params.get(self.low) or None, params.get(self.high) or None
+
+    def with_bounds(self, params, low, high):
+        return {**params, self.low: self.unset if low is None else low, self.high: self.unset if high is None else high}
+
+
+DIMENSIONS = [
+    Dimension("price_min", "price_max", 100, 100_000, 1, 0),
+    Dimension("year_min", "year_max", 1990, date.today().year, 1, None),
+    Dimension("km_min", "km_max", 1000, 300_000, 1000, 0),
+]
+
+
+@dataclass
+class Shard:
+    params: dict
+    # Treffer laut Seite 1; ohne Zahl auf der Seite aus der Paginierung geschätzt
+    total: int
+    # False: ließ sich nicht weiter teilen, Treffer über MAX_RESULTS fehlen
+    complete: bool = True
+    listings: list = field(default_factory=list)
+    pages: int = 0
+    first_page: tuple = field(default=None, repr=False)
+
+    @property
+    def url(self):
+        return generate_url(**self.params)
+
+    def to_row(self):
+        return {"Link": self.url, "Treffer": self.total, "Seiten": self.pages, "Inserate": len(self.listings), "Vollständig": self.complete}
+
+
+def search_params(spec):
+    # Felder von generate_url aus einer Suche (Stapeldatei, Seitenformular)
+    params = {name: spec[name] for name in SEARCH_FIELDS if spec.get(name) is not None}
+    params.setdefault("query", "")
+    return params
+
+
+def split(params, dimension, sample=()):
+    # Zwei Hälften von params entlang dimension oder None, wenn der Bereich nicht mehr teilbar ist
+    low, high = dimension.bounds(params)
+    if low is None:
+        if high is not None and high < dimension.floor:
+            low = 0
+        else:
+            return [dimension.with_bounds(params, None, dimension.floor - 1), dimension.with_bounds(params, dimension.floor, high)]
+    if high is None:
+        middle = dimension.ceiling if low < dimension.ceiling else 2 * low - 1
+        return [dimension.with_bounds(params, low, middle), dimension.with_bounds(params, middle + 1, None)]
+    if high - low + 1 < 2 * dimension.step:
+        return None
+    # Preise: am Median der geladenen Seite teilen, sonst in der Mitte (auf ganze Schritte)
+    inside = [value for value in sample if low <= value < high]
+    middle = int(median(inside)) if inside else low + (high - low + 1) // 2 // dimension.step * dimension.step - 1
+    return [dimension.with_bounds(params, low, middle), dimension.with_bounds(params, middle + 1, high)]
+
+
+def _probe(params, limiter):
+    url = generate_url(**params)
+    limiter.wait(url)
+    html = fetch(url).text
+    count("shard_probes_total")
+    listings = parse_result_page(html)
+    last_page = last_page_number(html)
+    total = result_count(html)
+    if total is None:
+        total = len(listings) if last_page <= 1 else last_page * PAGE_SIZE
+    return Shard(params, total, first_page=(listings, last_page))
+
+
+@timer("shard_plan")
+def plan_shards(params, cap=MAX_RESULTS, workers=MAX_WORKERS, limiter=None, max_shards=MAX_SHARDS):
+    # Teilsuchen mit höchstens cap Treffern; Teilsuchen ohne Treffer fallen weg.
+    # Jede Ebene wird parallel geprüft, Fehler auf Seite 1 werden weitergereicht.
+    cap = min(cap, MAX_RESULTS)
+    limiter = limiter or RateLimiter()
+    done, pending = [], [params]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending:
+            probed = list(pool.map(lambda shard_params: _probe(shard_params, limiter), pending))
+            pending = []
+            for shard in probed:
+                if shard.total <= cap or len(done) + len(pending) + 2 > max_shards:
+                    shard.complete = shard.total <= MAX_RESULTS
+                    done.append(shard)
+                    continue
+                prices = [listing.price for listing in shard.first_page[0] if listing.price is not None]
+                halves = next(filter(None, (split(shard.params, dimension, prices if dimension.low == "price_min" else ()) for dimension in DIMENSIONS)), None)
+                if halves:
+                    pending.extend(halves)
+                else:
+                    shard.complete = shard.total <= MAX_RESULTS
+                    done.append(shard)
+    return [shard for shard in done if shard.total]
+
+
+def crawl_shard(shard, fetch_page=_fetch_page, limiter=None):
+    # Seite 1 kommt aus der Prüfung; nur Teilsuchen mit mehreren Seiten laden weiter
+    listings, last_page = shard.first_page[:2]
+    if last_page <= 1:
+        shard.listings, shard.pages = listings, 1
+        return shard
+    url = shard.url
+
+    def fetch_cached(target):
+        return shard.first_page if target == url else fetch_page(target)
+
+    pages = crawl_pages(url, fetch_cached, workers=1, limiter=limiter)
+    shard.listings = [listing for page in pages for listing in page]
+    shard.pages = len(pages)
+    if shard.pages >= MAX_PAGES and shard.total > len(shard.listings):
+        shard.complete = False
+    return shard
+
+
+def merge_shards(shards):
+    # Nach Inserat ID zusammenführen; ein Inserat kann zwischen zwei Abrufen den Preisbereich wechseln
+    merged = {}
+    for shard in shards:
+        for listing in shard.listings:
+            merged.setdefault(listing.ad_id or listing.link, listing)
+    return list(merged.values())
+
+
+def scrape_sharded(params, cap=MAX_RESULTS, workers=MAX_WORKERS, fetch_page=_fetch_page, limiter=None):
+    # Liefert (Inserate ohne Duplikate, Teilsuchen). fetch_page wie bei crawler.crawl_pages,
+    # z.B. backend.fetch_listings für den Browser-Fallback ab Seite 2.
+    limiter = limiter or RateLimiter()
+    shards = plan_shards(params, cap, workers, limiter)
+    count("shards_total", len(shards))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda shard: crawl_shard(shard, fetch_page, limiter), shards))
+    return merge_shards(shards), shards
@@ -0,0 +1,383 @@
+# Tracker aller jemals gefundenen Inserate in SQLite (ersetzt das Neuschreiben von Tracker_Outputs.xlsx)
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+OUTPUT_DIR = os.path.join(os.getcwd(), "Output der Fahrzeugsuchen")
+TRACKER_DB = os.path.join(OUTPUT_DIR, "tracker.sqlite")
+TRACKER_XLSX = os.path.join(OUTPUT_DIR, "Tracker_Outputs.xlsx")
+
+# Excel-Spalte -> Tabellenspalte
+FIELDS = {
+    "Inserat ID": "ad_id",
+    "Datum": "date",
+    "Titel": "title",
+    "Postleitzahl": "postal_code",
+    "Stadt": "city",
+    "Preis": "price",
+    "VB": "vb",
+    "Link": "link",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    ad_id TEXT PRIMARY KEY,
+    date TEXT,
+    title TEXT,
+    postal_code TEXT,
+    city TEXT,
+    price INTEGER,
+    vb INTEGER,
+    link TEXT,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS price_history (
+    ad_id TEXT NOT NULL,
+    seen_at TEXT NOT NULL,
+    price INTEGER,
+    PRIMARY KEY (ad_id, seen_at)
+);
+CREATE TABLE IF NOT EXISTS watermarks (
+    url TEXT PRIMARY KEY,
+    max_ad_id INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_listings_last_seen ON listings (last_seen);
+CREATE INDEX IF NOT EXISTS idx_listings_first_seen ON listings (first_seen);
+CREATE INDEX IF NOT EXISTS idx_listings_price ON listings (price);
+CREATE INDEX IF NOT EXISTS idx_listings_postal_code ON listings (postal_code);
+"""
+
+# Volltextindex auf den Titeln. Neue Inserate werden erst beim Suchen in einem Rutsch nachindiziert
+# (Trigger pro Zeile würden jeden Upsert um ein Mehrfaches verlangsamen); nur Titeländerungen bereits
+# indizierter Inserate hält ein Trigger sofort nach.
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE listings_fts USING fts5(
+    title, content='listings', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE TABLE search_index (indexed_rowid INTEGER NOT NULL);
+INSERT INTO search_index VALUES (0);
+CREATE TRIGGER listings_fts_update AFTER UPDATE OF title ON listings
+WHEN old.title IS NOT new.title AND old.rowid <= (SELECT indexed_rowid FROM search_index) BEGIN
+    INSERT INTO listings_fts (listings_fts, rowid, title) VALUES ('delete', old.rowid, old.title);
+    INSERT INTO listings_fts (rowid, title) VALUES (new.rowid, new.title);
+END;
+CREATE TRIGGER listings_fts_delete AFTER DELETE ON listings
+WHEN old.rowid <= (SELECT indexed_rowid FROM search_index) BEGIN
+    INSERT INTO listings_fts (listings_fts, rowid, title) VALUES ('delete', old.rowid, old.title);
+END;
+"""
+
+# Sortierbare Spalten der Tracker-Ansicht -> Tabellenspalte
+SORT_COLUMNS = {
+    "Zuletzt gesehen": "last_seen",
+    "Erstmals gesehen": "first_seen",
+    "Preis": "price",
+    "Postleitzahl": "postal_code",
+}
+# Ab so vielen Volltext-Treffern wird in Sortierreihenfolge gesucht statt alle Treffer zu sortieren
+FTS_SCAN_THRESHOLD = 5000
+_TERM = re.compile(r"\w+")
+
+_UPSERT = """
+INSERT INTO listings (ad_id, date, title, postal_code, city, price, vb, link, first_seen, last_seen)
+VALUES (:ad_id, :date, :title, :postal_code, :city, :price, :vb, :link, :seen_at, :seen_at)
+ON CONFLICT (ad_id) DO UPDATE SET
+    date = excluded.date,
+    title = excluded.title,
+    postal_code = excluded.postal_code,
+    city = excluded.city,
+    price = excluded.price,
+    vb = excluded.vb,
+    link = excluded.link,
+    last_seen = excluded.last_seen
+"""
+
+# Neuer Eintrag in der Preishistorie nur für neue Inserate oder geänderte Preise
+_RECORD_PRICE = """
+INSERT OR IGNORE INTO price_history (ad_id, seen_at, price)
+SELECT :ad_id, :seen_at, :price
+WHERE NOT EXISTS (SELECT 1 FROM listings WHERE ad_id = :ad_id AND price IS :price)
+"""
+
+
+@contextmanager
+def connect(path=TRACKER_DB):
+    # Eine Verbindung pro Aufruf; WAL + busy_timeout erlauben parallele Leser und wartende Schreiber
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        yield conn
+    finally:
+        conn.close()
+
+
+@contextmanager
+def transaction(conn):
+    # BEGIN IMMEDIATE holt die Schreibsperre sofort, damit gleichzeitige Speichervorgänge nacheinander laufen
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def normalize_id(value):
+    # Excel-Importe liefern IDs teils als Float ("3042413070.0")
+    if value is None or pd.isna(value):
+        return None
+    text = str(value).strip()
+    return text[:-2] if text.endswith(".0") else text
+
+
+def normalize_plz(value):
+    # Als Zahl gespeicherte Postleitzahlen verlieren die führende Null (01067 -> 1067)
+    text = normalize_id(value)
+    return text.zfill(5) if text and text.isdigit() else text
+
+
+def _record(row, seen_at):
+    record = {column: row.get(excel) for excel, column in FIELDS.items()}
+    record["ad_id"] = normalize_id(record["ad_id"])
+    if record["price"] is not None and not pd.isna(record["price"]):
+        record["price"] = int(record["price"])
+    else:
+        record["price"] = None
+    record["vb"] = int(bool(record["vb"]))
+    record["seen_at"] = seen_at
+    return record
+
+
+def upsert_listings(rows, path=TRACKER_DB, seen_at=None, watermark=None):
+    # rows: Dicts mit den Excel-Spalten (Listing.to_row()). Liefert (neu, aktualisiert).
+    # watermark: (URL, höchste Inserat ID) aus crawler.crawl_delta, wird in derselben Transaktion gesetzt
+    seen_at = seen_at or datetime.now().isoformat(timespec="seconds")
+    records = [record for record in (_record(row, seen_at) for row in rows) if record["ad_id"]]
+    with connect(path) as conn, transaction(conn):
+        if watermark:
+            _set_watermark(conn, *watermark)
+        conn.executemany(_RECORD_PRICE, records)
+        ids = [record["ad_id"] for record in records]
+        known = set()
+        for chunk in range(0, len(ids), 500):
+            part = ids[chunk:chunk + 500]
+            placeholders = ",".join("?" * len(part))
+            known.update(r[0] for r in conn.execute(f"SELECT ad_id FROM listings WHERE ad_id IN ({placeholders})", part))
+        conn.executemany(_UPSERT, records)
+    new = len({record["ad_id"] for record in records} - known)
+    return new, len(records) - new
+
+
+def known_prices(ids, path=TRACKER_DB):
+    # Inserat ID -> gespeicherter Preis für alle IDs, die schon im Tracker stehen
+    ids = [normalize_id(ad_id) for ad_id in ids if normalize_id(ad_id)]
+    known = {}
+    with connect(path) as conn:
+        for chunk in range(0, len(ids), 500):
+            part = ids[chunk:chunk + 500]
+            placeholders = ",".join("?" * len(part))
+            known.update(conn.execute(f"SELECT ad_id, price FROM listings WHERE ad_id IN ({placeholders})", part))
+    return known
+
+
+def get_watermark(url, path=TRACKER_DB):
+    # Höchste Inserat ID, die für diese Such-URL schon gesehen wurde (IDs werden fortlaufend vergeben)
+    with connect(path) as conn:
+        row = conn.execute("SELECT max_ad_id FROM watermarks WHERE url = ?", (url,)).fetchone()
+    return row[0] if row else None
+
+
+def set_watermark(url, max_ad_id, path=TRACKER_DB):
+    # Erst setzen, wenn die Inserate bis max_ad_id gespeichert oder exportiert sind; crawl_delta hält
+    # ältere, unbekannte Inserate danach für schon geliefert
+    with connect(path) as conn, transaction(conn):
+        _set_watermark(conn, url, max_ad_id)
+
+
+def _set_watermark(conn, url, max_ad_id):
+    if not max_ad_id:
+        return
+    conn.execute(
+        """
+        INSERT INTO watermarks (url, max_ad_id, updated_at) VALUES (?, ?, ?)
+        ON CONFLICT (url) DO UPDATE SET
+            max_ad_id = MAX(max_ad_id, excluded.max_ad_id),
+            updated_at = excluded.updated_at
+        """,
+        (url, max_ad_id, datetime.now().isoformat(timespec="seconds")),
+    )
+
+
+def count_listings(path=TRACKER_DB):
+    with connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM listings").fetchone()[0]
+
+
+def tracker_version(path=TRACKER_DB):
+    # Ändert sich bei jedem Schreibvorgang; Cache-Schlüssel für Auswertungen über den ganzen Tracker
+    with connect(path) as conn:
+        return conn.execute(
+            "SELECT COUNT(*), MAX(last_seen), (SELECT COUNT(*) FROM price_history) FROM listings"
+        ).fetchone()
+
+
+def load_tracker(path=TRACKER_DB):
+    # Tracker als DataFrame mit den Excel-Spalten plus Erst-/Zuletzt-gesehen
+    select = ", ".join(f'{column} AS "{excel}"' for excel, column in FIELDS.items())
+    with connect(path) as conn:
+        df = pd.read_sql_query(
+            f'SELECT {select}, first_seen AS "Erstmals gesehen", last_seen AS "Zuletzt gesehen" FROM listings ORDER BY first_seen',
+            conn,
+        )
+    df["VB"] = df["VB"].astype(bool)
+    return df
+
+
+def iter_tracker(path=TRACKER_DB, batch_size=5000):
+    # Tracker zeilenweise als Dicts mit den Excel-Spalten, für Exporte mit konstantem Speicherbedarf
+    select = ", ".join(f'{column} AS "{excel}"' for excel, column in FIELDS.items())
+    with connect(path) as conn:
+        cursor = conn.execute(
+            f'SELECT {select}, first_seen AS "Erstmals gesehen", last_seen AS "Zuletzt gesehen" FROM listings ORDER BY first_seen'
+        )
+        columns = [column[0] for column in cursor.description]
+        while batch := cursor.fetchmany(batch_size):
+            for row in batch:
+                yield dict(zip(columns, row))
+
+
+def sync_search_index(conn):
+    # Legt den Volltextindex bei Bedarf an und indiziert alle seit dem letzten Aufruf neuen Inserate.
+    # Liefert False, wenn SQLite ohne FTS5 gebaut ist; dann sucht browse_listings per LIKE.
+    try:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'listings_fts'").fetchone():
+            # executescript() würde eine offene Transaktion vorher committen, daher BEGIN/COMMIT im Skript
+            conn.executescript(f"BEGIN IMMEDIATE;{FTS_SCHEMA}COMMIT;")
+    except sqlite3.OperationalError:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'listings_fts'").fetchone():
+            return False
+    with transaction(conn):
+        indexed = conn.execute("SELECT indexed_rowid FROM search_index").fetchone()[0]
+        newest = conn.execute("SELECT MAX(rowid) FROM listings").fetchone()[0] or 0
+        if newest > indexed:
+            conn.execute("INSERT INTO listings_fts (rowid, title) SELECT rowid, title FROM listings WHERE rowid > ?", (indexed,))
+            conn.execute("UPDATE search_index SET indexed_rowid = ?", (newest,))
+    return True
+
+
+def search_query(text):
+    # Suchbegriffe -> FTS5-Abfrage: alle Wörter müssen vorkommen, jeweils auch als Wortanfang ("golf" findet "Golfplatz")
+    return " ".join(f'"{term}"*' for term in _TERM.findall(text))
+
+
+def browse_listings(path=TRACKER_DB, search="", price_min=None, price_max=None, plz_prefix="", seen_from=None, seen_to=None, sort="Zuletzt gesehen", descending=True, page=1, page_size=50):
+    # Eine Seite des Trackers: Filter, Sortierung und Blättern laufen in SQLite, geladen werden nur die
+    # Zeilen der Seite. Liefert (DataFrame mit den Excel-Spalten plus Erst-/Zuletzt-gesehen, Anzahl Treffer).
+    where, params = [], []
+    if price_min is not None:
+        where.append("price >= ?")
+        params.append(price_min)
+    if price_max is not None:
+        where.append("price <= ?")
+        params.append(price_max)
+    if plz_prefix:
+        # Bereich statt LIKE, damit der Index auf postal_code greift
+        where.append("postal_code >= ? AND postal_code < ?")
+        params += [plz_prefix, plz_prefix[:-1] + chr(ord(plz_prefix[-1]) + 1)]
+    if seen_from:
+        where.append("last_seen >= ?")
+        params.append(str(seen_from))
+    if seen_to:
+        where.append("first_seen < ?")
+        params.append(str(seen_to + timedelta(days=1)))
+    # Inserate ohne Preis stehen in beiden Richtungen am Ende
+    order = f"{SORT_COLUMNS[sort]} DESC, rowid DESC" if descending else f"{SORT_COLUMNS[sort]} ASC NULLS LAST, rowid ASC"
+
+    with connect(path) as conn:
+        matches = None
+        page_where = list(where)
+        if search and _TERM.search(search):
+            if sync_search_index(conn):
+                query = search_query(search)
+                matches = conn.execute("SELECT COUNT(*) FROM listings_fts WHERE listings_fts MATCH ?", (query,)).fetchone()[0]
+                # Bei vielen Treffern läuft die Seitenabfrage in Sortierreihenfolge über den Index und prüft gegen
+                # die Treffer ("+" verhindert, dass SQLite stattdessen alle Treffer lädt und sortiert)
+                match = "rowid IN (SELECT rowid FROM listings_fts WHERE listings_fts MATCH ?)"
+                where.insert(0, match)
+                page_where.insert(0, ("+" if matches > FTS_SCAN_THRESHOLD else "") + match)
+            else:
+                terms = [f"%{term}%" for term in _TERM.findall(search)]
+                where[:0] = page_where[:0] = ["title LIKE ?"] * len(terms)
+                query = terms
+            params = ([query] if isinstance(query, str) else query) + params
+
+        if matches is not None and len(where) == 1:
+            total = matches
+        else:
+            total = conn.execute(f"SELECT COUNT(*) FROM listings {'WHERE ' + ' AND '.join(where) if where else ''}", params).fetchone()[0]
+
+        # Erst nur die rowids der Seite über den Index bestimmen, dann die vollen Zeilen nachladen
+        select = ", ".join(f'{column} AS "{excel}"' for excel, column in FIELDS.items())
+        df = pd.read_sql_query(
+            f"""
+            SELECT {select}, first_seen AS "Erstmals gesehen", last_seen AS "Zuletzt gesehen" FROM listings
+            WHERE rowid IN (
+                SELECT rowid FROM listings {'WHERE ' + ' AND '.join(page_where) if page_where else ''}
+                ORDER BY {order} LIMIT ? OFFSET ?
+            )
+            ORDER BY {order}
+            """,
+            conn,
+            params=params + [page_size, (max(page, 1) - 1) * page_size],
+        )
+    df["VB"] = df["VB"].astype(bool)
+    return df, total
+
+
+def price_history(ad_id, path=TRACKER_DB):
+    with connect(path) as conn:
+        return pd.read_sql_query(
+            "SELECT seen_at, price FROM price_history WHERE ad_id = ? ORDER BY seen_at", conn, params=(str(ad_id),)
+        )
+
+
+def load_price_history(path=TRACKER_DB):
+    with connect(path) as conn:
+        return pd.read_sql_query("SELECT ad_id, seen_at, price FROM price_history", conn)
+
+
+def import_excel(xlsx_path=TRACKER_XLSX, path=TRACKER_DB):
+    # Übernimmt einen bestehenden Excel-Tracker. Ältere Ausgaben hatten Postleitzahl und
+    # Stadt vertauscht, das wird hier anhand der Werte erkannt und korrigiert.
+    df = pd.read_excel(xlsx_path, dtype=str)
+    if {"Postleitzahl", "Stadt"} <= set(df.columns):
+        plz_in_city = df["Stadt"].dropna().str.fullmatch(r"\d{4,5}(\.0)?").all()
+        plz_in_plz = df["Postleitzahl"].dropna().str.fullmatch(r"\d{4,5}(\.0)?").all()
+        if plz_in_city and not plz_in_plz:
+            df = df.rename(columns={"Stadt": "Postleitzahl", "Postleitzahl": "Stadt"})
+        df["Postleitzahl"] = df["Postleitzahl"].map(normalize_plz)
+    if "Preis" in df.columns:
+        df["Preis"] = pd.to_numeric(df["Preis"], errors="coerce")
+    if "VB" in df.columns:
+        df["VB"] = df["VB"].str.lower().eq("true")
+    rows = df.astype(object).where(df.notna(), None).to_dict("records")
+    return upsert_listings(rows, path)
+
+
+def ensure_tracker(path=TRACKER_DB, xlsx_path=TRACKER_XLSX):
+    # Einmalige Migration: leere Datenbank aus dem alten Excel-Tracker befüllen
+    if count_listings(path) == 0 and os.path.exists(xlsx_path):
+        import_excel(xlsx_path, path)
+
@@ -0,0 +1,52 @@
+# Such-URLs für Kleinanzeigen aus den Formularfeldern der Seiten
+import re
+from urllib.parse import urlsplit, urlunsplit
+
+SEARCH_FIELDS = (
+    "query", "category", "state", "provider", "price_min", "price_max",
+    "year_min", "year_max", "km_min", "km_max", "power_min", "power_max", "car_type",
+)
+
+# Fahrzeugmarken aus der Auswahl in pages/kleinanzeigen3.py
+BRANDS = ["Audi", "BMW", "Land-Rover", "Fiat", "Mercedes", "Porsche"]
+
+_SORT_SEGMENT = re.compile(r"/sortierung:[^/]+(?=/)")
+
+
+def generate_url(query, category="autos", state="", provider="", price_min=0, price_max=0, year_min=None, year_max=None, km_min=0, km_max=0, power_min=0, power_max=0, car_type=""):
+    base_url = f"https://www.kleinanzeigen.de/s-{category}"
+    query = query.replace(" ", "-")
+    url = f"{base_url}/anzeige:angebote/{query}"
+    
+    if state:
+        url += f"/{state}"
+    if provider:
+        url += f"/anbieter:{provider}"
+    if price_min or price_max:
+        # Offene Grenzen bleiben leer ("preis::5000", "preis:1000:")
+        url += f"/preis:{price_min or ''}:{price_max or ''}"
+    
+    if year_min is not None or year_max is not None:
+        url += f"+autos.ez_i:{year_min if year_min is not None else ''}%2C{year_max if year_max is not None else ''}"
+    if km_min > 0 or km_max > 0:
+        url += f"+autos.km_i:{km_min or ''}%2C{km_max or ''}"
+    if power_min > 0 or power_max > 0:
+        url += f"+autos.power_i:{power_min or ''}%2C{power_max or ''}"
+    if car_type:
+        url += f"+autos.typ_s:{car_type}"
+    
+    if category == "autos":
+        url += "/k0c216"
+    else:
+        url += "/k0"
+    
+    return url
+
+
+def newest_first(url):
+    # Sortierung "Neueste zuerst" als Pfadsegment direkt hinter der Kategorie (".../s-autos/sortierung:neuste/...")
+    scheme, netloc, path, query, fragment = urlsplit(url)
+    path = _SORT_SEGMENT.sub("", path)
+    head, slash, tail = path.lstrip("/").partition("/")
+    path = f"/{head}/sortierung:neuste{slash}{tail}" if slash else path
+    return urlunsplit((scheme, netloc, path, query, fragment))
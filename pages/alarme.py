@@ -0,0 +1,55 @@
+import streamlit as st
+from carvis.alerts import ALERT_WEBHOOK, ALERTS_LOG, add_rule, delete_rule, recent_alerts, rules_table, set_rule_enabled
+
+st.title("Alarme")
+
+st.write("Suchaufträge prüfen jedes frisch geladene Inserat (Scraper-Seiten, Zeitplan, Stapelläufe mit --alerts). Passt ein Inserat, wird es einmal gemeldet, bei einer Preisänderung erneut.")
+
+st.caption(f"Meldungen gehen an den Webhook {ALERT_WEBHOOK}" if ALERT_WEBHOOK else f"Meldungen werden als JSON-Zeilen nach {ALERTS_LOG} geschrieben (Webhook über CARVIS_ALERT_WEBHOOK).")
+
+# Neuen Suchauftrag anlegen
+with st.expander("Neuer Suchauftrag"):
+    with st.form("new_rule"):
+        name = st.text_input("Name", placeholder="z.B. BMW M3 im Süden")
+        terms = st.text_input("Wörter im Titel (alle müssen vorkommen)", placeholder="z.B. bmw m3")
+        col1, col2 = st.columns(2)
+        price_min = col1.number_input("Mindestpreis (optional)", min_value=0, step=1000, value=None)
+        price_max = col2.number_input("Höchstpreis (optional)", min_value=0, step=1000, value=None)
+        year_min = col1.number_input("Mindestbaujahr (optional)", min_value=1900, step=1, format="%d", value=None)
+        year_max = col2.number_input("Höchstbaujahr (optional)", min_value=1900, step=1, format="%d", value=None)
+        plz_prefixes = st.text_input("PLZ beginnt mit (optional, mehrere durch Komma)", placeholder="z.B. 8 oder 80, 81")
+        st.caption("Das Baujahr kommt aus der Erstzulassung (mit \"Details nachladen\") oder einer Jahreszahl im Titel; Inserate ohne Baujahr bzw. Preis passen nicht auf Aufträge, die danach filtern.")
+        if st.form_submit_button("Speichern"):
+            if not (name and (terms or plz_prefixes or price_min is not None or price_max is not None or year_min or year_max)):
+                st.error("Bitte einen Namen und mindestens eine Bedingung angeben.")
+            else:
+                try:
+                    rule_id = add_rule(name, terms, price_min, price_max, year_min, year_max, plz_prefixes)
+                    st.success(f"Suchauftrag #{rule_id} gespeichert.")
+                except ValueError as e:
+                    st.error(str(e))
+
+# Suchaufträge
+rules = rules_table()
+st.subheader("Suchaufträge")
+if rules.empty:
+    st.write("Noch keine Suchaufträge.")
+else:
+    st.dataframe(rules, hide_index=True)
+    rule_id = st.selectbox("Suchauftrag auswählen", rules["id"], format_func=lambda i: f"#{i} {rules.set_index('id').loc[i, 'name']}")
+    col1, col2, col3 = st.columns(3)
+    if col1.button("Aktivieren"):
+        set_rule_enabled(rule_id, True)
+        st.rerun()
+    if col2.button("Pausieren"):
+        set_rule_enabled(rule_id, False)
+        st.rerun()
+    if col3.button("Löschen"):
+        delete_rule(rule_id)
+        st.rerun()
+
+# Letzte Treffer
+st.subheader("Letzte Treffer")
+if st.button("Aktualisieren"):
+    st.rerun()
+st.dataframe(recent_alerts(), hide_index=True, column_config={"link": st.column_config.LinkColumn()})
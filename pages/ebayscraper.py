@@ -1,12 +1,22 @@
 import streamlit as st
 import requests
-from bs4 import BeautifulSoup
-from datetime import datetime, timedelta
+from datetime import datetime
 import pandas as pd
 import time
 import random
-import re
-from fake_useragent import UserAgent
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from carvis.alerts import check_listings
+from carvis.analytics import price_stats
+from carvis.cache import cache_key
+from carvis.client import fetch
+from carvis.crawler import crawl_delta, crawl_pages
+from carvis.details import enrich_listings
+from carvis.export import FORMATS, export_rows
+from carvis.metrics import run, sidebar_panel, timer
+from carvis.parsing import last_page_number, parse_result_page
+from carvis.resources import result_cache, scheduler
+from carvis.store import ensure_tracker, upsert_listings
+from carvis.urls import SEARCH_FIELDS, generate_url
 
 st.title("Ebay Scraper")
 
@@ -47,6 +57,18 @@ power_max = st.number_input("Höchstleistung (optional)", min_value=0, step=10)
 # Dropdown-Menü für den Karosserietyp
 car_type = st.selectbox("Karosserietyp (optional)", ["", "coupe", "cabrio", "kombi"])
 
+# Inkrementell: neueste zuerst und nur bis zur ersten Seite mit lauter bekannten Inseraten laden
+incremental = st.checkbox("Nur neue und geänderte Inserate (inkrementell, gleicht mit dem Tracker ab)")
+
+# Ergebnisse derselben Suche kommen bis zu 15 Minuten aus dem Cache, außer es wird neu geladen
+force_refresh = st.checkbox("Cache ignorieren und neu laden")
+
+# Detailseiten nachladen; bereits bekannte, unveränderte Inserate kommen aus der Datenbank
+load_details = st.checkbox("Details nachladen (Kilometerstand, Erstzulassung, Leistung, Kraftstoff, Getriebe)")
+
+# Format der Ergebnisdatei
+export_format = st.selectbox("Exportformat", list(FORMATS))
+
 # Eingabe für das Startdatum und die Startzeit
 start_date = st.date_input("Startdatum")
 start_time = st.time_input("Startzeit")
@@ -55,28 +77,13 @@ start_time = st.time_input("Startzeit")
 now = datetime.now()
 prefix = "[" + now.strftime("%H:%M:%S") + "] - "
 
-def clean_price(price_text):
-    return int(re.sub(r'[^0-9]', '', price_text)) if re.search(r'\d', price_text) else None
-
-def get_soup(url, headers):
+def get_html(url):
     try:
-        # Zusätzliche Header hinzufügen
-        headers.update({
-            'Accept-Language': 'de-DE,de;q=0.9,en-US;q=0.8,en;q=0.7',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Referer': 'https://www.google.com/',
-            'DNT': '1',  # Do Not Track
-        })
-        
-        # Anfrage senden
-        headers['User-Agent'] = UserAgent().random
-        cookies = {'cookie_name': 'cookie_value'}
-        response = requests.get(url, headers=headers, cookies=cookies, timeout=10)
-        response.raise_for_status()  # Löst eine Exception aus, wenn der HTTP-Statuscode nicht 200 ist
-        return BeautifulSoup(response.content, "html.parser")
+        # Anfrage über den gemeinsamen HTTP-Client senden (Verbindungs-Pool, Retries, User-Agent-Rotation)
+        response = fetch(url)
+        return response.text
     except requests.exceptions.HTTPError as http_err:
-        st.error(f"HTTP-Fehler: {http_err} (Statuscode: {response.status_code})")
+        st.error(f"HTTP-Fehler: {http_err} (Statuscode: {http_err.response.status_code})")
     except requests.exceptions.ConnectionError:
         st.error("Verbindungsfehler: Überprüfe deine Internetverbindung.")
     except requests.exceptions.Timeout:
@@ -85,99 +92,69 @@ def get_soup(url, headers):
         st.error(f"Allgemeiner Fehler bei der Anfrage: {e}")
     return None
 
-def generate_url(query, category, state, provider, price_min, price_max, year_min, year_max, km_min, km_max, power_min, power_max, car_type):
-    base_url = f"https://www.kleinanzeigen.de/s-{category}"
-    query = query.replace(" ", "-")
-    url = f"{base_url}/anzeige:angebote/{query}"
-    
-    if state:
-        url += f"/{state}"
-    if provider:
-        url += f"/anbieter:{provider}"
-    if price_min or price_max:
-        url += f"/preis:{price_min}:{price_max}"
-    
-    if year_min is not None or year_max is not None:
-        url += f"+autos.ez_i:{year_min if year_min is not None else ''}%2C{year_max if year_max is not None else ''}"
-    if km_min > 0 or km_max > 0:
-        url += f"+autos.km_i:{km_min}%2C{km_max}"
-    if power_min > 0 or power_max > 0:
-        url += f"+autos.power_i:{power_min}%2C{power_max}"
-    if car_type:
-        url += f"+autos.typ_s:{car_type}"
-    
-    if category == "autos":
-        url += "/k0c216"
+def scrape_kleinanzeigen(url, incremental=False):
+    first_html = []
+
+    def fetch_page(target):
+        html = get_html(target)
+        if not html:
+            return None
+        # Seite 1 wird immer zuerst und allein geladen
+        if not first_html:
+            first_html.append(html)
+        # Nur die article.aditem-Elemente werden geparst, alle Felder in einem Durchlauf
+        return parse_result_page(html), last_page_number(html)
+
+    # Worker-Threads brauchen den Streamlit-Kontext für st.error/st.warning
+    ctx = get_script_run_ctx()
+    initializer = lambda: add_script_run_ctx(ctx=ctx)
+    if incremental:
+        ensure_tracker()
+        delta, seen, page_count, watermark = crawl_delta(url, fetch_page, initializer=initializer)
+        # Alle geladenen Inserate in den Tracker, damit der nächste Lauf früher abbricht
+        with timer("tracker"):
+            upsert_listings([listing.to_row() for listing in seen], watermark=watermark)
+        pages = [delta]
     else:
-        url += "/k0"
-    
-    return url
+        pages = crawl_pages(url, fetch_page, initializer=initializer)
+        page_count = len(pages)
 
-def scrape_kleinanzeigen(url):
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/84.0.4147.125 Safari/537.36'
-    }
-    
-    soup = get_soup(url, headers)
-    if not soup:
+    if not first_html:
         st.error("Fehler beim Abrufen der Seite. Überprüfe die URL oder die Internetverbindung.")
         return []
     
     # Debugging: HTML-Inhalt der Seite ausgeben
-    st.text_area("HTML-Inhalt der Seite", soup.prettify(), height=300)
-
-    listings = []
-    # Suche nach Anzeigen-Elementen
-    ad_items = soup.find_all("article", class_="aditem")
-    st.write(f"Anzahl gefundener Anzeigen-Elemente: {len(ad_items)}")  # Debugging: Anzahl der gefundenen Elemente
+    with timer("debug_html"):
+        st.text_area("HTML-Inhalt der Seite", first_html[0], height=300)
+
+    listings = [listing.to_row() for page in pages for listing in page]
+    if incremental:
+        st.write(f"Anzahl gefundener Anzeigen-Elemente: {len(seen)} auf {page_count} Seite(n), davon neu oder mit geändertem Preis: {len(listings)}")
+        if seen and not listings:
+            st.info("Keine neuen oder geänderten Inserate seit dem letzten Lauf.")
+            return []
+    else:
+        st.write(f"Anzahl gefundener Anzeigen-Elemente: {len(listings)} auf {page_count} Seite(n)")  # Debugging: Anzahl der gefundenen Elemente
     
-    if not ad_items:
+    if not listings:
         st.warning("Keine Anzeigen-Elemente gefunden. Überprüfe die Struktur der Seite.")
         return []
 
-    for ad in ad_items:
-        try:
-            # Datum des Inserats
-            date_tag = ad.find("div", class_="aditem-main--top--right")
-            date = date_tag.text.strip() if date_tag else "Kein Datum"
-            
-            # Titel der Anzeige
-            title_tag = ad.find("h2", class_="text-module-begin")
-            title = title_tag.text.strip() if title_tag else "Kein Titel"
-            
-            # Stadt und Postleitzahl
-            location_tag = ad.find("div", class_="aditem-main--top--left")
-            location = location_tag.text.strip() if location_tag else "Keine Adresse"
-            city, postal_code = location.split(" ", 1) if " " in location else (location, "Keine Postleitzahl")
-            
-            # Preis der Anzeige
-            price_tag = ad.find("p", class_="aditem-main--middle--price-shipping--price")
-            price_text = price_tag.text.strip() if price_tag else "Kein Preis"
-            price = clean_price(price_text)
-            vb = "VB" in price_text
-            
-            # Link zur Anzeige
-            link = ad.get("data-href")
-            link = f"https://www.kleinanzeigen.de{link}" if link else "Kein Link"
-            
-            # Daten speichern
-            listings.append({
-                "Datum": date,
-                "Titel": title,
-                "Stadt": city,
-                "Postleitzahl": postal_code,
-                "Preis": price,
-                "VB": vb,
-                "Link": link
-            })
-        except Exception as e:
-            st.warning(f"Fehler beim Verarbeiten einer Anzeige: {e}")
-    
     return listings
 
+def report_alerts(rows):
+    # Treffer der Suchaufträge (Seite "Alarme") melden
+    try:
+        alerts = check_listings(rows)
+    except (requests.exceptions.RequestException, OSError) as e:
+        st.warning(f"Treffer der Suchaufträge konnten nicht gemeldet werden: {e}")
+        return
+    if alerts:
+        st.success(f"{len(alerts)} neue Treffer für Suchaufträge, siehe Seite \"Alarme\".")
+
 def save_to_excel(data, filename="kleinanzeigen.xlsx"):
-    df = pd.DataFrame(data)
-    df.to_excel(filename, index=False)
+    # Zeilenweise über den Export-Writer; Inserat ID und Postleitzahl bleiben Text
+    export_rows(data, filename, list(data[0]))
     print(prefix + f"Daten gespeichert unter {filename}")
 
 if st.button("Scraper starten"):
@@ -185,24 +162,47 @@ if st.button("Scraper starten"):
     wait_time = (start_datetime - datetime.now()).total_seconds()
     
     if wait_time > 0:
-        st.write(f"Der Scraper startet in {wait_time} Sekunden...")
-        time.sleep(wait_time)
-    
-    if custom_url:
-        url = custom_url
-        st.write(prefix + f"Es wird nach den Ergebnissen des Custom-Links gesucht: {custom_url}")
+        # Im Hintergrund-Scheduler einplanen statt die Seite per time.sleep zu blockieren
+        params = {"url": custom_url} if custom_url else dict(zip(SEARCH_FIELDS, (query, category, state, provider, price_min, price_max, year_min, year_max, km_min, km_max, power_min, power_max, car_type)))
+        params["incremental"] = incremental
+        scheduler().add_job(query or custom_url, params, start_at=start_datetime, backend="requests")
+        st.success(prefix + f"Suche für {start_datetime:%d.%m.%Y %H:%M} eingeplant, Status auf der Seite \"Zeitplan\".")
     else:
-        url = generate_url(query, category, state, provider, price_min, price_max, year_min, year_max, km_min, km_max, power_min, power_max, car_type)
-        st.write(prefix + f"Es wird nach {query} gesucht...")
+        # Zeiten und Zähler dieses Laufs für das Panel "Messwerte" in der Seitenleiste
+        with run("ebayscraper") as metrics:
+            if custom_url:
+                url = custom_url
+                st.write(prefix + f"Es wird nach den Ergebnissen des Custom-Links gesucht: {custom_url}")
+            else:
+                url = generate_url(query, category, state, provider, price_min, price_max, year_min, year_max, km_min, km_max, power_min, power_max, car_type)
+                st.write(prefix + f"Es wird nach {query} gesucht...")
     
-    listings = scrape_kleinanzeigen(url)
-    if listings:
-        save_to_excel(listings)
-        st.write(prefix + f"Durchschnittspreis: {sum([l['Preis'] for l in listings if l['Preis']])/len(listings):.2f} €")
-    else:
-        st.write(prefix + "Keine Ergebnisse gefunden.")
+            if incremental:
+                # Das Delta hängt vom Stand des Trackers ab und wird daher nie aus dem Cache geliefert
+                listings, from_cache = scrape_kleinanzeigen(url, incremental), False
+            else:
+                listings, stored_at, from_cache = result_cache().get_or_scrape(cache_key(url), lambda: scrape_kleinanzeigen(url), force_refresh)
+                if from_cache:
+                    st.info(prefix + f"Ergebnisse aus dem Cache vom {datetime.fromtimestamp(stored_at):%d.%m.%Y %H:%M:%S}")
+            if listings and load_details:
+                listings, detail_stats = enrich_listings(listings)
+                st.write(prefix + f"Details: {detail_stats['geladen']} geladen, {detail_stats['cache']} aus dem Cache, {detail_stats['fehler']} fehlgeschlagen")
+            if listings:
+                save_to_excel(listings, "kleinanzeigen" + export_format)
+                if not from_cache:
+                    report_alerts(listings)
+                # Nur Inserate mit Preis zählen für den Durchschnitt
+                stats = price_stats([l["Preis"] for l in listings])
+                if stats:
+                    st.write(prefix + f"Durchschnittspreis: {stats['mean']:.2f} € ({stats['count']} Inserate mit Preis)")
+                # Bleibt über Reruns erhalten, z.B. nach "Generierten Link anzeigen"
+                st.session_state["ebay_ergebnisse"] = listings
+            else:
+                st.write(prefix + "Keine Ergebnisse gefunden.")
+        st.session_state["ebay_messwerte"] = metrics["metrics"]
     
-    time.sleep(random.uniform(3, 7))
+        if not from_cache:
+            time.sleep(random.uniform(3, 7))
 
 if st.button("Generierten Link anzeigen"):
     if custom_url:
@@ -210,3 +210,9 @@ if st.button("Generierten Link anzeigen"):
     else:
         url = generate_url(query, category, state, provider, price_min, price_max, year_min, year_max, km_min, km_max, power_min, power_max, car_type)
     st.write(f"Generierter Link: {url}")
+
+if st.session_state.get("ebay_ergebnisse"):
+    st.write("Letzte Ergebnisse:")
+    st.dataframe(pd.DataFrame(st.session_state["ebay_ergebnisse"]))
+
+sidebar_panel(st.session_state.get("ebay_messwerte"))
@@ -1,18 +1,28 @@
 import streamlit as st
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from datetime import datetime, timedelta
+from datetime import datetime
 import pandas as pd
 import time
 import random
 import os
-import folium
+import requests
 from streamlit_folium import st_folium
+from carvis.alerts import check_listings
+from carvis.analytics import price_stats
+from carvis.backend import fetch_listings, scrape_adaptive
+from carvis.cache import cache_key
+from carvis.crawler import PAGE_SIZE
+from carvis.dedup import dedup_listings, find_reposts, normalize_date
+from carvis.details import enrich_listings
+from carvis.export import FORMATS, export_rows, export_tracker
+from carvis.geo import build_map
+from carvis.metrics import run, sidebar_panel, timer
+from carvis.resources import driver_pool, result_cache, scheduler
+from carvis.shards import scrape_sharded, search_params
+from carvis.store import OUTPUT_DIR, TRACKER_DB, TRACKER_XLSX, ensure_tracker, load_tracker, upsert_listings
+from carvis.urls import SEARCH_FIELDS, generate_url
+
+# Without sharding a search shows at most this many listings
+MAX_RESULTS = 150
 
 st.title("Ebay Scraper (Selenium)")
 
@@ -67,188 +77,150 @@ selected_option = st.selectbox("Oder wähle eine Fahrzeugmarke", [""] + dropdown
 if selected_option:
     file_naming_option = selected_option
 
-def generate_url(query, category, state, provider, price_min, price_max, year_min, year_max, km_min, km_max, power_min, power_max, car_type):
-    base_url = f"https://www.kleinanzeigen.de/s-{category}"
-    query = query.replace(" ", "-")
-    url = f"{base_url}/anzeige:angebote/{query}"
-    
-    if state:
-        url += f"/{state}"
-    if provider:
-        url += f"/anbieter:{provider}"
-    if price_min or price_max:
-        url += f"/preis:{price_min}:{price_max}"
-    
-    if year_min is not None or year_max is not None:
-        url += f"+autos.ez_i:{year_min if year_min is not None else ''}%2C{year_max if year_max is not None else ''}"
-    if km_min > 0 or km_max > 0:
-        url += f"+autos.km_i:{km_min}%2C{km_max}"
-    if power_min > 0 or power_max > 0:
-        url += f"+autos.power_i:{power_min}%2C{power_max}"
-    if car_type:
-        url += f"+autos.typ_s:{car_type}"
-    
-    if category == "autos":
-        url += "/k0c216"
+# Exportformat der Ergebnisdatei und des Tracker-Exports
+export_format = st.selectbox("Exportformat", list(FORMATS))
+
+# Ergebnisse derselben Suche kommen bis zu 15 Minuten aus dem Cache, außer es wird neu geladen
+force_refresh = st.checkbox("Cache ignorieren und neu laden")
+
+# Detailseiten nachladen; bereits bekannte, unveränderte Inserate kommen aus der Datenbank
+load_details = st.checkbox("Details nachladen (Kilometerstand, Erstzulassung, Leistung, Kraftstoff, Getriebe)")
+
+# Große Suchen (z.B. eine ganze Marke) nach Preis, Baujahr und Kilometerstand aufteilen statt bei 150 abzuschneiden
+shard_search = st.checkbox("Große Suchen automatisch aufteilen (alle Treffer statt höchstens 150, nur ohne vorgefertigten Link)")
+
+def scrape_kleinanzeigen(url, params=None):
+    if params:
+        # Shards below the pagination cap, run concurrently and merged by Inserat ID
+        try:
+            ads, shards = scrape_sharded(params, fetch_page=lambda target: fetch_listings(target, driver_pool()))
+        except requests.exceptions.RequestException as e:
+            st.error(f"Fehler beim Aufteilen der Suche: {e}")
+            return []
+        st.write(f"Suche in {len(shards)} Teilsuchen aufgeteilt, {len(ads)} Inserate:")
+        st.dataframe(pd.DataFrame([shard.to_row() for shard in shards]), hide_index=True, column_config={"Link": st.column_config.LinkColumn()})
+        if not all(shard.complete for shard in shards):
+            st.warning("Einige Teilsuchen ließen sich nicht weiter aufteilen und sind unvollständig.")
     else:
-        url += "/k0"
+        # All result pages up to one page past the limit, so the limit warning below can tell whether
+        # there are more; plain HTTP first, the warm browser from the shared pool only for blocked pages
+        try:
+            ads, used = scrape_adaptive(url, driver_pool(), max_pages=MAX_RESULTS // PAGE_SIZE + 1)
+        except (RuntimeError, requests.exceptions.RequestException):
+            st.error("Fehler beim Abrufen der Seite, weder per HTTP noch per Browser.")
+            return []
+        st.caption("Geladen per " + ", ".join(f"{'Browser' if backend == 'selenium' else 'HTTP'} ({pages} Seiten)" for backend, pages in used.items()))
+    rows = [ad.to_row() for ad in ads]
+    # Replace "Heute"/"Gestern" with the actual date
+    for row in rows:
+        row["Datum"] = normalize_date(row["Datum"])
     
-    return url
-
-def scrape_kleinanzeigen(url):
-    options = Options()
-    options.add_argument("--headless")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    driver = webdriver.Chrome(service=Service(), options=options)
-    
-    try:
-        driver.get(url)
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CLASS_NAME, "aditem")))
-        
-        listings = []
-        seen_ads = {}  # Track duplicates by (price, city)
-        ad_items = driver.find_elements(By.CLASS_NAME, "aditem")
-        
-        for ad in ad_items:
-            if len(listings) >= 150:  # Safety net: Stop after 150 results
-                st.warning("Mehr als 150 Ergebnisse gefunden. Bitte die Suchkriterien eingrenzen.")
-                break
-            try:
-                ad_id = ad.get_attribute("data-adid")  # Extract Inserat ID
-                date = ad.find_element(By.CLASS_NAME, "aditem-main--top--right").text.strip()
-                # Replace "Heute" with today's date
-                if date.lower() == "heute":
-                    date = datetime.now().strftime("%d.%m.%Y")
-                title = ad.find_element(By.CLASS_NAME, "text-module-begin").text.strip()
-                location = ad.find_element(By.CLASS_NAME, "aditem-main--top--left").text.strip()
-                city, postal_code = location.split(" ", 1) if " " in location else (location, "Keine Postleitzahl")
-                price_text = ad.find_element(By.CLASS_NAME, "aditem-main--middle--price-shipping--price").text.strip()
-                price = int(''.join(filter(str.isdigit, price_text))) if any(char.isdigit() for char in price_text) else None
-                vb = "VB" in price_text
-                link = ad.get_attribute("data-href")
-                link = f"https://www.kleinanzeigen.de{link}" if link else "Kein Link"
-                
-                # Check for duplicates
-                key = (price, city)
-                if key in seen_ads:
-                    existing_date = seen_ads[key]["Datum"]
-                    if date > existing_date:  # Keep the newer ad
-                        listings.remove(seen_ads[key])
-                        seen_ads[key] = {
-                            "Inserat ID": ad_id,
-                            "Datum": date,
-                            "Titel": title,
-                            "Postleitzahl": postal_code,
-                            "Stadt": city,
-                            "Preis": price,
-                            "VB": vb,
-                            "Link": link
-                        }
-                        listings.append(seen_ads[key])
-                else:
-                    ad_data = {
-                        "Inserat ID": ad_id,
-                        "Datum": date,
-                        "Titel": title,
-                        "Postleitzahl": postal_code,
-                        "Stadt": city,
-                        "Preis": price,
-                        "VB": vb,
-                        "Link": link
-                    }
-                    seen_ads[key] = ad_data
-                    listings.append(ad_data)
-            except Exception as e:
-                st.warning(f"Fehler beim Verarbeiten einer Anzeige: {e}")
-        
-        return listings
-    finally:
-        driver.quit()
-
-def save_to_excel(data, query, year_min, year_max, price_min, price_max):
-    # Ensure output directory exists
-    output_dir = os.path.join(os.getcwd(), "Output der Fahrzeugsuchen")
-    os.makedirs(output_dir, exist_ok=True)
+    # Exact dedup by Inserat ID; reposts under a new ID are only reported after saving
+    listings = dedup_listings(rows)
+    if not params and len(listings) > MAX_RESULTS:  # Safety net: Stop after 150 results
+        st.warning(f"Mehr als {MAX_RESULTS} Ergebnisse gefunden, angezeigt werden nur die ersten {MAX_RESULTS}. Bitte die Suchkriterien eingrenzen oder die Suche automatisch aufteilen lassen.")
+        listings = listings[:MAX_RESULTS]
     
+    return listings
+
+def save_to_excel(data, query, year_min, year_max, price_min, price_max, update_tracker=True):
     # Generate filename based on user input or dropdown selection
     year_range = f"{year_min}-{year_max}" if year_min and year_max else "alle"
     price_range = f"{price_min}-{price_max}" if price_min and price_max else "alle"
-    filename = f"{file_naming_option}_{year_range}_{price_range}.xlsx".replace(" ", "_")
-    filepath = os.path.join(output_dir, filename)
+    filename = f"{file_naming_option}_{year_range}_{price_range}{export_format}".replace(" ", "_")
+    filepath = os.path.join(OUTPUT_DIR, filename)
     
-    # Save to Excel (overwrite if exists)
-    df = pd.DataFrame(data)
-    # Ensure city and Inserat ID are stored as text
-    df["Postleitzahl"] = df["Postleitzahl"].astype(float)
-    df["Inserat ID"] = df["Inserat ID"].astype(float)
-    df.to_excel(filepath, index=False)
+    # Stream rows to the file (overwrite if exists); Inserat ID and Postleitzahl stay text
+    export_rows(data, filepath, list(data[0]))
     st.success(f"Daten gespeichert unter {filepath}")
     
-    # Update Tracker_Outputs.xlsx
-    tracker_filepath = os.path.join(output_dir, "Tracker_Outputs.xlsx")
-    if os.path.exists(tracker_filepath):
-        tracker_df = pd.read_excel(tracker_filepath, dtype={"Postleitzahl": float, "Inserat ID": float})
-    else:
-        tracker_df = pd.DataFrame(columns=["Inserat ID", "Datum", "Titel", "Postleitzahl", "Stadt", "Preis", "VB", "Link"])
-    
-    # Append new data and remove duplicates
-    new_data_df = pd.DataFrame(data)
-    combined_df = pd.concat([tracker_df, new_data_df]).drop_duplicates(subset=["Inserat ID"], keep="last")
-    combined_df.to_excel(tracker_filepath, index=False)
-    st.success(f"Tracker aktualisiert unter {tracker_filepath}")
+    # Cached results were already written to the tracker when they were scraped
+    if not update_tracker:
+        return
+
+    # Update tracker database (upsert by Inserat ID instead of rewriting Tracker_Outputs.xlsx)
+    with timer("tracker"):
+        ensure_tracker()
+        new_count, updated_count = upsert_listings(data)
+    st.success(f"Tracker aktualisiert: {new_count} neue, {updated_count} bekannte Inserate ({TRACKER_DB})")
+
+    # Reposts: same car listed again under a new Inserat ID
+    reposts = find_reposts(load_tracker(), ids=[row["Inserat ID"] for row in data])
+    if not reposts.empty:
+        st.write(f"Mögliche Reposts bereits bekannter Inserate: {len(reposts)}")
+        st.dataframe(reposts)
+
+def report_alerts(rows):
+    # Report matches of the watch rules (page "Alarme")
+    try:
+        alerts = check_listings(rows)
+    except (requests.exceptions.RequestException, OSError) as e:
+        st.warning(f"Treffer der Suchaufträge konnten nicht gemeldet werden: {e}")
+        return
+    if alerts:
+        st.success(f"{len(alerts)} neue Treffer für Suchaufträge, siehe Seite \"Alarme\".")
+
+def show_results(data):
+    df = pd.DataFrame(data)
 
     # Display the data in Streamlit
     st.write("Tabellarische Darstellung der Ergebnisse:")
     st.dataframe(df)
 
-    # Display price statistics
-    prices = [row["Preis"] for row in data if row["Preis"] is not None]
-    if prices:
-        st.write(f"Durchschnittspreis: {sum(prices) / len(prices):.2f} €")
-        st.write(f"Minimaler Preis: {min(prices)} €")
-        st.write(f"Maximaler Preis: {max(prices)} €")
+    # Display price statistics (only listings with a price)
+    stats = price_stats(df["Preis"])
+    if stats:
+        st.write(f"Durchschnittspreis: {stats['mean']:.2f} €")
+        st.write(f"Minimaler Preis: {stats['min']:.0f} €")
+        st.write(f"Maximaler Preis: {stats['max']:.0f} €")
+        st.write("Detaillierte Auswertung über den ganzen Tracker auf der Seite \"Marktanalyse\".")
 
     # Display a map with pins for the listings
     st.write("Karte der Inserate:")
-    map_center = [51.1657, 10.4515]  # Center of Germany
-    m = folium.Map(location=map_center, zoom_start=6)
-    for _, row in df.iterrows():
-        if row["Postleitzahl"] != "Keine Postleitzahl":
-            try:
-                # Use the postal code to approximate the location
-                folium.Marker(
-                    location=[float(row["Postleitzahl"][:2]) + 0.5, float(row["Postleitzahl"][:2]) + 0.5],  # Approximation
-                    popup=f"{row['Titel']}<br>Preis: {row['Preis']} €<br><a href='{row['Link']}' target='_blank'>Inserat ansehen</a>",
-                    tooltip=row["Titel"]
-                ).add_to(m)
-            except Exception as e:
-                st.warning(f"Fehler beim Hinzufügen eines Pins: {e}")
-    st_folium(m, width=700, height=500)
+    # Offline PLZ coordinates, clustered markers built client-side
+    with timer("map"):
+        m = build_map(df)
+        st_folium(m, width=700, height=500, returned_objects=[])
 
 if st.button("Scraper starten"):
     start_datetime = datetime.combine(start_date, start_time)
     wait_time = (start_datetime - datetime.now()).total_seconds()
     
     if wait_time > 0:
-        st.write(f"Der Scraper startet in {wait_time} Sekunden...")
-        time.sleep(wait_time)
-    
-    if custom_url:
-        url = custom_url
-        st.write(f"Es wird nach den Ergebnissen des Custom-Links gesucht: {custom_url}")
+        # Im Hintergrund-Scheduler einplanen statt die Seite per time.sleep zu blockieren
+        params = {"url": custom_url} if custom_url else dict(zip(SEARCH_FIELDS, (query, category, state, provider, price_min, price_max, year_min, year_max, km_min, km_max, power_min, power_max, car_type)))
+        scheduler().add_job(query or custom_url, params, start_at=start_datetime, backend="selenium")
+        st.success(f"Suche für {start_datetime:%d.%m.%Y %H:%M} eingeplant, Status auf der Seite \"Zeitplan\".")
     else:
-        url = generate_url(query, category, state, provider, price_min, price_max, year_min, year_max, km_min, km_max, power_min, power_max, car_type)
-        st.write(f"Es wird nach {query} gesucht...")
+        # Zeiten und Zähler dieses Laufs für das Panel "Messwerte" in der Seitenleiste
+        with run("kleinanzeigen3") as metrics:
+            if custom_url:
+                url = custom_url
+                st.write(f"Es wird nach den Ergebnissen des Custom-Links gesucht: {custom_url}")
+            else:
+                url = generate_url(query, category, state, provider, price_min, price_max, year_min, year_max, km_min, km_max, power_min, power_max, car_type)
+                st.write(f"Es wird nach {query} gesucht...")
     
-    listings = scrape_kleinanzeigen(url)
-    if listings:
-        save_to_excel(listings, query, year_min, year_max, price_min, price_max)
-    else:
-        st.write("Keine Ergebnisse gefunden.")
+            params = search_params(dict(zip(SEARCH_FIELDS, (query, category, state, provider, price_min, price_max, year_min, year_max, km_min, km_max, power_min, power_max, car_type)))) if shard_search and not custom_url else None
+            listings, stored_at, from_cache = result_cache().get_or_scrape(cache_key(url, "shards" if params else "selenium"), lambda: scrape_kleinanzeigen(url, params), force_refresh)
+            if from_cache:
+                st.info(f"Ergebnisse aus dem Cache vom {datetime.fromtimestamp(stored_at):%d.%m.%Y %H:%M:%S}")
+            if listings and load_details:
+                with st.spinner("Lade Detailseiten..."):
+                    listings, detail_stats = enrich_listings(listings)
+                st.write(f"Details: {detail_stats['geladen']} geladen, {detail_stats['cache']} aus dem Cache, {detail_stats['fehler']} fehlgeschlagen")
+            if listings:
+                save_to_excel(listings, query, year_min, year_max, price_min, price_max, update_tracker=not from_cache)
+                if not from_cache:
+                    report_alerts(listings)
+                # Bleibt über Reruns erhalten, z.B. nach "Generierten Link anzeigen"
+                st.session_state["selenium_ergebnisse"] = listings
+            else:
+                st.write("Keine Ergebnisse gefunden.")
+        st.session_state["selenium_messwerte"] = metrics["metrics"]
     
-    time.sleep(random.uniform(3, 7))
+        if not from_cache:
+            time.sleep(random.uniform(3, 7))
 
 if st.button("Generierten Link anzeigen"):
     if custom_url:
@@ -256,3 +228,15 @@ if st.button("Generierten Link anzeigen"):
     else:
         url = generate_url(query, category, state, provider, price_min, price_max, year_min, year_max, km_min, km_max, power_min, power_max, car_type)
     st.write(f"Generierter Link: {url}")
+
+if st.button("Tracker exportieren"):
+    ensure_tracker()
+    target = os.path.splitext(TRACKER_XLSX)[0] + export_format
+    rows = export_tracker(target)
+    st.success(f"{rows} Inserate exportiert nach {target}")
+
+
+if st.session_state.get("selenium_ergebnisse"):
+    show_results(st.session_state["selenium_ergebnisse"])
+
+sidebar_panel(st.session_state.get("selenium_messwerte"))
@@ -0,0 +1,77 @@
+import streamlit as st
+from carvis.analytics import market_report
+from carvis.store import TRACKER_DB, ensure_tracker, load_price_history, load_tracker, tracker_version
+
+st.title("Marktanalyse")
+
+st.write("Preisverteilung je Modell, Deal-Score (Abweichung vom erwarteten Preis nach Alter und Kilometerstand), Standzeiten und Preissenkungen über alle Inserate im Tracker.")
+
+
+@st.cache_data(max_entries=2, show_spinner="Tracker wird ausgewertet...")
+def load_report(path, version):
+    # version ändert sich mit jedem Schreibvorgang, danach wird neu gerechnet
+    return market_report(load_tracker(path), load_price_history(path))
+
+
+ensure_tracker()
+report = load_report(TRACKER_DB, tracker_version())
+listings = report["listings"]
+
+if listings.empty:
+    st.info("Der Tracker ist noch leer. Starte zuerst eine Suche.")
+    st.stop()
+
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Inserate", f"{len(listings):,}".replace(",", "."))
+col2.metric("Modelle", listings["Modell"].nunique())
+col3.metric("Aktiv", int(listings["Aktiv"].sum()))
+col4.metric("Mit Preissenkung", len(report["drops"]))
+
+# Filter
+percentiles = report["percentiles"]
+min_count = st.slider("Mindestanzahl Inserate je Modell", 1, 100, 10)
+models = st.multiselect("Modelle", percentiles.index[percentiles["Anzahl"] >= min_count].tolist())
+selected = listings[listings["Modell"].isin(models)] if models else listings[listings["Modell"].isin(percentiles.index[percentiles["Anzahl"] >= min_count])]
+
+st.subheader("Preisperzentile je Modell")
+st.dataframe(percentiles.loc[percentiles.index.isin(selected["Modell"].unique())], column_config={
+    column: st.column_config.NumberColumn(format="%.0f €") for column in percentiles.columns if column != "Anzahl"
+})
+
+st.subheader("Beste Deals")
+col1, col2 = st.columns(2)
+only_active = col1.checkbox("Nur aktive Inserate", value=True)
+# Ohne Baujahr im Titel rechnet die Regression mit dem Modellmedian, der Score ist dann wenig aussagekräftig
+only_with_year = col2.checkbox("Nur Inserate mit Baujahr im Titel", value=True)
+deals = selected.dropna(subset=["Deal-Score"])
+if only_active:
+    deals = deals[deals["Aktiv"]]
+if only_with_year:
+    deals = deals.dropna(subset=["Baujahr"])
+st.dataframe(
+    deals.nlargest(50, "Deal-Score")[["Titel", "Modell", "Baujahr", "Kilometer", "Preis", "Erwarteter Preis", "Deal-Score", "Standzeit", "Link"]],
+    hide_index=True,
+    column_config={
+        "Baujahr": st.column_config.NumberColumn(format="%d"),
+        "Preis": st.column_config.NumberColumn(format="%.0f €"),
+        "Erwarteter Preis": st.column_config.NumberColumn(format="%.0f €"),
+        "Deal-Score": st.column_config.NumberColumn(format="%.1f %%"),
+        "Link": st.column_config.LinkColumn(),
+    },
+)
+
+if len(models) == 1:
+    st.write(f"Preis nach Alter: {models[0]}")
+    st.scatter_chart(selected.dropna(subset=["Alter", "Preis"]), x="Alter", y="Preis")
+
+st.subheader("Standzeit")
+standing = selected.groupby("Modell").agg(
+    Inserate=("Standzeit", "size"), Aktiv=("Aktiv", "sum"), **{"Median Tage": ("Standzeit", "median"), "Max Tage": ("Standzeit", "max")}
+)
+st.dataframe(standing.sort_values("Inserate", ascending=False))
+
+st.subheader("Preissenkungen")
+drops = report["drops"].merge(listings[["Inserat ID", "Titel", "Modell", "Link"]], on="Inserat ID", how="left")
+if models:
+    drops = drops[drops["Modell"].isin(models)]
+st.dataframe(drops.head(200), hide_index=True, column_config={"Link": st.column_config.LinkColumn()})
@@ -0,0 +1,65 @@
+import time
+
+import streamlit as st
+from carvis.store import SORT_COLUMNS, TRACKER_DB, browse_listings, ensure_tracker
+
+st.title("Tracker durchsuchen")
+
+st.write("Alle jemals gefundenen Inserate. Gefiltert, sortiert und geblättert wird direkt in der Datenbank, geladen wird immer nur die angezeigte Seite.")
+
+ensure_tracker()
+
+# Filter
+search = st.text_input("Titelsuche", placeholder="z.B. golf kombi (alle Wörter, auch als Wortanfang)")
+col1, col2, col3 = st.columns(3)
+price_min = col1.number_input("Mindestpreis", min_value=0, step=1000, value=None)
+price_max = col2.number_input("Höchstpreis", min_value=0, step=1000, value=None)
+plz_prefix = col3.text_input("PLZ beginnt mit", max_chars=5)
+seen = st.date_input("Gesehen im Zeitraum (optional)", value=(), format="DD.MM.YYYY")
+
+col1, col2, col3 = st.columns(3)
+sort = col1.selectbox("Sortierung", list(SORT_COLUMNS))
+descending = col2.selectbox("Reihenfolge", ["absteigend", "aufsteigend"]) == "absteigend"
+page_size = col3.selectbox("Zeilen pro Seite", [25, 50, 100, 200], index=1)
+
+if plz_prefix and not plz_prefix.isdigit():
+    st.error("Die Postleitzahl darf nur Ziffern enthalten.")
+    st.stop()
+
+# Neue Filter beginnen wieder auf Seite 1
+filters = (search, price_min, price_max, plz_prefix, seen, sort, descending, page_size)
+if st.session_state.get("tracker_filter") != filters:
+    st.session_state["tracker_filter"] = filters
+    st.session_state["tracker_seite"] = 1
+page = st.number_input("Seite", min_value=1, step=1, key="tracker_seite")
+
+started = time.perf_counter()
+df, total = browse_listings(
+    TRACKER_DB,
+    search=search,
+    price_min=price_min,
+    price_max=price_max,
+    plz_prefix=plz_prefix,
+    seen_from=seen[0] if len(seen) > 0 else None,
+    seen_to=seen[1] if len(seen) > 1 else None,
+    sort=sort,
+    descending=descending,
+    page=page,
+    page_size=page_size,
+)
+elapsed = time.perf_counter() - started
+
+pages = max(1, -(-total // page_size))
+number = lambda value: f"{value:,}".replace(",", ".")
+st.caption(f"{number(total)} Treffer, Seite {number(page)} von {number(pages)} ({elapsed * 1000:.0f} ms)")
+if df.empty:
+    st.info("Keine Inserate für diese Filter." if total == 0 else "Diese Seite ist leer, bitte eine kleinere Seitenzahl wählen.")
+else:
+    st.dataframe(
+        df,
+        hide_index=True,
+        column_config={
+            "Preis": st.column_config.NumberColumn(format="%.0f €"),
+            "Link": st.column_config.LinkColumn(),
+        },
+    )
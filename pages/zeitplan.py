@@ -0,0 +1,81 @@
+import streamlit as st
+from carvis.backend import BACKENDS
+from carvis.resources import scheduler
+from carvis.scheduler import PRESETS
+from carvis.urls import BRANDS
+
+st.title("Zeitplan")
+
+st.write("Gespeicherte Suchen laufen im Hintergrund nach Zeitplan und schreiben ihre Ergebnisse in den Tracker, auch wenn kein Browser-Tab geöffnet ist.")
+
+sched = scheduler()
+
+# Status des Schedulers
+status = sched.status()
+col1, col2, col3 = st.columns(3)
+col1.metric("Scheduler", "läuft" if status["running"] else "gestoppt")
+col2.metric("Aktive Jobs", status["active"])
+col3.metric("Worker", status["workers"])
+
+# Neue gespeicherte Suche anlegen
+with st.expander("Neue gespeicherte Suche"):
+    with st.form("new_job"):
+        custom_url = st.text_input("Vorgefertigter Link (optional)")
+        query = st.selectbox("Fahrzeugmarke", [""] + BRANDS)
+        query = st.text_input("Oder eigene Query", value=query)
+        category = st.selectbox("Kategorie", ["autos", "immobilien"])
+        price_min = st.number_input("Mindestpreis (optional)", min_value=0, step=1000)
+        price_max = st.number_input("Höchstpreis (optional)", min_value=0, step=1000)
+        year_min = st.number_input("Mindestbaujahr (optional)", min_value=1900, step=1, format="%d", value=None)
+        year_max = st.number_input("Höchstbaujahr (optional)", min_value=1900, step=1, format="%d", value=None)
+        preset = st.selectbox("Intervall", list(PRESETS) + ["Cron-Ausdruck"])
+        cron = st.text_input("Cron-Ausdruck (Minute Stunde Tag Monat Wochentag)", value="*/15 * * * *")
+        # auto: HTTP zuerst, ein Browser nur für gesperrte oder leere Seiten
+        backend = st.selectbox("Backend", BACKENDS)
+        max_concurrent = st.number_input("Max. gleichzeitige Läufe", min_value=1, max_value=5, value=1)
+        incremental = st.checkbox("Inkrementell (nur bis zu bereits bekannten Inseraten laden, nur requests)", value=True)
+        if st.form_submit_button("Speichern"):
+            if not (custom_url or query):
+                st.error("Bitte eine Query oder einen Link angeben.")
+            else:
+                params = {"url": custom_url} if custom_url else {
+                    "query": query, "category": category, "price_min": price_min, "price_max": price_max,
+                    "year_min": year_min, "year_max": year_max,
+                }
+                params["incremental"] = incremental
+                schedule = cron if preset == "Cron-Ausdruck" else PRESETS[preset]
+                try:
+                    job_id = sched.add_job(query or custom_url, params, schedule=schedule, backend=backend, max_concurrent=max_concurrent)
+                    st.success(f"Suche #{job_id} gespeichert.")
+                except ValueError as e:
+                    st.error(str(e))
+
+# Jobs
+jobs = sched.jobs()
+st.subheader("Gespeicherte Suchen")
+if jobs.empty:
+    st.write("Noch keine gespeicherten Suchen.")
+else:
+    st.dataframe(jobs, hide_index=True)
+    job_id = st.selectbox("Suche auswählen", jobs["id"], format_func=lambda i: f"#{i} {jobs.set_index('id').loc[i, 'name']}")
+    col1, col2, col3, col4 = st.columns(4)
+    if col1.button("Jetzt ausführen"):
+        if sched.run_now(job_id):
+            st.success("Eingereiht.")
+        else:
+            st.warning("Die Suche läuft bereits so oft wie erlaubt.")
+    if col2.button("Aktivieren"):
+        sched.set_enabled(job_id, True)
+        st.rerun()
+    if col3.button("Pausieren"):
+        sched.set_enabled(job_id, False)
+        st.rerun()
+    if col4.button("Löschen"):
+        sched.delete_job(job_id)
+        st.rerun()
+
+# Laufhistorie
+st.subheader("Letzte Läufe")
+if st.button("Aktualisieren"):
+    st.rerun()
+st.dataframe(sched.runs(), hide_index=True)
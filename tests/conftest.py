@@ -0,0 +1,10 @@
+import pytest
+
+from tests.stubs import StubSite
+
+
+@pytest.fixture
+def site():
+    stub = StubSite()
+    yield stub
+    stub.stop()
@@ -0,0 +1,60 @@
+# Lokaler HTTP-Server mit vorgegebenen Seiten und Ergebnisseiten im Aufbau von Kleinanzeigen
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "fixtures")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        status, body = self.server.pages.get(self.path.rstrip("/"), (404, "<html>nicht gefunden</html>"))
+        body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubSite:
+    # pages: Pfad ohne abschließenden Slash -> (Status, HTML); requests: alle abgerufenen Pfade
+    def __init__(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.pages = self.pages = {}
+        self._server.requests = self.requests = []
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+
+    def url(self, path):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def result_page(ads, page=1, last_page=1):
+    # ads: Liste von (Inserat ID, Preis); Paginierung mit den Seiten 1..last_page
+    articles = "".join(
+        f'<li class="ad-listitem"><article class="aditem" data-adid="{ad_id}" data-href="/s-anzeige/auto/{ad_id}-216-1">'
+        f'<div class="aditem-main--top--left">10115 Berlin</div>'
+        f'<div class="aditem-main--top--right">28.04.2024</div>'
+        f'<h2 class="text-module-begin"><a>Auto {ad_id}</a></h2>'
+        f'<p class="aditem-main--middle--price-shipping--price">{price} €</p>'
+        f"</article></li>"
+        for ad_id, price in ads
+    )
+    pagination = "".join(
+        f'<span class="pagination-current">{n}</span>' if n == page else f'<a class="pagination-page">{n}</a>'
+        for n in range(1, last_page + 1)
+    )
+    return (
+        f'<html><body><ul id="srchrslt-adtable" class="itemlist">{articles}</ul>'
+        f'<div class="pagination"><div class="pagination-pages">{pagination}</div></div></body></html>'
+    )
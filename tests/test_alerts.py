@@ -0,0 +1,53 @@
+import sqlite3
+
+import pytest
+import requests
+
+from carvis.alerts import WebhookNotifier, WebhookStub, add_rule, check_listings
+from carvis.store import upsert_listings
+
+ROW = {"Inserat ID": "3000000001", "Titel": "BMW M3 Competition 2016", "Postleitzahl": "80331", "Stadt": "München", "Preis": 32000, "VB": False, "Link": "https://www.kleinanzeigen.de/s-anzeige/bmw-m3/3000000001-216-1"}
+
+
+@pytest.fixture
+def tracker(tmp_path):
+    path = str(tmp_path / "tracker.sqlite")
+    add_rule("BMW M3", "bmw m3", price_max=35000, year_min=2015, year_max=2018, plz_prefixes="8", path=path)
+    return path
+
+
+def test_match_is_reported_once(tracker):
+    received = []
+    assert len(check_listings([ROW], tracker, received.extend)) == 1
+    assert check_listings([ROW], tracker, received.extend) == []
+    assert [alert["Regel"] for alert in received] == ["BMW M3"]
+    # Preisänderung ist ein neuer Treffer
+    assert len(check_listings([{**ROW, "Preis": 30000}], tracker, received.extend)) == 1
+
+
+def test_notifier_runs_outside_the_write_transaction(tracker):
+    def notifier(alerts):
+        # Ein anderer Schreiber darf nicht auf die Sperre warten müssen
+        conn = sqlite3.connect(tracker, timeout=0)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("ROLLBACK")
+        finally:
+            conn.close()
+        upsert_listings([ROW], tracker)
+
+    assert len(check_listings([ROW], tracker, notifier)) == 1
+
+
+def test_failed_notifier_reports_again_next_time(tracker):
+    def unreachable(alerts):
+        raise requests.exceptions.ConnectionError("Webhook nicht erreichbar")
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        check_listings([ROW], tracker, unreachable)
+    stub = WebhookStub().start()
+    try:
+        assert len(check_listings([ROW], tracker, WebhookNotifier(stub.url))) == 1
+        assert [alert["Inserat ID"] for alert in stub.received] == ["3000000001"]
+    finally:
+        stub.stop()
@@ -0,0 +1,30 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from carvis import analytics
+from carvis.analytics import extract_features
+
+NOW = datetime(2025, 1, 1)
+TITLES = ["!!!", "Audi", "", None, "BMW 320d 2015 150.000 km", "Golf 7 GTI 85 tkm", "vw golf Variant", "VW Golf 2019"]
+
+
+@pytest.fixture
+def listings():
+    return pd.DataFrame({"Titel": TITLES, "Preis": range(1000, 1000 + len(TITLES))})
+
+
+def test_titles_without_model_year_or_km(listings):
+    features = extract_features(listings, NOW)
+    assert features["Modell"].tolist()[:4] == ["Unbekannt"] * 4
+    assert features[["Baujahr", "Alter", "Kilometer"]].iloc[:4].isna().all().all()
+    assert features["Modell"].tolist()[4:] == ["BMW 320d", "Golf 7", "vw golf", "vw golf"]
+    assert features["Baujahr"].tolist()[4] == 2015 and features["Kilometer"].tolist()[4:6] == [150000, 85000]
+
+
+@pytest.mark.skipif(analytics.pa is None, reason="pyarrow nicht installiert")
+def test_pyarrow_and_str_extract_agree(listings, monkeypatch):
+    with_arrow = extract_features(listings, NOW)
+    monkeypatch.setattr(analytics, "pa", None)
+    pd.testing.assert_frame_equal(with_arrow, extract_features(listings, NOW))
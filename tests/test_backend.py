@@ -0,0 +1,76 @@
+from contextlib import contextmanager
+
+import pytest
+
+from carvis import backend
+from carvis.backend import block_reason, browser_patterns, fetch_listings, scrape_adaptive, uses_browser
+from tests.stubs import result_page
+
+SEARCH = "/s-autos/audi-quattro-xyz/k0c216"
+NO_RESULTS = (
+    '<html><body><div class="outcomenotfound-message"><h1>Es wurden leider keine Ergebnisse für '
+    '„audi quattro xyz“ gefunden.</h1></div></body></html>'
+)
+
+
+class BrokenPool:
+    # Steht für einen Browser, der die Seite nicht laden kann; zählt die Versuche
+    def __init__(self):
+        self.calls = 0
+
+    @contextmanager
+    def driver(self, timeout=None):
+        self.calls += 1
+        raise TimeoutError("kein Browser im Test")
+        yield
+
+
+@pytest.fixture(autouse=True)
+def forget_fallbacks():
+    backend._browser_until.clear()
+    yield
+    backend._browser_until.clear()
+
+
+def test_block_reason():
+    assert block_reason(result_page([("1", 1000)]), ["listing"]) is None
+    assert block_reason(NO_RESULTS, []) is None
+    assert block_reason('<div>1 - 0 von 0 Ergebnissen für „xyz“</div>', []) is None
+    assert block_reason("<html><div id='px-captcha'></div></html>", []) == "challenge"
+    assert block_reason("<html><body>Wartung</body></html>", []) == "leer"
+
+
+def test_search_without_results_stays_on_http(site):
+    site.pages[SEARCH] = (200, NO_RESULTS)
+    pool = BrokenPool()
+    assert fetch_listings(site.url(SEARCH), pool) == ([], 1, "requests")
+    assert scrape_adaptive(site.url(SEARCH), pool) == ([], {"requests": 1})
+    assert pool.calls == 0
+    assert browser_patterns() == {}
+
+
+def test_empty_page_falls_back_without_switching_the_pattern(site):
+    site.pages[SEARCH] = (200, "<html><body>Wartung</body></html>")
+    pool = BrokenPool()
+    assert fetch_listings(site.url(SEARCH), pool) is None
+    assert pool.calls == 1
+    assert not uses_browser(site.url(SEARCH))
+
+
+@pytest.mark.parametrize("status, body", [(403, "<html>Forbidden</html>"), (200, "<html><div id='px-captcha'></div></html>")])
+def test_block_switches_the_pattern(site, status, body):
+    site.pages[SEARCH] = (status, body)
+    pool = BrokenPool()
+    assert fetch_listings(site.url(SEARCH), pool) is None
+    assert uses_browser(site.url("/s-autos/bmw/k0c216"))
+    # Solange der Wechsel gilt, wird HTTP nicht mehr versucht
+    site.requests.clear()
+    fetch_listings(site.url(SEARCH), pool)
+    assert site.requests == [] and pool.calls == 2
+
+
+def test_results_are_parsed_over_http(site):
+    site.pages[SEARCH] = (200, result_page([("3000000001", 1000), ("3000000002", 2000)]))
+    listings, last_page, used = fetch_listings(site.url(SEARCH), BrokenPool())
+    assert [listing.ad_id for listing in listings] == ["3000000001", "3000000002"]
+    assert (last_page, used) == (1, "requests")
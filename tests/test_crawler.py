@@ -0,0 +1,178 @@
+import pytest
+import requests
+
+from carvis.crawler import RateLimiter, crawl_delta, crawl_pages, scrape_listings
+from carvis.store import get_watermark, set_watermark, upsert_listings
+from tests.stubs import result_page
+
+SEARCH = "/s-autos/audi/k0c216"
+
+
+def _serve(site, pages, window=3):
+    # pages: Liste der Inserate je Seite; die Paginierung zeigt wie bei Kleinanzeigen nur ein Fenster an Seitenzahlen
+    for number, ads in enumerate(pages, start=1):
+        path = SEARCH if number == 1 else f"/s-autos/audi/seite:{number}/k0c216"
+        site.pages[path] = (200, result_page(ads, number, min(len(pages), number + window - 1)))
+
+
+def _ads(page, per_page=3):
+    return [(str(3000000000 - page * 100 - n), 1000 * page + n) for n in range(per_page)]
+
+
+def _scrape(site, **kwargs):
+    return scrape_listings(site.url(SEARCH), limiter=RateLimiter(1000), **kwargs)
+
+
+def test_pages_are_merged_in_page_order(site):
+    _serve(site, [_ads(page) for page in range(1, 8)])
+    listings = _scrape(site, workers=3)
+    assert [listing.ad_id for listing in listings] == [ad_id for page in range(1, 8) for ad_id, _ in _ads(page)]
+    assert len(site.requests) == 7
+
+
+def test_max_pages_limits_the_crawl(site):
+    _serve(site, [_ads(page) for page in range(1, 8)])
+    listings = _scrape(site, max_pages=2)
+    assert [listing.price for listing in listings] == [1000, 1001, 1002, 2000, 2001, 2002]
+
+
+def test_crawl_stops_at_first_empty_page(site):
+    _serve(site, [_ads(1), _ads(2), [], _ads(4), _ads(5)])
+    listings = _scrape(site, workers=2)
+    assert {listing.price // 1000 for listing in listings} == {1, 2}
+
+
+def test_crawl_stops_at_first_failed_page(site):
+    _serve(site, [_ads(page) for page in range(1, 6)])
+    site.pages["/s-autos/audi/seite:3/k0c216"] = (404, "<html></html>")
+    listings = _scrape(site, workers=4)
+    assert [listing.price // 1000 for listing in listings] == [1, 1, 1, 2, 2, 2]
+
+
+def test_failure_on_page_one_is_raised(site):
+    site.pages[SEARCH] = (404, "<html></html>")
+    with pytest.raises(requests.exceptions.HTTPError):
+        _scrape(site)
+
+
+def test_crawl_pages_without_results_on_page_one():
+    assert crawl_pages("https://example.invalid/s-autos/k0c216", lambda target: ([], 1), limiter=RateLimiter(1000)) == []
+
+
+def test_crawl_pages_passes_page_urls():
+    seen = []
+
+    def fetch_page(target):
+        seen.append(target)
+        return [target], 3
+
+    pages = crawl_pages("https://www.kleinanzeigen.de/s-autos/bmw/k0c216", fetch_page, workers=2, limiter=RateLimiter(1000))
+    assert [page[0] for page in pages] == [
+        "https://www.kleinanzeigen.de/s-autos/bmw/k0c216",
+        "https://www.kleinanzeigen.de/s-autos/bmw/seite:2/k0c216",
+        "https://www.kleinanzeigen.de/s-autos/bmw/seite:3/k0c216",
+    ]
+
+
+# Inkrementeller Crawl (neueste zuerst) gegen eine Seitenmenge, die sich zwischen den Läufen ändert
+
+NEWEST = "/s-autos/sortierung:neuste/audi"
+
+
+def _serve_newest(site, ads, per_page=3):
+    # ads: alle Inserate der Suche neueste zuerst, auf Seiten zu per_page verteilt
+    site.pages.clear()
+    pages = [ads[start:start + per_page] for start in range(0, len(ads), per_page)]
+    for number, page in enumerate(pages, start=1):
+        path = f"{NEWEST}/k0c216" if number == 1 else f"{NEWEST}/seite:{number}/k0c216"
+        site.pages[path] = (200, result_page(page, number, len(pages)))
+    site.requests.clear()
+
+
+def _delta(site, tracker, workers=1):
+    return crawl_delta(site.url(SEARCH), path=tracker, workers=workers, limiter=RateLimiter(1000))
+
+
+def _first_run(site, tracker, ads):
+    _serve_newest(site, ads)
+    delta, seen, _, watermark = _delta(site, tracker)
+    upsert_listings([listing.to_row() for listing in seen], tracker, watermark=watermark)
+    return delta
+
+
+@pytest.fixture
+def tracker(tmp_path):
+    return str(tmp_path / "tracker.sqlite")
+
+
+OLD_ADS = [(str(2000000100 - n), 10000 + n) for n in range(12)]
+
+
+def test_first_run_loads_every_page(site, tracker):
+    delta = _first_run(site, tracker, OLD_ADS)
+    assert [listing.ad_id for listing in delta] == [ad_id for ad_id, _ in OLD_ADS]
+    assert len(site.requests) == 4
+
+
+def test_rerun_without_changes_loads_one_page(site, tracker):
+    _first_run(site, tracker, OLD_ADS)
+    _serve_newest(site, OLD_ADS)
+    delta, seen, page_count, _ = _delta(site, tracker)
+    assert delta == []
+    assert page_count == 1 and len(seen) == 3
+    assert site.requests == ["/s-autos/sortierung:neuste/audi/k0c216"]
+
+
+def test_new_ads_at_the_top(site, tracker):
+    _first_run(site, tracker, OLD_ADS)
+    new_ads = [("2000000202", 9000), ("2000000201", 9500)]
+    _serve_newest(site, new_ads + OLD_ADS)
+    delta, _, page_count, _ = _delta(site, tracker)
+    assert [listing.ad_id for listing in delta] == ["2000000202", "2000000201"]
+    # Seite 1 enthält noch neue Inserate, Seite 2 ist vollständig bekannt
+    assert page_count == 2 and len(site.requests) == 2
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_price_change_on_page_three_is_not_cut_off(site, tracker, workers):
+    _first_run(site, tracker, OLD_ADS)
+    new_ads = [(str(2000000206 - n), 8000 + n) for n in range(6)]
+    changed = [(ad_id, price - 500 if n == 1 else price) for n, (ad_id, price) in enumerate(OLD_ADS)]
+    _serve_newest(site, new_ads + changed)
+    delta, _, page_count, _ = _delta(site, tracker, workers)
+    assert [listing.ad_id for listing in delta] == [ad_id for ad_id, _ in new_ads] + [OLD_ADS[1][0]]
+    assert delta[-1].price == OLD_ADS[1][1] - 500
+    # Seite 3 enthält die Preisänderung, erst Seite 4 ist unverändert
+    assert page_count == 4
+
+
+def test_watermark_inside_a_page_stops_the_crawl(site, tracker):
+    # Ohne Tracker-Einträge (z.B. Stapellauf ohne --tracker) zählt nur die Wasserstandsmarke der Suche
+    _serve_newest(site, OLD_ADS)
+    _, _, _, watermark = _delta(site, tracker)
+    set_watermark(*watermark, path=tracker)
+    new_ads = [(str(2000000204 - n), 8000 + n) for n in range(4)]
+    _serve_newest(site, new_ads + OLD_ADS)
+    delta, seen, page_count, watermark = _delta(site, tracker)
+    assert watermark[1] == 2000000204
+    # Die Grenze liegt mitten auf Seite 2, Seite 3 ist vollständig älter; Seiten 4 und 5 werden nicht geladen
+    assert [listing.ad_id for listing in delta] == [ad_id for ad_id, _ in new_ads]
+    assert page_count == 3 and len(seen) == 9
+    assert len(site.requests) == 3
+
+
+def test_dropped_delta_is_returned_again(site, tracker):
+    # Der erste Lauf speichert nichts (Export oder Tracker schlagen fehl): keine Marke, nichts geht verloren
+    _serve_newest(site, OLD_ADS)
+    delta, _, _, watermark = _delta(site, tracker)
+    assert watermark == (site.url(f"{NEWEST}/k0c216"), 2000000100)
+    assert get_watermark(watermark[0], tracker) is None
+    new_ads = [("2000000201", 9000)]
+    _serve_newest(site, new_ads + OLD_ADS)
+    delta, _, _, _ = _delta(site, tracker)
+    assert [listing.ad_id for listing in delta] == ["2000000201"] + [ad_id for ad_id, _ in OLD_ADS]
+
+
+def test_watermark_is_stored_with_the_listings(site, tracker):
+    _first_run(site, tracker, OLD_ADS)
+    assert get_watermark(site.url(f"{NEWEST}/k0c216"), tracker) == 2000000100
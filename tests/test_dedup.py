@@ -0,0 +1,94 @@
+# Dedup und Repost-Suche auf den Beispielausgaben in "Output der Fahrzeugsuchen"
+# (relative Datumsangaben wie "Heute, 12:54", Postleitzahl und Stadt vertauscht)
+import os
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from carvis.dedup import dedup_listings, find_reposts, normalize_date, parse_ad_date
+from carvis.store import import_excel, load_tracker
+
+SAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Output der Fahrzeugsuchen")
+NOW = datetime(2025, 3, 29, 18, 0)
+
+
+def _sample_rows(name):
+    df = pd.read_excel(os.path.join(SAMPLES, name), dtype=str)
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+@pytest.fixture
+def tracker(tmp_path):
+    # Beide Beispielausgaben importiert; import_excel korrigiert die vertauschten Spalten
+    path = str(tmp_path / "tracker.sqlite")
+    import_excel(os.path.join(SAMPLES, "20250329__alle_alle.xlsx"), path)
+    import_excel(os.path.join(SAMPLES, "Fiat_alle_alle.xlsx"), path)
+    return load_tracker(path)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Heute, 12:54", datetime(2025, 3, 29, 12, 54)),
+    ("heute", datetime(2025, 3, 29, 0, 0)),
+    ("Gestern, 23:05", datetime(2025, 3, 28, 23, 5)),
+    ("20.03.2025", datetime(2025, 3, 20)),
+    ("1.2.2025, 08:15", datetime(2025, 2, 1, 8, 15)),
+    ("31.02.2025", None),
+    ("Kein Datum", None),
+    (None, None),
+])
+def test_parse_ad_date(text, expected):
+    assert parse_ad_date(text, NOW) == expected
+
+
+def test_normalize_date_on_sample_output():
+    dates = [normalize_date(row["Datum"], NOW) for row in _sample_rows("20250329__alle_alle.xlsx")]
+    assert dates == ["29.03.2025", "20.03.2025", "12.03.2025", "26.02.2025", "21.02.2025", "28.04.2024"]
+    assert normalize_date("Kein Datum", NOW) == "Kein Datum"
+
+
+def test_dedup_merges_only_identical_ids():
+    rows = _sample_rows("20250329__alle_alle.xlsx") + _sample_rows("Fiat_alle_alle.xlsx")
+    listings = dedup_listings(rows)
+    assert [row["Inserat ID"] for row in listings] == [
+        "3042413070", "3033921559", "3026926669", "3014026878", "3009875533", "2748167688",
+    ]
+
+
+def test_dedup_keeps_different_ids_with_same_price_and_city():
+    rows = _sample_rows("Fiat_alle_alle.xlsx")
+    twin = {**rows[0], "Inserat ID": "3050000000", "Titel": "Fiat Panda 4x4"}
+    listings = dedup_listings(rows + [twin])
+    assert len(listings) == len(rows) + 1
+    assert twin in listings
+
+
+def test_dedup_keeps_rows_without_id():
+    rows = [{"Inserat ID": None, "Preis": 100}, {"Inserat ID": None, "Preis": 100}]
+    assert len(dedup_listings(rows)) == 2
+
+
+def test_sample_tracker_has_no_reposts(tracker):
+    assert sorted(tracker["Postleitzahl"]) == ["14513", "30171", "40477", "49201", "67067", "78665"]
+    assert find_reposts(tracker).empty
+
+
+def test_repost_with_lower_price_is_reported(tracker):
+    original = tracker[tracker["Inserat ID"] == "3026926669"].iloc[0]
+    repost = {**original.to_dict(), "Inserat ID": "3050000001", "Preis": int(original["Preis"] * 0.97)}
+    far_away = {**original.to_dict(), "Inserat ID": "3050000002", "Postleitzahl": "01067"}
+    too_cheap = {**original.to_dict(), "Inserat ID": "3050000003", "Preis": int(original["Preis"] * 0.7)}
+    df = pd.concat([tracker, pd.DataFrame([repost, far_away, too_cheap])], ignore_index=True)
+    reposts = find_reposts(df)
+    assert reposts[["Inserat ID", "Repost von"]].values.tolist() == [["3050000001", "3026926669"]]
+    assert reposts["Ähnlichkeit"].iloc[0] == 1.0
+    # Nur gemeldet, die Eingabe bleibt vollständig
+    assert len(df) == len(tracker) + 3
+
+
+def test_reposts_filtered_by_ids(tracker):
+    original = tracker[tracker["Inserat ID"] == "3042413070"].iloc[0]
+    repost = {**original.to_dict(), "Inserat ID": "3050000004"}
+    df = pd.concat([tracker, pd.DataFrame([repost])], ignore_index=True)
+    assert find_reposts(df, ids=["3050000004"])["Repost von"].tolist() == ["3042413070"]
+    assert find_reposts(df, ids=["3033921559"]).empty
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from carvis.details import enrich_listings
+from tests.stubs import FIXTURES
+
+with open(os.path.join(FIXTURES, "detail_page.html"), encoding="utf-8") as file:
+    DETAIL_PAGE = file.read()
+
+FIXTURE_FIELDS = {"Kilometerstand": 148500, "Erstzulassung": "März 2016", "Leistung (PS)": 190, "Kraftstoff": "Diesel", "Getriebe": "Automatik"}
+
+
+def _row(site, ad_id, price=15900, date="Heute, 12:54"):
+    return {
+        "Inserat ID": ad_id, "Datum": date, "Titel": "Audi A4 Avant 2.0 TDI", "Postleitzahl": "10115",
+        "Stadt": "Berlin", "Preis": price, "VB": True, "Link": site.url(f"/s-anzeige/audi-a4/{ad_id}-216-1"),
+    }
+
+
+@pytest.fixture
+def tracker(tmp_path):
+    return str(tmp_path / "tracker.sqlite")
+
+
+@pytest.fixture
+def detail_site(site):
+    for ad_id in ("3000000001", "3000000002"):
+        site.pages[f"/s-anzeige/audi-a4/{ad_id}-216-1"] = (200, DETAIL_PAGE)
+    return site
+
+
+def _enrich(rows, tracker):
+    return enrich_listings(rows, tracker, workers=2, rate=1000)
+
+
+def test_detail_fields_are_attached(detail_site, tracker):
+    rows, stats = _enrich([_row(detail_site, "3000000001"), _row(detail_site, "3000000002")], tracker)
+    assert stats == {"cache": 0, "geladen": 2, "fehler": 0}
+    assert all({**row, **FIXTURE_FIELDS} == row for row in rows)
+
+
+def test_rerun_uses_the_cache(detail_site, tracker):
+    _enrich([_row(detail_site, "3000000001"), _row(detail_site, "3000000002")], tracker)
+    detail_site.requests.clear()
+    # Am nächsten Tag steht dasselbe Inserat mit "Gestern" in der Liste
+    rows, stats = _enrich([_row(detail_site, "3000000001", date="Gestern, 12:54"), _row(detail_site, "3000000002", date="28.04.2024")], tracker)
+    assert stats == {"cache": 2, "geladen": 0, "fehler": 0}
+    assert detail_site.requests == []
+    assert rows[0]["Kilometerstand"] == 148500
+
+
+def test_price_change_fetches_again(detail_site, tracker):
+    _enrich([_row(detail_site, "3000000001"), _row(detail_site, "3000000002")], tracker)
+    detail_site.requests.clear()
+    rows, stats = _enrich([_row(detail_site, "3000000001", price=14900), _row(detail_site, "3000000002")], tracker)
+    assert stats == {"cache": 1, "geladen": 1, "fehler": 0}
+    assert detail_site.requests == ["/s-anzeige/audi-a4/3000000001-216-1"]
+
+
+def test_missing_page_is_counted_without_aborting(detail_site, tracker):
+    rows = [_row(detail_site, "3000000001"), _row(detail_site, "3000000404"), _row(detail_site, "3000000002")]
+    enriched, stats = _enrich(rows, tracker)
+    assert stats == {"cache": 0, "geladen": 2, "fehler": 1}
+    assert [row["Kilometerstand"] for row in enriched] == [148500, None, 148500]
+    # Die fehlgeschlagene Seite wird beim nächsten Lauf erneut versucht
+    detail_site.requests.clear()
+    _, stats = _enrich(rows, tracker)
+    assert stats == {"cache": 2, "geladen": 0, "fehler": 1}
+    assert detail_site.requests == ["/s-anzeige/audi-a4/3000000404-216-1"]
@@ -0,0 +1,124 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from carvis.scheduler import Scheduler, cron_next
+from carvis.store import connect
+
+# Samstag, 1. Juni 2024
+AFTER = datetime(2024, 6, 1, 9, 30)
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("*/15 * * * *", datetime(2024, 6, 1, 9, 45)),
+    ("0 * * * *", datetime(2024, 6, 1, 10, 0)),
+    ("0 6 * * *", datetime(2024, 6, 2, 6, 0)),
+    ("0 */6 * * *", datetime(2024, 6, 1, 12, 0)),
+    # Nur Wochentag: nächster Montag
+    ("0 8 * * 1", datetime(2024, 6, 3, 8, 0)),
+    # Nur Tag: nächster 15.
+    ("0 8 15 * *", datetime(2024, 6, 15, 8, 0)),
+    # Tag und Wochentag eingeschränkt: der 1. oder jeder Montag, je nachdem was früher kommt
+    ("0 8 1 * 1", datetime(2024, 6, 3, 8, 0)),
+    ("0 8 2 * 1", datetime(2024, 6, 2, 8, 0)),
+    ("30 9 13 * 5", datetime(2024, 6, 7, 9, 30)),
+    # Nicht nur Freitag, der 13. Dezember, sondern jeder Freitag im Dezember und der 13.
+    ("0 0 13 12 5", datetime(2024, 12, 6, 0, 0)),
+    # Schrittweiser Tag zählt wie "*", dann müssen beide passen: ungerader Tag und Sonntag
+    ("0 12 */2 * 0", datetime(2024, 6, 9, 12, 0)),
+    ("0 0 29 2 *", datetime(2028, 2, 29, 0, 0)),
+])
+def test_cron_next(expression, expected):
+    assert cron_next(expression, AFTER) == expected
+
+
+def test_cron_sunday_as_seven():
+    assert cron_next("0 8 * * 7", AFTER) == datetime(2024, 6, 2, 8, 0)
+    assert cron_next("0 8 * * 5-7", AFTER) == datetime(2024, 6, 2, 8, 0)
+
+
+@pytest.mark.parametrize("expression, message", [
+    ("* * * *", "Ungültiger Cron-Ausdruck"),
+    ("60 * * * *", "Minute"),
+    ("0 24 * * *", "Stunde"),
+    ("0 0 0 * *", "Tag"),
+    ("0 0 * 13 *", "Monat"),
+    ("0 0 * * 8", "Wochentag"),
+    ("0 0 * * mo", "Wochentag"),
+    ("*/0 * * * *", "Schrittweite"),
+    ("0 0 31 2 *", "trifft nie zu"),
+])
+def test_cron_next_rejects(expression, message):
+    with pytest.raises(ValueError, match=message):
+        cron_next(expression, AFTER)
+
+
+def test_due_run_over_the_limit_is_recorded_as_skipped(tmp_path):
+    started, release = threading.Event(), threading.Event()
+
+    def runner(job):
+        started.set()
+        release.wait(5)
+        return 3, 1
+
+    # Termine in der Zukunft, damit der eigene Takt des Schedulers sie nicht vorher einreiht
+    first = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+    sched = Scheduler(str(tmp_path / "tracker.sqlite"), workers=1, poll_seconds=3600, runner=runner)
+    job_id = sched.add_job("Audi", {"query": "Audi"}, schedule="*/15 * * * *", start_at=first)
+    sched.start()
+    try:
+        assert sched.tick(first) == 1
+        assert started.wait(5)
+        # Der nächste Termin ist fällig, während der erste Lauf noch läuft
+        assert sched.tick(first + timedelta(minutes=15)) == 1
+        runs = sched.runs()
+        assert runs["status"].tolist() == ["übersprungen", "läuft"]
+        assert runs["started_at"].iloc[0] == (first + timedelta(minutes=15)).isoformat()
+        assert sched.jobs().set_index("id").loc[job_id, "next_run"] == (first + timedelta(minutes=30)).isoformat()
+    finally:
+        release.set()
+        sched.stop(5)
+    assert sched.runs()["status"].tolist() == ["übersprungen", "ok"]
+
+
+def test_worker_survives_bookkeeping_errors(tmp_path):
+    done = threading.Event()
+    sched = Scheduler(str(tmp_path / "tracker.sqlite"), workers=1, poll_seconds=3600, runner=lambda job: (done.set(), (0, 0))[1])
+    execute, calls = sched._execute, []
+
+    def flaky(job):
+        calls.append(job["id"])
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        execute(job)
+
+    sched._execute = flaky
+    job_id = sched.add_job("Audi", {"query": "Audi"}, start_at=datetime.now() + timedelta(days=1))
+    sched.start()
+    try:
+        assert sched.run_now(job_id)
+        # Erst nach dem fehlgeschlagenen ersten Lauf ist wieder Platz für den nächsten
+        deadline = time.monotonic() + 5
+        while not (calls and sched.status()["active"] == 0) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert sched.run_now(job_id)
+        assert done.wait(5)
+        assert sched.is_running()
+    finally:
+        sched.stop(5)
+    assert sched.runs()["status"].tolist() == ["ok"]
+
+
+def test_interrupted_runs_are_closed_on_start(tmp_path):
+    path = str(tmp_path / "tracker.sqlite")
+    sched = Scheduler(path, poll_seconds=3600)
+    with connect(path) as conn:
+        conn.execute("INSERT INTO runs (job_id, started_at, status) VALUES (1, '2024-06-01T09:30:00', 'läuft')")
+    sched.start()
+    sched.stop(5)
+    runs = sched.runs()
+    assert runs["status"].tolist() == ["abgebrochen"]
+    assert runs["finished_at"].notna().all()